@@ -0,0 +1,244 @@
+"""
+Benchmarks for the collision and envelope hot paths.
+
+Sweeps printer count, pose distribution and buffer size over
+    printer.getScaledPolygon, printer.generate_all_possible_polygons,
+    envelope.getIntersections, check_collision and check_collision_batch
+and reports p50/p99 latency and allocations per call. Results are written to
+Benchmarks/results/<label>.json so two versions can be compared:
+
+    python collision_benchmark.py --label before
+    python collision_benchmark.py --label after --compare results/before.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import matplotlib
+matplotlib.use("Agg")  # the benchmarks never draw
+import matplotlib.pyplot as plt
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+sys.path.insert(0, os.path.join(REPO, "CollisionCheck"))
+
+import Full_Envelope_Managment as fem
+from collision_check import check_collision, check_collision_batch, scaras_to_arrays
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+BED_SIZE = 300
+BED_SPACING = 450        # distance between the origins of neighbouring beds
+PRINTER_OFFSET = (150, -35)
+ARM_LENGTHS = (217, 204)
+
+
+class StaticPoses:
+    """
+    Stands in for the FleetPoller: publishes fixed current and target positions per printer.
+    """
+    def __init__(self):
+        self.records = {}
+
+    def set(self, ip, current, target):
+        self.records[ip] = {"status": "P", "machine": tuple(current), "target": tuple(target), "feedrate": 50.0}
+
+    def getSnapshot(self, ip):
+        return self.records.get(ip)
+
+
+def layout(n_printers):
+    """
+    Place n printers on beds in two facing rows, the way the cell is laid out.
+    :return: List of (x, y, theta) bed origins.
+    """
+    origins = []
+    for i in range(n_printers):
+        column, row = divmod(i, 2)
+        if row == 0:
+            origins.append((column * BED_SPACING, 0, 0))
+        else:
+            origins.append((column * BED_SPACING + BED_SIZE, 2 * BED_SIZE, 180))
+    return origins
+
+
+def sample_pose(rng, distribution):
+    """
+    Sample a reachable nozzle position in the printer's local frame.
+
+    :param distribution: "uniform" anywhere on the bed, "edge" along the far edge of the bed where
+                         the facing printer reaches in, or "extended" near full arm extension.
+    """
+    b, c = ARM_LENGTHS
+    while True:
+        if distribution == "uniform":
+            x, y = rng.uniform(0, BED_SIZE, 2)
+        elif distribution == "edge":
+            x, y = rng.uniform(0, BED_SIZE), rng.uniform(0.8 * BED_SIZE, BED_SIZE)
+        elif distribution == "extended":
+            angle = rng.uniform(0.2 * math.pi, 0.8 * math.pi)
+            r = rng.uniform(0.9, 0.98) * (b + c)
+            x, y = PRINTER_OFFSET[0] + r * math.cos(angle), PRINTER_OFFSET[1] + r * math.sin(angle)
+        else:
+            raise ValueError(f"Unknown pose distribution {distribution}")
+
+        a = math.hypot(x - PRINTER_OFFSET[0], y - PRINTER_OFFSET[1])
+        if abs(b - c) + 1 < a < b + c - 1:
+            return (x, y, 0)
+
+
+def build_case(n_printers, distribution, buffer_size, seed=0):
+    """
+    Build an envelope and the matching check_collision input for one benchmark case.
+    :return: Tuple (envelope, poses, n_scaras).
+    """
+    rng = np.random.default_rng(seed)
+    fig, ax = plt.subplots()
+    poses = StaticPoses()
+
+    printers = []
+    n_scaras = []
+    for i, origin in enumerate(layout(n_printers)):
+        ip = f"bench-{i}"
+        pr = fem.printer(origin, PRINTER_OFFSET, ip, ax, PrinterName=f"printer {i + 1}")
+        pr.scaleFactor = buffer_size
+        pr.status = True
+        pr.attachPoller(poses)
+        printers.append(pr)
+
+        current, target = sample_pose(rng, distribution), sample_pose(rng, distribution)
+        poses.set(ip, current, target)
+
+        theta = math.radians(origin[2])
+        base = (origin[0] + PRINTER_OFFSET[0] * math.cos(theta) - PRINTER_OFFSET[1] * math.sin(theta),
+                origin[1] + PRINTER_OFFSET[0] * math.sin(theta) + PRINTER_OFFSET[1] * math.cos(theta))
+        n_scaras.append({'local_origin': origin[:2], 'robot_base': base, 'theta_local': origin[2],
+                         'end_effector_local': current[:2], 'arm_lengths': ARM_LENGTHS})
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        env = fem.envelope(printers)
+    plt.close(fig)
+    return env, poses, n_scaras
+
+
+def measure(function, repeats, warmup=5):
+    """
+    Time a function and measure its allocations in a separate, traced pass.
+    :return: Dictionary with p50/p99/mean latency in microseconds and allocated bytes per call.
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(warmup):
+            function()
+
+        timings = np.empty(repeats)
+        for i in range(repeats):
+            start_time = time.perf_counter()
+            function()
+            timings[i] = time.perf_counter() - start_time
+
+        alloc_repeats = max(1, repeats // 10)
+        tracemalloc.start()
+        snapshot_before = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        for _ in range(alloc_repeats):
+            function()
+        _, peak = tracemalloc.get_traced_memory()
+        snapshot_after = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+
+    allocated = sum(stat.size_diff for stat in snapshot_after.compare_to(snapshot_before, "filename") if stat.size_diff > 0)
+    return {"p50_us": float(np.percentile(timings, 50) * 1e6),
+            "p99_us": float(np.percentile(timings, 99) * 1e6),
+            "mean_us": float(timings.mean() * 1e6),
+            "peak_bytes": int(peak),
+            "retained_bytes_per_call": allocated / alloc_repeats}
+
+
+def run_case(n_printers, distribution, buffer_size, repeats):
+    env, poses, n_scaras = build_case(n_printers, distribution, buffer_size)
+    pr = env.printerList[0]
+    current, target = pr.getCurrentPosition(), pr.getTargetPosition()
+    coords = pr.getPolygonCoords(current, target)
+    bases, joints, end_effectors = scaras_to_arrays(n_scaras)
+
+    benchmarks = {
+        "printer.getScaledPolygon": lambda: pr.getScaledPolygon(current, target),
+        "printer.generate_all_possible_polygons": lambda: pr.generate_all_possible_polygons(coords),
+        "envelope.getIntersections": env.getIntersections,
+        "check_collision": lambda: check_collision(n_scaras, buffer_size=buffer_size),
+        "check_collision_batch": lambda: check_collision_batch(bases, joints, end_effectors, buffer_size=buffer_size),
+    }
+
+    results = []
+    for name, function in benchmarks.items():
+        result = measure(function, repeats)
+        result.update({"benchmark": name, "printers": n_printers, "distribution": distribution, "buffer": buffer_size})
+        results.append(result)
+        print(f"{name:40s} n={n_printers:3d} {distribution:9s} buffer={buffer_size:5.1f}  "
+              f"p50={result['p50_us']:10.1f}us  p99={result['p99_us']:10.1f}us  peak={result['peak_bytes']:9d}B")
+    return results
+
+
+def case_key(result):
+    return (result["benchmark"], result["printers"], result["distribution"], result["buffer"])
+
+
+def compare(results, baseline_path, threshold=1.1):
+    """
+    Print the p50 ratio of every case against a previous results file and flag slowdowns above threshold.
+    """
+    with open(baseline_path, "r") as baseline_file:
+        baseline = {case_key(r): r for r in json.load(baseline_file)["results"]}
+
+    print(f"\nComparison against {baseline_path} (ratio = new p50 / old p50):")
+    regressions = 0
+    for result in results:
+        old = baseline.get(case_key(result))
+        if old is None:
+            continue
+        ratio = result["p50_us"] / old["p50_us"]
+        flag = "  REGRESSION" if ratio > threshold else ""
+        regressions += bool(flag)
+        print(f"{result['benchmark']:40s} n={result['printers']:3d} {result['distribution']:9s} "
+              f"buffer={result['buffer']:5.1f}  {ratio:6.2f}x{flag}")
+    print(f"{regressions} regression(s) above {threshold:.2f}x")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the collision and envelope hot paths.")
+    parser.add_argument("--printers", type=int, nargs="+", default=[2, 4, 8, 12, 16])
+    parser.add_argument("--distributions", nargs="+", default=["uniform", "edge", "extended"])
+    parser.add_argument("--buffers", type=float, nargs="+", default=[5, 10, 20])
+    parser.add_argument("--repeats", type=int, default=200)
+    parser.add_argument("--label", default=datetime.now().strftime("%Y_%m_%d_%H_%M"))
+    parser.add_argument("--compare", help="results file of a previous run to compare against")
+    args = parser.parse_args()
+
+    results = []
+    for n_printers in args.printers:
+        for distribution in args.distributions:
+            for buffer_size in args.buffers:
+                results.extend(run_case(n_printers, distribution, buffer_size, args.repeats))
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    output = os.path.join(RESULTS_DIR, f"{args.label}.json")
+    with open(output, "w") as output_file:
+        json.dump({"label": args.label,
+                   "date": datetime.now().isoformat(),
+                   "python": platform.python_version(),
+                   "numpy": np.__version__,
+                   "results": results}, output_file, indent=1)
+    print(f"\nResults saved to {output}")
+
+    if args.compare:
+        compare(results, args.compare)
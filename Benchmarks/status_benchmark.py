@@ -0,0 +1,88 @@
+"""
+Benchmark of the status sources against the Duet simulator.
+
+Polls virtual printers back to back with each StatusSource and reports, per poll,
+the wall time, the number of HTTP requests, the bytes received and the JSON decode time:
+
+    python status_benchmark.py --printers 8 --latency 0.005 --polls 200
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import aiohttp
+import numpy as np
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+sys.path.insert(0, os.path.join(REPO, "LatencyTests"))
+
+import duet_simulator
+from StatusSources import FullStatusSource, SelectiveStatusSource, IncrementalStatusSource
+
+SOURCES = {"full": FullStatusSource,
+           "selective": SelectiveStatusSource,
+           "incremental": IncrementalStatusSource}
+
+# Square back and forth, so the printers are moving while they are polled
+MOVES = [((0, 0, 0), (300, 0, 0), 60), ((300, 0, 0), (0, 0, 0), 60)] * 100
+
+
+async def poll_printer(source_class, address, polls):
+    """
+    Poll one printer polls times in a row through a new source over one keep-alive connection.
+    :return: Tuple (poll times in seconds, source statistics).
+    """
+    source = source_class()
+    timings = np.empty(polls)
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=1)) as session:
+        for i in range(polls):
+            start_time = time.perf_counter()
+            await source.fetch(session, address)
+            timings[i] = time.perf_counter() - start_time
+    return timings, source.stats
+
+
+async def run_source(name, addresses, polls):
+    results = await asyncio.gather(*[poll_printer(SOURCES[name], address, polls) for address in addresses])
+    timings = np.concatenate([timing for timing, _ in results])
+    total_polls = polls * len(addresses)
+    requests = sum(mode["requests"] for _, stats in results for mode in stats.values())
+    received = sum(mode["bytes"] for _, stats in results for mode in stats.values())
+    decode = sum(mode["decodeTime"] for _, stats in results for mode in stats.values())
+    return {"source": name,
+            "p50_ms": float(np.percentile(timings, 50) * 1e3),
+            "p99_ms": float(np.percentile(timings, 99) * 1e3),
+            "requests_per_poll": requests / total_polls,
+            "bytes_per_poll": received / total_polls,
+            "decode_us_per_poll": decode / total_polls * 1e6}
+
+
+async def main(args):
+    printers = [duet_simulator.VirtualPrinter(f"Virtual {i}", MOVES, latency=args.latency, jitter=args.jitter)
+                for i in range(args.printers)]
+    for printer in printers:
+        printer.run_gcode("M24")
+    addresses, runners = await duet_simulator.start_printers(printers, base_port=args.port)
+
+    try:
+        for name in args.sources:
+            result = await run_source(name, addresses, args.polls)
+            print(f"{name:12s} p50={result['p50_ms']:7.2f}ms  p99={result['p99_ms']:7.2f}ms  "
+                  f"requests/poll={result['requests_per_poll']:5.2f}  bytes/poll={result['bytes_per_poll']:7.1f}  "
+                  f"decode/poll={result['decode_us_per_poll']:6.1f}us")
+    finally:
+        await duet_simulator.stop_printers(runners)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the status sources against the Duet simulator.")
+    parser.add_argument("--printers", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.005, help="simulated response delay in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--polls", type=int, default=200, help="polls per printer and source")
+    parser.add_argument("--port", type=int, default=8600)
+    parser.add_argument("--sources", nargs="+", default=list(SOURCES))
+    asyncio.run(main(parser.parse_args()))
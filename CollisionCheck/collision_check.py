@@ -1,9 +1,11 @@
 import time
 import math
+import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.patches as patches
-from shapely.geometry import Polygon, LineString
-from shapely.affinity import rotate, translate
+from shapely.geometry import Polygon
+
+from scara_kinematics import inverse_kinematics, frame_matrix, apply_frames
 
 
 def transform_to_global(local_origin, robot_base, theta_local, end_effector_local, arm_lengths):
@@ -17,49 +19,21 @@ def transform_to_global(local_origin, robot_base, theta_local, end_effector_loca
     :param end_effector_local: (x, y) position of the end-effector in the local frame.
     :param arm_lengths: (l1, l2) lengths of the first and second links of the arm.
     :return: List of positions [(base_x, base_y), (joint1_x, joint1_y), (end_effector_x, end_effector_y)] in global coordinates.
+    :raises ValueError: If the end-effector position is unreachable (see scara_kinematics.inverse_kinematics for a mask instead).
     """
     # Unpack inputs
     origin_x, origin_y = local_origin
-    base_x_global, base_y_global = robot_base
-    end_effector_x, end_effector_y = end_effector_local
     l1, l2 = arm_lengths
 
-    # Step 1: Convert robot base to the local frame
-    theta_local_rad = math.radians(theta_local)
-    base_x_local = (base_x_global - origin_x) * math.cos(-theta_local_rad) - (base_y_global - origin_y) * math.sin(-theta_local_rad)
-    base_y_local = (base_x_global - origin_x) * math.sin(-theta_local_rad) + (base_y_global - origin_y) * math.cos(-theta_local_rad)
-
-    # Step 2: Compute inverse kinematics for joint angles
-    dx = end_effector_x - base_x_local
-    dy = end_effector_y - base_y_local
-    r = math.sqrt(dx**2 + dy**2)
+    # Step 1: Transform the end-effector to the global frame with the printer's cached frame matrix
+    end_effector_global = apply_frames(frame_matrix(float(origin_x), float(origin_y), float(theta_local)), end_effector_local)
 
-    if r > l1 + l2:
+    # Step 2: Compute inverse kinematics for the intermediate joint position (global frame, the solution does not depend on the rotation)
+    _, _, joint1_global, reachable = inverse_kinematics(robot_base, end_effector_global, l1, l2)
+    if not reachable:
         raise ValueError("End-effector position is unreachable.")
 
-    # Theta2 (angle of the second arm relative to the first arm)
-    cos_theta2 = (r**2 - l1**2 - l2**2) / (2 * l1 * l2)
-    theta2 = math.acos(cos_theta2)
-
-    # Theta1 (angle of the first arm relative to the local frame's X-axis)
-    phi = math.atan2(dy, dx)
-    beta = math.atan2(l2 * math.sin(theta2), l1 + l2 * math.cos(theta2))
-    theta1 = phi - beta
-
-    # Compute the intermediate joint position (local frame)
-    joint1_local_x = base_x_local + l1 * math.cos(theta1)
-    joint1_local_y = base_y_local + l1 * math.sin(theta1)
-
-    # Step 3: Transform intermediate joint and end-effector to the global frame
-    joint1_global_x = origin_x + (joint1_local_x * math.cos(theta_local_rad) - joint1_local_y * math.sin(theta_local_rad))
-    joint1_global_y = origin_y + (joint1_local_x * math.sin(theta_local_rad) + joint1_local_y * math.cos(theta_local_rad))
-    joint1_global = (joint1_global_x, joint1_global_y)
-
-    end_effector_global_x = origin_x + (end_effector_x * math.cos(theta_local_rad) - end_effector_y * math.sin(theta_local_rad))
-    end_effector_global_y = origin_y + (end_effector_x * math.sin(theta_local_rad) + end_effector_y * math.cos(theta_local_rad))
-    end_effector_global = (end_effector_global_x, end_effector_global_y)
-
-    return [robot_base, joint1_global, end_effector_global]
+    return [robot_base, tuple(joint1_global.tolist()), tuple(end_effector_global.tolist())]
 
 
 def create_rectangle(p1, p2, width):
@@ -103,19 +77,12 @@ def check_collision(n_scaras, buffer_size=10):
     """
     link_rectangles = []
 
-    # Transform all SCARA robot positions to global coordinates and create buffered rectangles
-    for scara in n_scaras:
-        positions = transform_to_global(
-            scara['local_origin'],
-            scara['robot_base'],
-            scara['theta_local'],
-            scara['end_effector_local'],
-            scara['arm_lengths']
-        )
-
+    # Transform all SCARA robot positions to global coordinates in one call and create buffered rectangles
+    bases, joints, end_effectors = scaras_to_arrays(n_scaras)
+    for base, joint, end_effector in zip(bases.tolist(), joints.tolist(), end_effectors.tolist()):
         # Create rectangles for each link and apply buffer
-        link1 = create_rectangle(positions[0], positions[1], width=30).buffer(buffer_size)
-        link2 = create_rectangle(positions[1], positions[2], width=30).buffer(buffer_size)
+        link1 = create_rectangle(base, joint, width=30).buffer(buffer_size)
+        link2 = create_rectangle(joint, end_effector, width=30).buffer(buffer_size)
         link_rectangles.append((link1, link2))
 
     # Check for collisions between rectangles from different SCARA arms
@@ -135,6 +102,134 @@ def check_collision(n_scaras, buffer_size=10):
     return False  # No collision detected
 
 
+def segment_distances(p1, q1, p2, q2, eps=1e-12):
+    """
+    Closed-form minimum distance between segments p1-q1 and p2-q2, vectorized over any leading axes.
+
+    :param p1: (..., 2) start points of the first segments.
+    :param q1: (..., 2) end points of the first segments.
+    :param p2: (..., 2) start points of the second segments.
+    :param q2: (..., 2) end points of the second segments.
+    :param eps: Squared length below which a segment is treated as a point.
+    :return: Array of distances with the broadcast leading shape of the inputs.
+    """
+    p1, q1, p2, q2 = np.broadcast_arrays(*(np.asarray(v, dtype=float) for v in (p1, q1, p2, q2)))
+    d1 = q1 - p1
+    d2 = q2 - p2
+    r = p1 - p2
+
+    a = np.einsum('...i,...i->...', d1, d1)
+    e = np.einsum('...i,...i->...', d2, d2)
+    b = np.einsum('...i,...i->...', d1, d2)
+    c = np.einsum('...i,...i->...', d1, r)
+    f = np.einsum('...i,...i->...', d2, r)
+
+    point1 = a <= eps
+    point2 = e <= eps
+    safe_a = np.where(point1, 1.0, a)
+    safe_e = np.where(point2, 1.0, e)
+
+    # General case: closest points of the infinite lines, clamped to the first segment
+    denom = a * e - b * b
+    parallel = denom <= eps * np.maximum(a * e, eps)
+    s = np.where(parallel, 0.0, np.clip((b * f - c * e) / np.where(parallel, 1.0, denom), 0.0, 1.0))
+    t = (b * s + f) / safe_e
+
+    # Re-clamp t to the second segment and recompute s for the clamped end
+    s = np.where(t < 0.0, np.clip(-c / safe_a, 0.0, 1.0), np.where(t > 1.0, np.clip((b - c) / safe_a, 0.0, 1.0), s))
+    t = np.clip(t, 0.0, 1.0)
+
+    # Degenerate segments collapse to point-segment or point-point distances
+    s = np.where(point2, np.clip(-c / safe_a, 0.0, 1.0), s)
+    t = np.where(point2, 0.0, t)
+    t = np.where(point1, np.clip(f / safe_e, 0.0, 1.0), t)
+    s = np.where(point1, 0.0, s)
+
+    closest1 = p1 + d1 * s[..., None]
+    closest2 = p2 + d2 * t[..., None]
+    return np.linalg.norm(closest1 - closest2, axis=-1)
+
+
+def capsule_collision_matrix(bases, joints, end_effectors, width=30, buffer_size=10):
+    """
+    Pairwise collision test for N SCARA arms with each link modelled as a capsule.
+
+    A capsule of radius width / 2 + buffer_size around each link contains the buffered
+    rectangle built by check_collision, so this test is conservative with respect to it.
+
+    :param bases: (N, 2) array of arm base positions in the global frame.
+    :param joints: (N, 2) array of intermediate joint positions in the global frame.
+    :param end_effectors: (N, 2) array of end-effector positions in the global frame.
+    :param width: Width of the rectangular links (default: 30mm).
+    :param buffer_size: Buffer size added around the links (default: 10mm).
+    :return: (N, N) symmetric boolean array, True where arm i and arm j collide. The diagonal is False.
+    """
+    radius = width / 2 + buffer_size
+    return link_distance_matrix(bases, joints, end_effectors) <= 2 * radius
+
+
+def link_distance_matrix(bases, joints, end_effectors):
+    """
+    Smallest distance between the link centerlines of every pair of SCARA arms.
+
+    :param bases: (N, 2) array of arm base positions in the global frame.
+    :param joints: (N, 2) array of intermediate joint positions in the global frame.
+    :param end_effectors: (N, 2) array of end-effector positions in the global frame.
+    :return: (N, N) symmetric array of distances in mm, the diagonal is infinite.
+    """
+    bases = np.asarray(bases, dtype=float)
+    joints = np.asarray(joints, dtype=float)
+    end_effectors = np.asarray(end_effectors, dtype=float)
+
+    # (N, 2 links, 2 coords) start and end points of every link
+    starts = np.stack((bases, joints), axis=1)
+    ends = np.stack((joints, end_effectors), axis=1)
+
+    # Broadcast to (N, N, 2, 2): arm i, arm j, link of i, link of j
+    distances = segment_distances(starts[:, None, :, None, :], ends[:, None, :, None, :],
+                                  starts[None, :, None, :, :], ends[None, :, None, :, :])
+    clearance = distances.min(axis=(2, 3))
+    np.fill_diagonal(clearance, np.inf)
+    return clearance
+
+
+def check_collision_batch(bases, joints, end_effectors, width=30, buffer_size=10):
+    """
+    Vectorized equivalent of check_collision operating on arrays for the whole fleet.
+
+    :param bases: (N, 2) array of arm base positions in the global frame.
+    :param joints: (N, 2) array of intermediate joint positions in the global frame.
+    :param end_effectors: (N, 2) array of end-effector positions in the global frame.
+    :param width: Width of the rectangular links (default: 30mm).
+    :param buffer_size: Buffer size added around the links (default: 10mm).
+    :return: True if any collision is detected, False otherwise.
+    """
+    return bool(capsule_collision_matrix(bases, joints, end_effectors, width, buffer_size).any())
+
+
+def scaras_to_arrays(n_scaras):
+    """
+    Convert the list-of-dictionaries SCARA description used by check_collision into global position arrays.
+
+    All arms are solved in one inverse kinematics call, in the global frame.
+
+    :param n_scaras: List of dictionaries as accepted by check_collision.
+    :return: Tuple (bases, joints, end_effectors) of (N, 2) arrays in global coordinates.
+    :raises ValueError: If an end-effector position is unreachable, like transform_to_global.
+    """
+    frames = np.array([frame_matrix(float(scara['local_origin'][0]), float(scara['local_origin'][1]), float(scara['theta_local']))
+                       for scara in n_scaras]).reshape(-1, 3, 3)
+    bases = np.array([scara['robot_base'] for scara in n_scaras], dtype=float).reshape(-1, 2)
+    local = np.array([scara['end_effector_local'] for scara in n_scaras], dtype=float).reshape(-1, 2)
+    arm_lengths = np.array([scara['arm_lengths'] for scara in n_scaras], dtype=float).reshape(-1, 2)
+
+    end_effectors = apply_frames(frames, local)
+    _, _, joints, reachable = inverse_kinematics(bases, end_effectors, arm_lengths[:, 0], arm_lengths[:, 1])
+    if not reachable.all():
+        raise ValueError("End-effector position is unreachable.")
+    return bases, joints, end_effectors
+
+
 def plot_scaras(n_scaras, buffer_size=10):
     """
     Plot n SCARA robots in the global frame, showing buffered rectangular links.
@@ -211,5 +306,12 @@ if __name__ == "__main__":
     print(time_taken)
     print("Collision Detected:" if collision else "No Collision")
 
+    bases, joints, end_effectors = scaras_to_arrays(n_scaras)
+    start_time = time.time()
+    collision = check_collision_batch(bases, joints, end_effectors, buffer_size=10)
+    end_time = time.time()
+    print(end_time - start_time)
+    print("Collision Detected (batch):" if collision else "No Collision (batch)")
+
     # Plot SCARA robots with buffers
     plot_scaras(n_scaras, buffer_size=10)
\ No newline at end of file
@@ -0,0 +1,243 @@
+import hashlib
+import json
+import math
+import os
+
+import numpy as np
+from scipy.ndimage import binary_dilation
+
+from scara_kinematics import THETA1_RANGE, THETA2_RANGE, inverse_kinematics, forward_kinematics, within_joint_limits, elbow_positions
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".conflict_cache")
+CACHE_VERSION = 2
+
+
+def disk(radius_cells):
+    """
+    Boolean disk structuring element with the given radius in cells.
+    """
+    r = int(math.ceil(radius_cells))
+    y, x = np.mgrid[-r:r + 1, -r:r + 1]
+    return x**2 + y**2 <= radius_cells**2
+
+
+class ConflictMaps:
+    """
+    Rasterized reachability and pairwise-conflict maps for a fixed printer layout.
+
+    reach[i] marks the cells printer i's end-effector can reach.
+    conflict[i, j] marks the cells where printer i's end-effector can be while some part of its
+    arm (plus both buffers) overlaps space that printer j's arm can occupy. Two printers can only
+    touch when each one's end-effector lies inside its conflict map for the other, so pairs failing
+    that O(1) lookup never need an exact test.
+
+    The buffers may grow by up to `uncertainty` per printer (the uncertainty of predicted positions)
+    without a conflict being missed; printers with a larger uncertainty are never filtered out.
+    """
+    def __init__(self, bases, rotations, arm_lengths, radii, resolution=5.0, uncertainty=0.0):
+        """
+        :param bases: (N, 2) base positions in the global frame.
+        :param rotations: (N,) rotation of each printer frame in degrees, counterclockwise.
+        :param arm_lengths: (N, 2) lengths of the first and second links.
+        :param radii: (N,) buffer around each arm's links.
+        :param resolution: Size of a grid cell in mm.
+        :param uncertainty: Largest growth of each printer's buffer in mm the maps allow for.
+        """
+        self.bases = np.asarray(bases, dtype=float)
+        self.rotations = np.asarray(rotations, dtype=float)
+        self.arm_lengths = np.asarray(arm_lengths, dtype=float)
+        self.radii = np.asarray(radii, dtype=float)
+        self.resolution = float(resolution)
+        self.uncertainty = float(uncertainty)
+
+        reach = self.arm_lengths.sum(axis=1) + self.radii + self.uncertainty
+        margin = 2 * self.resolution
+        self.lower = (self.bases - reach[:, None]).min(axis=0) - margin
+        upper = (self.bases + reach[:, None]).max(axis=0) + margin
+        self.shape = tuple(np.ceil((upper - self.lower) / self.resolution).astype(int)[::-1])  # (rows = y, columns = x)
+
+        self.reach = None
+        self.conflict = None
+
+    def layout_key(self):
+        """
+        Hash identifying the layout, used as the cache file name.
+        """
+        layout = {"version": CACHE_VERSION,
+                  "bases": self.bases.round(6).tolist(),
+                  "rotations": self.rotations.round(6).tolist(),
+                  "arm_lengths": self.arm_lengths.round(6).tolist(),
+                  "radii": self.radii.round(6).tolist(),
+                  "resolution": self.resolution,
+                  "uncertainty": self.uncertainty,
+                  "theta_ranges": [THETA1_RANGE, THETA2_RANGE]}
+        return hashlib.sha1(json.dumps(layout, sort_keys=True).encode()).hexdigest()
+
+    """
+    Grid helpers
+    """
+    def cell_centers(self):
+        rows, columns = self.shape
+        x = self.lower[0] + (np.arange(columns) + 0.5) * self.resolution
+        y = self.lower[1] + (np.arange(rows) + 0.5) * self.resolution
+        return np.stack(np.meshgrid(x, y), axis=-1)  # (rows, columns, 2)
+
+    def to_cells(self, points):
+        """
+        :param points: (..., 2) positions in the global frame.
+        :return: Tuple (rows, columns, inside) of integer cell indices and a mask of points inside the grid.
+        """
+        cells = np.floor((np.asarray(points, dtype=float)[..., :2] - self.lower) / self.resolution).astype(int)
+        columns, rows = cells[..., 0], cells[..., 1]
+        inside = (rows >= 0) & (rows < self.shape[0]) & (columns >= 0) & (columns < self.shape[1])
+        return np.clip(rows, 0, self.shape[0] - 1), np.clip(columns, 0, self.shape[1] - 1), inside
+
+    def rasterize(self, points):
+        grid = np.zeros(self.shape, dtype=bool)
+        rows, columns, inside = self.to_cells(points.reshape(-1, 2))
+        grid[rows[inside], columns[inside]] = True
+        return grid
+
+    """
+    Precompute
+    """
+    def reachable(self, i, points):
+        """
+        Mask of end-effector positions printer i can reach within its joint ranges.
+        """
+        l1, l2 = self.arm_lengths[i]
+        theta1, theta2, elbows, in_annulus = inverse_kinematics(self.bases[i], points, l1, l2, tolerance=0.0)
+        return in_annulus & within_joint_limits(theta1, theta2, math.radians(self.rotations[i]))
+
+    def arm_points(self, i, nozzles, samples):
+        """
+        Points along both links of printer i for each end-effector position.
+        :return: (..., 2 * samples, 2) array.
+        """
+        l1, l2 = self.arm_lengths[i]
+        elbows = elbow_positions(self.bases[i], nozzles, l1, l2)
+        fraction = np.linspace(0.0, 1.0, samples)[:, None]
+        link1 = self.bases[i] + fraction * (elbows[..., None, :] - self.bases[i])
+        link2 = elbows[..., None, :] + fraction * (nozzles[..., None, :] - elbows[..., None, :])
+        return np.concatenate((link1, link2), axis=-2)
+
+    def body_coverage(self, i):
+        """
+        Cells any part of printer i's arm can occupy over its whole joint range (without buffer).
+        Samples are at most one cell apart, the dilation margin in compute covers the gaps.
+        """
+        l1, l2 = self.arm_lengths[i]
+        step = self.resolution / (l1 + l2)  # angular step moving the arm tip by one cell at most
+        theta1 = np.arange(THETA1_RANGE[0], THETA1_RANGE[1] + step, step) + math.radians(self.rotations[i])
+        theta2 = np.arange(THETA2_RANGE[0], THETA2_RANGE[1] + step, step)
+        fraction = np.linspace(0.0, 1.0, int(math.ceil(max(l1, l2) / self.resolution)) + 1)[:, None]
+
+        grid = np.zeros(self.shape, dtype=bool)
+        for t1 in np.array_split(theta1, max(1, len(theta1) // 32)):  # chunks keep the sample arrays small
+            elbows, nozzles = forward_kinematics(self.bases[i], t1[:, None], theta2[None, :], l1, l2)
+            elbows = elbows[:, 0]
+
+            link1 = self.bases[i] + fraction * (elbows[:, None, :] - self.bases[i])
+            link2 = elbows[:, None, None, :] + fraction * (nozzles[..., None, :] - elbows[:, None, None, :])
+            grid |= self.rasterize(link1) | self.rasterize(link2)
+        return grid
+
+    def compute(self):
+        """
+        Build the reachability and conflict maps for every printer and ordered pair.
+        """
+        n = len(self.bases)
+        centers = self.cell_centers()
+        self.reach = np.stack([self.reachable(i, centers) for i in range(n)])
+        coverage = [self.body_coverage(i) for i in range(n)]
+
+        samples = int(math.ceil(self.arm_lengths.max() / self.resolution)) + 1
+        self.conflict = np.zeros((n, n) + self.shape, dtype=bool)
+        for i in range(n):
+            rows, columns = np.nonzero(self.reach[i])
+            body = self.arm_points(i, centers[rows, columns], samples)
+            for j in range(n):
+                if i == j:
+                    continue
+                # Two extra cells of margin cover the sampling and rasterization of both arms
+                margin = self.radii[i] + self.radii[j] + 2 * self.uncertainty
+                zone = binary_dilation(coverage[j], disk(margin / self.resolution + 2))
+                body_rows, body_columns, inside = self.to_cells(body)
+                hits = (zone[body_rows, body_columns] & inside).any(axis=-1)
+                self.conflict[i, j, rows[hits], columns[hits]] = True
+
+            # End-effector quantization: a position near a conflicting cell may conflict too
+            for j in range(n):
+                self.conflict[i, j] = binary_dilation(self.conflict[i, j], disk(1.5))
+        return self
+
+    """
+    Cache
+    """
+    def save(self, path):
+        np.savez_compressed(path, reach=self.reach, conflict=self.conflict, lower=self.lower)
+
+    def load(self, path):
+        with np.load(path) as data:
+            self.reach = data["reach"]
+            self.conflict = data["conflict"]
+        return self
+
+    @classmethod
+    def for_layout(cls, bases, rotations, arm_lengths, radii, resolution=5.0, cache_dir=CACHE_DIR, uncertainty=0.0):
+        """
+        Load the maps for a layout from the disk cache, computing and caching them on a miss.
+        """
+        maps = cls(bases, rotations, arm_lengths, radii, resolution, uncertainty)
+        path = os.path.join(cache_dir, maps.layout_key() + ".npz")
+        if os.path.exists(path):
+            return maps.load(path)
+
+        maps.compute()
+        os.makedirs(cache_dir, exist_ok=True)
+        maps.save(path)
+        return maps
+
+    """
+    Lookups
+    """
+    def may_conflict(self, i, j, nozzle_i, nozzle_j):
+        """
+        O(1) test of whether printers i and j can touch with their end-effectors at these global positions.
+        Positions outside the grid are treated as possibly conflicting.
+        """
+        ri, ci, inside_i = self.to_cells(nozzle_i)
+        rj, cj, inside_j = self.to_cells(nozzle_j)
+        return bool((not inside_i or self.conflict[i, j, ri, ci]) and (not inside_j or self.conflict[j, i, rj, cj]))
+
+    def candidate_pairs(self, paths, uncertainties=None):
+        """
+        Pairs of printers that may conflict somewhere along their end-effector paths.
+
+        :param paths: List of (K_i, 2) arrays of global end-effector positions sampled along each printer's move.
+        :param uncertainties: Optional (N,) growth of each printer's buffer in mm. Printers above the
+                              maps' uncertainty are paired with every other printer.
+        :return: (N, N) symmetric boolean array.
+        """
+        n = len(paths)
+        hits = np.zeros((n, n), dtype=bool)
+        for i, path in enumerate(paths):
+            rows, columns, inside = self.to_cells(path)
+            hits[i] = (self.conflict[i][:, rows, columns] | ~inside).any(axis=-1)
+        if uncertainties is not None:
+            uncertain = np.asarray(uncertainties, dtype=float) > self.uncertainty
+            hits[uncertain] = True
+            hits[:, uncertain] = True
+        pairs = hits & hits.T
+        np.fill_diagonal(pairs, False)
+        return pairs
+
+
+def sample_path(start, end, spacing):
+    """
+    Points every `spacing` mm along the segment from start to end, both ends included.
+    """
+    start = np.asarray(start, dtype=float)
+    end = np.asarray(end, dtype=float)
+    count = int(math.ceil(np.linalg.norm(end - start) / spacing)) + 1
+    return start + np.linspace(0.0, 1.0, max(count, 2))[:, None] * (end - start)
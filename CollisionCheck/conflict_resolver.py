@@ -0,0 +1,86 @@
+import numpy as np
+
+
+def conflict_components(n, edges):
+    """
+    Connected components of the conflict graph that contain at least one edge.
+
+    :param n: Number of printers.
+    :param edges: Iterable of (i, j) printer index pairs in conflict.
+    :return: List of (vertices, edges) per component, vertices sorted and edges using the global indices.
+    """
+    parent = list(range(n))
+
+    def find(v):
+        while parent[v] != v:
+            parent[v] = parent[parent[v]]
+            v = parent[v]
+        return v
+
+    edges = [(min(i, j), max(i, j)) for i, j in edges if i != j]
+    for i, j in edges:
+        parent[find(i)] = find(j)
+
+    components = {}
+    for i, j in edges:
+        vertices, component_edges = components.setdefault(find(i), (set(), []))
+        vertices.update((i, j))
+        component_edges.append((i, j))
+    return [(sorted(vertices), component_edges) for vertices, component_edges in components.values()]
+
+
+def exact_cover(vertices, edges, weights):
+    """
+    Minimum weight vertex cover of a small component by enumerating every subset of its vertices at once.
+    """
+    m = len(vertices)
+    local = {v: k for k, v in enumerate(vertices)}
+    subsets = (np.arange(1 << m)[:, None] >> np.arange(m)[None, :]) & 1 == 1   # (2^m, m)
+
+    a = np.array([local[i] for i, j in edges])
+    b = np.array([local[j] for i, j in edges])
+    covers = (subsets[:, a] | subsets[:, b]).all(axis=1)
+
+    costs = np.where(covers, subsets @ np.asarray([weights[v] for v in vertices], dtype=float), np.inf)
+    best = subsets[np.argmin(costs)]
+    return {v for v, chosen in zip(vertices, best) if chosen}
+
+
+def approximate_cover(vertices, edges, weights):
+    """
+    Local-ratio 2-approximation of the minimum weight vertex cover, for components too large to enumerate.
+    Vertices whose edges stay covered without them are dropped again, most expensive first.
+    """
+    residual = {v: float(weights[v]) for v in vertices}
+    cover = set()
+    for i, j in edges:
+        if i in cover or j in cover:
+            continue
+        paid = min(residual[i], residual[j])
+        residual[i] -= paid
+        residual[j] -= paid
+        cover.update(v for v in (i, j) if residual[v] <= 0)
+
+    for v in sorted(cover, key=lambda v: -weights[v]):
+        if all((i in cover and i != v) or (j in cover and j != v) for i, j in edges if v in (i, j)):
+            cover.discard(v)
+    return cover
+
+
+def min_weight_vertex_cover(n, edges, weights, exact_limit=16):
+    """
+    Smallest total weight set of printers to pause so that no conflict is left between two running printers.
+
+    :param n: Number of printers.
+    :param edges: Iterable of (i, j) printer index pairs in conflict.
+    :param weights: (n,) cost of pausing each printer.
+    :param exact_limit: Components with up to this many printers are solved exactly, larger ones approximately.
+    :return: Set of printer indices to pause.
+    """
+    cover = set()
+    for vertices, component_edges in conflict_components(n, edges):
+        if len(vertices) <= exact_limit:
+            cover |= exact_cover(vertices, component_edges, weights)
+        else:
+            cover |= approximate_cover(vertices, component_edges, weights)
+    return cover
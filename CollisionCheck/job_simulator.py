@@ -0,0 +1,450 @@
+import argparse
+import math
+import os
+import sys
+import time
+
+import numpy as np
+
+from collision_check import segment_distances
+from scara_kinematics import elbow_positions, frame_matrix, apply_frames
+
+
+# Nominal end-effector speed in mm/s for the move leaving a point of each type:
+# 0 = travel (G0), 1 = printing (G1 with extrusion), 2 = move to a new cell (retract, raise, travel, lower, prime)
+DEFAULT_SPEEDS = {0: 100.0, 1: 20.0, 2: 100.0}
+
+
+def local_to_global(points, local_origin, theta_local):
+    """
+    :param points: (..., 2) positions in a printer's local frame.
+    :param local_origin: (X, Y) position of the local frame origin in the global frame.
+    :param theta_local: Rotation of the local frame in degrees, counterclockwise.
+    :return: (..., 2) positions in the global frame.
+    """
+    return apply_frames(frame_matrix(float(local_origin[0]), float(local_origin[1]), float(theta_local)), points)
+
+
+def segment_durations(path, moves, speeds=None, retract_time=1.0):
+    """
+    Time each robot takes to reach every point of its toolpath from the previous one.
+
+    :param path: (K, 2) toolpath points.
+    :param moves: (K,) move type of each point, the move leaving point k is of type moves[k].
+    :param speeds: {move type: speed in mm/s}, defaults to DEFAULT_SPEEDS.
+    :param retract_time: Extra time in seconds of a type 2 move for the retraction, raise, lower and prime.
+    :return: (K,) durations, the first one is 0.
+    """
+    speeds = DEFAULT_SPEEDS if speeds is None else speeds
+    path = np.asarray(path, dtype=float)
+    moves = np.asarray(moves)
+
+    lengths = np.linalg.norm(np.diff(path[:, :2], axis=0), axis=-1)
+    move_types = moves[:-1]
+    speed = np.full(len(move_types), speeds[1], dtype=float)
+    for move_type, value in speeds.items():
+        speed[move_types == move_type] = value
+
+    durations = np.zeros(len(path))
+    durations[1:] = lengths / speed + np.where(move_types == 2, retract_time, 0.0)
+    return durations
+
+
+def find_runs(mask):
+    """
+    :param mask: (K,) boolean array.
+    :return: List of (start, end) index ranges where mask is True, end exclusive.
+    """
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    return list(zip(np.nonzero(edges == 1)[0], np.nonzero(edges == -1)[0]))
+
+
+class JobSimulator:
+    """
+    Offline collision pre-verification of a multi-robot print job.
+
+    Every robot's toolpath is stepped forward in time at nominal feedrates on a common time grid.
+    The arms are solved with the inverse kinematics of scara_kinematics (vectorized over all
+    time steps), and the links are tested pairwise as capsules. Motion between two time steps is
+    covered by inflating the capsules by the distance any joint travels in one step.
+    """
+    def __init__(self, robots, speeds=None, retract_time=1.0, width=30, buffer_size=10, dt=0.05, sync_layers=False,
+                 priorities=None, pause_time=0.0):
+        """
+        :param robots: List of dictionaries, each containing:
+                       - 'local_origin': (X, Y)
+                       - 'robot_base': (X, Y)
+                       - 'theta_local': float (degrees)
+                       - 'arm_lengths': (l1, l2)
+                       - 'path': (K, 2) toolpath points in the local frame
+                       - 'moves': (K,) move type of each point
+                       - 'layer_starts': optional index of the first point of every layer
+        :param speeds: {move type: speed in mm/s}, defaults to DEFAULT_SPEEDS.
+        :param retract_time: Extra duration in seconds of a type 2 move.
+        :param width: Width of the links (default: 30mm).
+        :param buffer_size: Buffer size added around the links (default: 10mm).
+        :param dt: Time step in seconds.
+        :param sync_layers: Start every layer on all robots at the same time, like resuming all printers
+                            together after the pause at the start of each layer. A collection of layer
+                            indices only synchronizes those layers.
+        :param priorities: (N,) priority of each robot, the lower priority robot of a conflicting pair waits.
+                           Defaults to the order of robots (the first robot has the highest priority).
+        :param pause_time: Duration in seconds of the pause and resume macros run at every synchronized layer.
+        """
+        self.robots = robots
+        n = len(robots)
+        self.dt = dt
+        self.sync_layers = sync_layers
+        self.pause_time = pause_time
+        self.priorities = np.arange(n, 0, -1) if priorities is None else np.asarray(priorities)
+
+        self.bases = np.array([robot['robot_base'] for robot in robots], dtype=float)
+        self.arm_lengths = np.array([robot['arm_lengths'] for robot in robots], dtype=float)
+        self.radii = np.full(n, width / 2 + buffer_size, dtype=float)
+
+        self.paths = [local_to_global(robot['path'], robot['local_origin'], robot['theta_local']) for robot in robots]
+        self.durations = [segment_durations(robot['path'], robot['moves'], speeds, retract_time) for robot in robots]
+        self.layer_starts = [np.asarray(robot.get('layer_starts', [0]), dtype=int) for robot in robots]
+        self.waits = [np.zeros(len(path)) for path in self.paths]   # dwell at each point before leaving it
+
+        # Pairs whose arms can never reach each other are never tested
+        reach = self.arm_lengths.sum(axis=1) + self.radii
+        gap = np.linalg.norm(self.bases[:, None, :] - self.bases[None, :, :], axis=-1)
+        self.pairs = [(i, j) for i in range(n) for j in range(i + 1, n) if gap[i, j] <= reach[i] + reach[j]]
+
+        self.update_timeline()
+
+    """
+    Timeline
+    """
+    def update_timeline(self):
+        """
+        Recompute the arrival and departure time of every point from the durations, waits and layer synchronization.
+        """
+        self.sync_waits = [np.zeros(len(path)) for path in self.paths]
+        self.arrivals, self.departures = self.point_times(self.waits)
+
+        if self.sync_layers:
+            shift = np.zeros(len(self.paths))
+            layers = max(len(starts) for starts in self.layer_starts)
+            for layer in range(1, layers):
+                if self.sync_layers is not True and layer not in self.sync_layers:
+                    continue
+                # Each robot pauses on the last point of the previous layer until every robot got there.
+                # Scheduled waits on that point come after the pause, like a dwell after the resume.
+                robots = [r for r, starts in enumerate(self.layer_starts) if layer < len(starts) and starts[layer] > 0]
+                if len(robots) < 2:
+                    continue
+                ready = {r: self.arrivals[r][self.layer_starts[r][layer] - 1] + shift[r] for r in robots}
+                start = max(ready.values()) + self.pause_time
+                for r in robots:
+                    self.sync_waits[r][self.layer_starts[r][layer] - 1] += start - ready[r]
+                    shift[r] += start - ready[r]
+            self.arrivals, self.departures = self.point_times([w + s for w, s in zip(self.waits, self.sync_waits)])
+
+        self.duration = max(float(departures[-1]) for departures in self.departures if len(departures))
+
+    def idle_time(self):
+        """
+        :return: Total time in seconds the robots spend paused at synchronized layers or waiting, summed over robots.
+        """
+        return float(sum(waits.sum() + sync_waits.sum() for waits, sync_waits in zip(self.waits, self.sync_waits)))
+
+    def point_times(self, waits):
+        arrivals = []
+        departures = []
+        for durations, wait in zip(self.durations, waits):
+            arrival = np.cumsum(durations)
+            arrival[1:] += np.cumsum(wait)[:-1]
+            arrivals.append(arrival)
+            departures.append(arrival + wait)
+        return arrivals, departures
+
+    def positions(self, times):
+        """
+        :param times: (K,) sample times in seconds.
+        :return: (N, K, 2) end-effector positions in the global frame. Robots stay on their first point before
+                 they start and on their last point once they are done.
+        """
+        positions = np.empty((len(self.paths), len(times), 2))
+        for r, path in enumerate(self.paths):
+            knots = np.column_stack((self.arrivals[r], self.departures[r])).ravel()
+            x = np.repeat(path[:, 0], 2)
+            y = np.repeat(path[:, 1], 2)
+            positions[r, :, 0] = np.interp(times, knots, x)
+            positions[r, :, 1] = np.interp(times, knots, y)
+        return positions
+
+    def point_at(self, robot, t):
+        """
+        Index of the last point the robot left before time t (0 if it has not left its first point yet).
+        """
+        return max(int(np.searchsorted(self.departures[robot], t, side='right')) - 1, 0)
+
+    def layer_of(self, robot, point):
+        return int(np.searchsorted(self.layer_starts[robot], point, side='right')) - 1
+
+    """
+    Conflicts
+    """
+    def scan(self, t_start=0.0, t_end=None, first_only=False, chunk=4000):
+        """
+        Step all robots from t_start to t_end and find every interval in which two arms are in contact.
+
+        :param first_only: Stop at the end of the first conflict found.
+        :param chunk: Number of time steps evaluated together.
+        :return: List of conflicts sorted by start time, each a dictionary with the robot pair, the start and end
+                 time of the contact, the smallest clearance between the link capsules and the layer of each robot.
+        """
+        t_end = self.duration if t_end is None else t_end
+        if not self.pairs:
+            return []
+        pi = np.array([i for i, j in self.pairs])
+        pj = np.array([j for i, j in self.pairs])
+        l1 = self.arm_lengths[:, 0, None]
+        l2 = self.arm_lengths[:, 1, None]
+
+        conflicts = []
+        open_runs = {}      # pair index -> (start time, smallest clearance) of a contact still going on at the end of a chunk
+        first = int(math.floor(t_start / self.dt))
+        last = int(math.ceil(t_end / self.dt))
+        for chunk_start in range(first, last + 1, chunk):
+            steps = np.arange(chunk_start, min(chunk_start + chunk, last + 1) + 1)  # one extra step for the motion bound
+            times = steps * self.dt
+
+            nozzles = self.positions(times)                                                # (N, K + 1, 2)
+            elbows = elbow_positions(self.bases[:, None, :], nozzles, l1, l2)
+            bases = np.broadcast_to(self.bases[:, None, :], nozzles.shape)
+
+            # Distance any joint of each robot travels during each step
+            travel = np.maximum(np.linalg.norm(np.diff(elbows, axis=1), axis=-1),
+                                np.linalg.norm(np.diff(nozzles, axis=1), axis=-1))    # (N, K)
+            starts = np.stack((bases, elbows), axis=2)[:, :-1]                           # (N, K, 2 links, 2)
+            ends = np.stack((elbows, nozzles), axis=2)[:, :-1]
+
+            # (P, K, 2, 2): pair, time step, link of i, link of j
+            distances = segment_distances(starts[pi][:, :, :, None, :], ends[pi][:, :, :, None, :],
+                                          starts[pj][:, :, None, :, :], ends[pj][:, :, None, :, :])
+            clearance = distances.min(axis=(2, 3))
+            limit = (self.radii[pi] + self.radii[pj])[:, None] + 0.5 * (travel[pi] + travel[pj])
+            contact = clearance <= limit
+
+            times = times[:-1]
+            for p in range(len(self.pairs)):
+                runs = find_runs(contact[p])
+                if p in open_runs and (not runs or runs[0][0] > 0):
+                    conflicts.append(self.conflict(p, *open_runs.pop(p), times[0]))
+                for k, (run_start, run_end) in enumerate(runs):
+                    start, smallest = times[run_start], clearance[p, run_start:run_end].min()
+                    if k == 0 and run_start == 0 and p in open_runs:
+                        start, previous = open_runs.pop(p)
+                        smallest = min(smallest, previous)
+                    if run_end == len(times):
+                        open_runs[p] = (start, smallest)
+                    else:
+                        conflicts.append(self.conflict(p, start, smallest, times[run_end]))
+
+            if first_only and conflicts:
+                earliest = min(c['start'] for c in conflicts)
+                if all(start > earliest for start, _ in open_runs.values()):
+                    break
+
+        end = (last + 1) * self.dt
+        conflicts.extend(self.conflict(p, start, smallest, end) for p, (start, smallest) in open_runs.items())
+        conflicts.sort(key=lambda c: c['start'])
+        return conflicts[:1] if first_only else conflicts
+
+    def conflict(self, p, start, smallest, end):
+        i, j = self.pairs[p]
+        return {'pair': (i, j),
+                'start': float(start),
+                'end': float(end),
+                'clearance': float(smallest),
+                'layers': (self.layer_of(i, self.point_at(i, start)), self.layer_of(j, self.point_at(j, start)))}
+
+    """
+    Schedule
+    """
+    def schedule_waits(self, margin=1.0, max_iterations=1000):
+        """
+        Greedily insert waits until the job runs without conflicts.
+
+        The first conflict is resolved by making the lower priority robot of the pair dwell on the last point it
+        left before the conflict until margin seconds after the conflict ended. The job is then re-simulated from
+        that point on. If waiting on that robot cannot clear the conflict (it is already parked where the other
+        arm goes), the other robot waits instead, and conflicts neither robot can wait out are reported as unresolved.
+
+        :return: Tuple (waits, unresolved). waits is a list of dictionaries with the robot, the toolpath point
+                 to dwell on, its layer, the time the dwell starts in the final schedule and its length in seconds.
+        """
+        added = []
+        unresolved = []
+        tried = {}
+        last = None
+        floor = 0.0         # everything before this time is final
+        t_start = 0.0
+        for _ in range(max_iterations):
+            conflicts = self.scan(t_start, first_only=True)
+            if not conflicts:
+                break
+            c = conflicts[0]
+            i, j = c['pair']
+            order = (j, i) if self.priorities[j] <= self.priorities[i] else (i, j)
+
+            key = (c['pair'], round(c['start'] / self.dt))
+            attempts = tried.get(key, 0)
+            if attempts and last is not None:
+                # The previous wait left this conflict where it was, drop it
+                robot, point, seconds = last
+                self.waits[robot][point] -= seconds
+                added.remove((robot, point))
+                self.update_timeline()
+            last = None
+
+            if attempts >= 2:
+                unresolved.append(c)
+                floor = t_start = c['end']
+                continue
+            tried[key] = attempts + 1
+
+            robot = order[attempts]
+            point = self.point_at(robot, c['start'])
+            restart = self.departures[robot][point]
+            # Stay on the point until the end of the contact so the other arm has moved on before this one starts its move
+            seconds = c['end'] - restart + margin
+            self.waits[robot][point] += seconds
+            added.append((robot, point))
+            last = (robot, point, seconds)
+            self.update_timeline()
+            t_start = max(floor, restart - self.dt)
+
+        waits = []
+        for robot, point in sorted(set(added)):
+            waits.append({'robot': robot,
+                          'point': point,
+                          'layer': self.layer_of(robot, point),
+                          'time': float(self.arrivals[robot][point]),
+                          'seconds': float(self.waits[robot][point])})
+        waits.sort(key=lambda w: w['time'])
+        return waits, unresolved
+
+
+def verify_job(robots, margin=1.0, **kwargs):
+    """
+    Report every conflict of a job run as sliced and the waits that remove them.
+
+    :param robots: Robots as described in JobSimulator.
+    :param kwargs: Other JobSimulator options.
+    :return: Dictionary with the conflicts, the waits, the conflicts left unresolved and the job duration
+             in seconds before and after adding the waits.
+    """
+    simulator = JobSimulator(robots, **kwargs)
+    conflicts = simulator.scan()
+    duration = simulator.duration
+    waits, unresolved = simulator.schedule_waits(margin) if conflicts else ([], [])
+    return {'conflicts': conflicts,
+            'waits': waits,
+            'unresolved': unresolved,
+            'duration': duration,
+            'scheduled_duration': simulator.duration}
+
+
+def plan_synchronization(robots, pause_time=10.0, margin=1.0, max_rounds=3, **kwargs):
+    """
+    Replace the pause at every layer with the fewest synchronization points that keep the job free of conflicts.
+
+    The job is simulated without layer pauses and every conflict gets a dwell on the waiting robot. Dwells only keep
+    the robots in step for a while, so the layers holding a dwell keep their pause to realign the robots, and the
+    schedule is recomputed until the set of paused layers no longer changes. Pauses are the only way for printers
+    to wait on each other, the dwells are G4 commands on a single printer.
+
+    :param robots: Robots as described in JobSimulator.
+    :param pause_time: Duration in seconds of the pause and resume macros.
+    :param margin: Extra seconds added to every dwell.
+    :param kwargs: Other JobSimulator options.
+    :return: Dictionary with
+             - 'dwells': {toolpath point: seconds} for every robot
+             - 'pause_layers': sorted layers keeping their pause (the first layer always does)
+             - 'unresolved': conflicts no dwell could remove
+             - 'idle': total idle time in seconds of the schedule
+             - 'idle_pause_everything': total idle time in seconds when pausing at every layer, with every conflict
+               costing a live pause
+             - 'duration' and 'duration_pause_everything': job durations in seconds
+    """
+    everything = JobSimulator(robots, sync_layers=True, pause_time=pause_time, **kwargs)
+    waits, _ = everything.schedule_waits(margin)
+    idle_everything = everything.idle_time() + pause_time * len(waits)
+
+    pause_layers = set()
+    for _ in range(max_rounds):
+        simulator = JobSimulator(robots, sync_layers=pause_layers, pause_time=pause_time, **kwargs)
+        waits, unresolved = simulator.schedule_waits(margin)
+        layers = {w['layer'] for w in waits if w['layer'] > 0}
+        if layers <= pause_layers:
+            break
+        pause_layers |= layers
+
+    return {'dwells': [{int(point): float(wait[point]) for point in np.nonzero(wait)[0]} for wait in simulator.waits],
+            'pause_layers': sorted(pause_layers | {0}),
+            'unresolved': unresolved,
+            'idle': simulator.idle_time() + pause_time * len(robots),
+            'idle_pause_everything': idle_everything + pause_time * len(robots),
+            'duration': simulator.duration,
+            'duration_pause_everything': everything.duration}
+
+
+def robot_from_toolpath(toolpath, local_origin, robot_base, theta_local, arm_lengths):
+    """
+    Build a JobSimulator robot from a FileConversion BinaryToolpath already converted to the printer frame.
+    """
+    return {'local_origin': local_origin,
+            'robot_base': robot_base,
+            'theta_local': theta_local,
+            'arm_lengths': arm_lengths,
+            'path': np.column_stack((toolpath.points['x'], toolpath.points['y'])),
+            'moves': np.asarray(toolpath.points['t']),
+            'layer_starts': toolpath.layerStarts[:-1]}
+
+
+if __name__ == "__main__":
+    sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "FileConversion"))
+    from BinaryToolpath import BinaryToolpath
+
+    parser = argparse.ArgumentParser(description="Verify a multi-robot job for arm collisions before printing.")
+    parser.add_argument("toolpaths", nargs="+", help="binary toolpaths (without extension) in printer coordinates, one per robot")
+    parser.add_argument("--origins", type=float, nargs="+", required=True, help="x y theta of every printer's bed origin")
+    parser.add_argument("--offset", type=float, nargs=2, default=(150, -35), help="arm base position on the bed")
+    parser.add_argument("--arms", type=float, nargs=2, default=(217, 204), help="link lengths")
+    parser.add_argument("--dt", type=float, default=0.05)
+    parser.add_argument("--buffer", type=float, default=10)
+    parser.add_argument("--sync-layers", action="store_true")
+    parser.add_argument("--plan", action="store_true", help="plan dwells and layer pauses instead of pausing at every layer")
+    parser.add_argument("--pause-time", type=float, default=10.0, help="duration of the pause and resume macros in seconds")
+    args = parser.parse_args()
+
+    robots = []
+    for k, path in enumerate(args.toolpaths):
+        x, y, theta = args.origins[3 * k:3 * k + 3]
+        base = local_to_global(np.array(args.offset), (x, y), theta)
+        robots.append(robot_from_toolpath(BinaryToolpath.load(path), (x, y), tuple(base), theta, tuple(args.arms)))
+
+    if args.plan:
+        plan = plan_synchronization(robots, pause_time=args.pause_time, dt=args.dt, buffer_size=args.buffer)
+        for k, dwells in enumerate(plan['dwells']):
+            print(f"Robot {k}: {len(dwells)} dwell(s), {sum(dwells.values()):.1f} s")
+        print(f"Pauses kept at layers {plan['pause_layers']}, {len(plan['unresolved'])} unresolved conflict(s)")
+        print(f"Idle time {plan['idle']:.1f} s against {plan['idle_pause_everything']:.1f} s pausing at every layer")
+        print(f"Job duration {plan['duration']:.1f} s against {plan['duration_pause_everything']:.1f} s")
+        sys.exit()
+
+    start_time = time.time()
+    report = verify_job(robots, dt=args.dt, buffer_size=args.buffer, sync_layers=args.sync_layers)
+    print(f"Verified {report['duration'] / 3600:.2f} h of printing in {time.time() - start_time:.1f} s")
+
+    for c in report['conflicts']:
+        print(f"Conflict robots {c['pair']}: {c['start']:10.2f} s - {c['end']:10.2f} s, layers {c['layers']}, clearance {c['clearance']:.1f} mm")
+    for w in report['waits']:
+        print(f"Wait robot {w['robot']} at point {w['point']} (layer {w['layer']}, t = {w['time']:.2f} s) for {w['seconds']:.2f} s")
+    for c in report['unresolved']:
+        print(f"Unresolved conflict robots {c['pair']} at {c['start']:.2f} s")
+    print(f"Job duration {report['duration']:.1f} s, {report['scheduled_duration']:.1f} s with waits")
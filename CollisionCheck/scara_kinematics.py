@@ -0,0 +1,128 @@
+import math
+from functools import lru_cache
+
+import numpy as np
+
+
+# Joint ranges of the printers' arms in the printer frame, as drawn by printer.getArmLocationAtPoint
+THETA1_RANGE = (-0.25 * math.pi, 0.75 * math.pi)
+THETA2_RANGE = (0.0, math.pi)
+
+# Elbow configurations: with ELBOW_RIGHT the first link is turned clockwise from the base-to-nozzle line
+# and the second link turns counterclockwise from the first (theta2 >= 0), the configuration of the printers
+ELBOW_RIGHT = 1
+ELBOW_LEFT = -1
+
+
+def inverse_kinematics(bases, end_effectors, l1, l2, elbow=ELBOW_RIGHT, tolerance=1e-9):
+    """
+    Joint angles and elbow positions of SCARA arms, vectorized over any leading axes, e.g. (N printers, M poses).
+
+    :param bases: (..., 2) arm base positions.
+    :param end_effectors: (..., 2) end-effector positions, in the same frame as the bases.
+    :param l1: Length of the first link (broadcastable to the leading shape, e.g. (N, 1)).
+    :param l2: Length of the second link (broadcastable to the leading shape).
+    :param elbow: ELBOW_RIGHT or ELBOW_LEFT, or an array of them broadcastable to the leading shape.
+    :param tolerance: Distance in mm by which a target may lie outside the annulus and still count as reachable.
+    :return: Tuple (theta1, theta2, elbows, reachable):
+             theta1 (...) angle of the first link in the frame of the inputs,
+             theta2 (...) angle of the second link relative to the first,
+             elbows (..., 2) intermediate joint positions,
+             reachable (...) boolean mask. Out of reach targets are solved for the nearest reachable pose
+             (arm stretched or folded toward the target) instead of raising.
+    """
+    bases = np.asarray(bases, dtype=float)
+    delta = np.asarray(end_effectors, dtype=float) - bases
+    dx = delta[..., 0]
+    dy = delta[..., 1]
+    r2 = dx * dx + dy * dy
+    r = np.sqrt(r2)
+    l1 = np.asarray(l1, dtype=float)
+    l2 = np.asarray(l2, dtype=float)
+
+    reachable = (r >= np.abs(l1 - l2) - tolerance) & (r <= l1 + l2 + tolerance)
+
+    # minimum/maximum instead of np.clip, which costs more than the rest of the solve on a single pose
+    cos_theta2 = np.minimum(np.maximum((r2 - l1 * l1 - l2 * l2) / (2 * l1 * l2), -1.0), 1.0)
+    theta2 = np.arccos(cos_theta2)
+    if not (np.ndim(elbow) == 0 and elbow == ELBOW_RIGHT):
+        theta2 = theta2 * np.asarray(elbow)
+    theta1 = np.arctan2(dy, dx) - np.arctan2(l2 * np.sin(theta2), l1 + l2 * cos_theta2)
+
+    elbows = np.empty(np.shape(theta1) + (2,))
+    elbows[..., 0] = l1 * np.cos(theta1)
+    elbows[..., 1] = l1 * np.sin(theta1)
+    return theta1, theta2, elbows + bases, reachable
+
+
+def forward_kinematics(bases, theta1, theta2, l1, l2):
+    """
+    Elbow and end-effector positions of SCARA arms from their joint angles, vectorized over any leading axes.
+
+    :param bases: (..., 2) arm base positions.
+    :param theta1: (...) angle of the first link.
+    :param theta2: (...) angle of the second link relative to the first.
+    :param l1: Length of the first link (broadcastable to the leading shape).
+    :param l2: Length of the second link (broadcastable to the leading shape).
+    :return: Tuple (elbows, end_effectors) of (..., 2) arrays.
+    """
+    theta1 = np.asarray(theta1, dtype=float)
+    theta12 = theta1 + np.asarray(theta2, dtype=float)
+    elbows = np.asarray(bases, dtype=float) + np.stack((l1 * np.cos(theta1), l1 * np.sin(theta1)), axis=-1)
+    end_effectors = elbows + np.stack((l2 * np.cos(theta12), l2 * np.sin(theta12)), axis=-1)
+    return elbows, end_effectors
+
+
+def within_joint_limits(theta1, theta2, rotation=0.0, theta1_range=THETA1_RANGE, theta2_range=THETA2_RANGE):
+    """
+    Mask of the joint angles inside the joint ranges of the printer frame.
+
+    :param theta1: (...) angle of the first link in the global frame.
+    :param theta2: (...) angle of the second link relative to the first.
+    :param rotation: Rotation of the printer frame in radians (broadcastable to the leading shape).
+    """
+    theta1 = (np.asarray(theta1) - rotation - theta1_range[0]) % (2 * math.pi) + theta1_range[0]
+    return (theta1 <= theta1_range[1]) & (np.asarray(theta2) >= theta2_range[0]) & (np.asarray(theta2) <= theta2_range[1])
+
+
+@lru_cache(maxsize=1024)
+def frame_matrix(origin_x, origin_y, theta_local):
+    """
+    3x3 homogeneous transform from a printer's local frame to the global frame. Printer frames only
+    change when the cell is reconfigured, so the matrices are cached per layout.
+
+    :param origin_x: X position of the local frame origin in the global frame.
+    :param origin_y: Y position of the local frame origin in the global frame.
+    :param theta_local: Rotation of the local frame in degrees, counterclockwise.
+    :return: Read-only (3, 3) array.
+    """
+    theta = math.radians(theta_local)
+    frame = np.array([[math.cos(theta), -math.sin(theta), origin_x],
+                      [math.sin(theta), math.cos(theta), origin_y],
+                      [0.0, 0.0, 1.0]])
+    frame.setflags(write=False)
+    return frame
+
+
+def apply_frames(frames, points):
+    """
+    Apply homogeneous transforms to point arrays in one batched matrix product.
+
+    :param frames: (3, 3) transform applied to every point, or (N, 3, 3) one transform per leading row of points.
+    :param points: (..., >=2) positions, (N, ..., >=2) with one transform per row.
+    :return: (..., 2) transformed positions.
+    """
+    frames = np.asarray(frames, dtype=float)
+    points = np.asarray(points, dtype=float)[..., :2]
+    if frames.ndim == 2:
+        return points @ frames[:2, :2].T + frames[:2, 2]
+
+    flat = points.reshape(len(frames), -1, 2)
+    return (flat @ frames[:, :2, :2].transpose(0, 2, 1) + frames[:, None, :2, 2]).reshape(points.shape)
+
+
+def elbow_positions(bases, end_effectors, l1, l2):
+    """
+    Intermediate joint positions only, in the printers' elbow configuration (see inverse_kinematics).
+    """
+    return inverse_kinematics(bases, end_effectors, l1, l2)[2]
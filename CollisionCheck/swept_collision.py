@@ -0,0 +1,77 @@
+import numpy as np
+
+from collision_check import segment_distances
+from scara_kinematics import elbow_positions
+
+
+def sample_motion(current, target, feedrates, times):
+    """
+    Position of every end-effector along its straight move to the target at the given times.
+
+    :param current: (N, 2) current end-effector positions.
+    :param target: (N, 2) target end-effector positions.
+    :param feedrates: (N,) speeds in mm/s. Arms with a zero feedrate stay where they are.
+    :param times: (K,) sample times in seconds from now.
+    :return: (N, K, 2) end-effector positions.
+    """
+    current = np.asarray(current, dtype=float)
+    delta = np.asarray(target, dtype=float) - current
+    length = np.linalg.norm(delta, axis=-1)
+
+    travelled = np.minimum(np.asarray(feedrates, dtype=float)[:, None] * np.asarray(times)[None, :], length[:, None])
+    fraction = travelled / np.where(length > 0, length, 1.0)[:, None]
+    return current[:, None, :] + fraction[..., None] * delta[:, None, :]
+
+
+def time_to_contact(bases, current, target, feedrates, arm_lengths, radii, horizon=2.0, samples=40):
+    """
+    Earliest time at which any two arms come into contact while every arm moves from its current
+    to its target end-effector position at its feedrate.
+
+    Both links are swept through the move by sampling the end-effector path and solving the elbow at
+    every sample. Contact is declared when two link capsules come closer than the sum of their radii,
+    inflated by the largest distance any joint travels between two samples so motion between samples
+    cannot be missed.
+
+    :param bases: (N, 2) arm base positions in the global frame.
+    :param current: (N, 2) current end-effector positions in the global frame.
+    :param target: (N, 2) target end-effector positions in the global frame.
+    :param feedrates: (N,) end-effector speeds in mm/s.
+    :param arm_lengths: (N, 2) lengths of the first and second links.
+    :param radii: (N,) capsule radius around the centerlines of each arm's links, i.e. everything kept clear of
+                  the centerline: half the link width plus any buffer. The envelope passes FleetState.margins()
+                  (scaleFactor plus the pose uncertainty), which is the whole border it also buffers its
+                  centerline polygons with, so no link width is added on top.
+    :param horizon: How far ahead to look, in seconds.
+    :param samples: Number of time samples over the horizon.
+    :return: (N, N) symmetric array of the earliest contact time in seconds, np.inf where there is none within the horizon.
+    """
+    bases = np.asarray(bases, dtype=float)
+    arm_lengths = np.asarray(arm_lengths, dtype=float)
+    n = len(bases)
+    times = np.linspace(0.0, horizon, samples)
+
+    nozzles = sample_motion(current, target, feedrates, times)                                              # (N, K, 2)
+    elbows = elbow_positions(bases[:, None, :], nozzles, arm_lengths[:, 0, None], arm_lengths[:, 1, None])  # (N, K, 2)
+    base_path = np.broadcast_to(bases[:, None, :], nozzles.shape)
+
+    # Largest joint displacement between consecutive samples, per arm
+    step = np.maximum(np.linalg.norm(np.diff(elbows, axis=1), axis=-1), np.linalg.norm(np.diff(nozzles, axis=1), axis=-1))
+    chord = step.max(axis=1) if samples > 1 else np.zeros(n)
+
+    starts = np.stack((base_path, elbows), axis=2)  # (N, K, 2 links, 2)
+    ends = np.stack((elbows, nozzles), axis=2)
+
+    # (N, N, K, 2, 2): arm i, arm j, sample, link of i, link of j
+    distances = segment_distances(starts[:, None, :, :, None, :], ends[:, None, :, :, None, :],
+                                  starts[None, :, :, None, :, :], ends[None, :, :, None, :, :])
+    clearance = distances.min(axis=(3, 4))
+
+    radii = np.asarray(radii, dtype=float)
+    limit = radii[:, None] + radii[None, :] + 0.5 * (chord[:, None] + chord[None, :])
+    contact = clearance <= limit[:, :, None]
+
+    first = np.argmax(contact, axis=2)
+    ttc = np.where(contact.any(axis=2), times[first], np.inf)
+    np.fill_diagonal(ttc, np.inf)
+    return ttc
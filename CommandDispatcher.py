@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""
+Concurrent G-code command dispatcher for the whole printer fleet.
+
+Commands are sent to every printer at once over one keep-alive aiohttp session per
+printer. Several commands for the same printer are joined into a single rr_gcode
+request, and startAll releases an M24 to every printer from the same event loop
+iteration after the connections have been warmed up, then reports the start skew.
+"""
+import asyncio
+import threading
+import time
+from urllib.parse import quote
+
+import aiohttp  # For asynchronous HTTP requests
+
+
+class CommandDispatcher:
+    def __init__(self, ips, timeout = 1):
+        """
+        Args:
+            ips: list of printer IP addresses (optionally with a port, "ip:port")
+            timeout: seconds after which a command request is abandoned
+        """
+        self.ips = list(ips)
+        self.timeout = timeout
+
+        self.sessions = {}
+        self.errors = {ip: 0 for ip in self.ips}
+        self.lastError = {ip: None for ip in self.ips}
+
+        self.loop = None
+        self.thread = None
+        self.ownLoop = False
+
+
+    """
+    Requests
+    """
+    def gcodeURL(self, ip, commands):
+        return "http://{0}/rr_gcode?gcode={1}".format(ip, quote("\n".join(commands)))
+
+    def getSession(self, ip):
+        """
+        Returns the printer's keep-alive session, created on first use inside the event loop
+        """
+        if ip not in self.sessions:
+            connector = aiohttp.TCPConnector(limit = 1) # one persistent connection per printer
+            self.sessions[ip] = aiohttp.ClientSession(connector = connector, timeout = aiohttp.ClientTimeout(total = self.timeout))
+        return self.sessions[ip]
+
+    async def sendBatch(self, ip, commands, release = None):
+        """
+        Sends a list of G-code commands to one printer in a single rr_gcode request.
+        Args: release = optional asyncio.Event the request waits for before being sent
+        Returns: {"sent", "replied"} timestamps and the decoded "reply", or "error" if the request failed
+        """
+        session = self.getSession(ip)
+        url = self.gcodeURL(ip, commands)
+        if release is not None:
+            await release.wait()
+
+        result = {"sent": time.time()}
+        try:
+            async with session.get(url) as response:
+                result["reply"] = await response.json(content_type = None)
+        except Exception as e:
+            self.errors[ip] += 1
+            self.lastError[ip] = e
+            result["error"] = e
+        result["replied"] = time.time()
+        return result
+
+    async def warmUp(self, ips):
+        """
+        Opens the connection to every printer and measures its round trip time with a status request
+        Returns: {ip: round trip time in seconds, None if the printer did not answer}
+        """
+        async def ping(ip):
+            start_time = time.time()
+            try:
+                async with self.getSession(ip).get("http://{0}/rr_status?type=1".format(ip)) as response:
+                    await response.read()
+            except Exception as e:
+                self.errors[ip] += 1
+                self.lastError[ip] = e
+                return None
+            return time.time() - start_time
+
+        rtts = await asyncio.gather(*[ping(ip) for ip in ips])
+        return dict(zip(ips, rtts))
+
+    async def dispatchAsync(self, batches):
+        ips = list(batches)
+        results = await asyncio.gather(*[self.sendBatch(ip, batches[ip]) for ip in ips])
+        return dict(zip(ips, results))
+
+    async def barrierAsync(self, batches):
+        ips = list(batches)
+        rtts = await self.warmUp(ips)
+
+        # Every request waits on the same event, so they are all written during the same loop iteration
+        release = asyncio.Event()
+        tasks = [asyncio.ensure_future(self.sendBatch(ip, batches[ip], release)) for ip in ips]
+        await asyncio.sleep(0)
+        release.set()
+        results = dict(zip(ips, await asyncio.gather(*tasks)))
+
+        for ip in ips:
+            results[ip]["rtt"] = rtts[ip]
+        return results
+
+
+    """
+    Blocking API (safe to call from any thread)
+    """
+    def run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    def dispatch(self, batches):
+        """
+        Sends every printer its commands concurrently.
+        Args: batches = {ip: [G-code commands]}, the commands of a printer are sent in one request
+        Returns: {ip: result of sendBatch}
+        """
+        return self.run(self.dispatchAsync(batches))
+
+    def sendAll(self, command, ips = None):
+        """
+        Sends the same command to every printer (or the given ones) concurrently
+        """
+        return self.dispatch({ip: [command] for ip in (self.ips if ips is None else ips)})
+
+    def startAll(self, ips = None, command = "M24"):
+        """
+        Barrier start: warms up every connection, then releases the command to all printers at once.
+        Returns: (results, skew) where skew holds, in seconds,
+                 "send": spread of the times the requests were sent,
+                 "reply": spread of the times the replies arrived,
+                 "estimated": spread of the estimated arrival times at the printers (sent + half the round trip)
+        """
+        results = self.run(self.barrierAsync({ip: [command] for ip in (self.ips if ips is None else ips)}))
+        return results, self.getSkew(results)
+
+    def getSkew(self, results):
+        answered = [r for r in results.values() if "error" not in r]
+        if not answered:
+            return {"send": None, "reply": None, "estimated": None}
+
+        sent = [r["sent"] for r in answered]
+        replied = [r["replied"] for r in answered]
+        arrival = [r["sent"] + (r["rtt"] if r.get("rtt") is not None else r["replied"] - r["sent"]) / 2 for r in answered]
+        return {"send": max(sent) - min(sent),
+                "reply": max(replied) - min(replied),
+                "estimated": max(arrival) - min(arrival)}
+
+
+    """
+    Thread management
+    """
+    def start(self, loop = None):
+        """
+        Starts the dispatcher on a running event loop (e.g. a FleetPoller's) or on its own background thread
+        """
+        if self.loop is not None:
+            return self
+
+        if loop is not None:
+            self.loop = loop
+            return self
+
+        self.ownLoop = True
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target = self.loop.run_forever, daemon = True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """
+        Closes every session and stops the background thread if the dispatcher owns one
+        """
+        if self.loop is None:
+            return
+
+        async def close():
+            for session in self.sessions.values():
+                await session.close()
+        self.run(close())
+        self.sessions = {}
+
+        if self.ownLoop:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+            self.loop.close()
+            self.thread = None
+            self.ownLoop = False
+        self.loop = None
+
+
+
+if __name__ == "__main__":
+
+    # Printer IPs. Machines must be connected to the AMBOTS network.
+    printer_ips = ["192.168.0.14", "192.168.0.15", "192.168.0.16"]
+
+    dispatcher = CommandDispatcher(printer_ips).start()
+    print(dispatcher.dispatch({ip: ["M104 S250", "M23 test_" + str(i)] for i, ip in enumerate(printer_ips)}))
+
+    results, skew = dispatcher.startAll()
+    print("Start skew:", skew)
+
+    dispatcher.stop()
+    print("Errors:", dispatcher.errors)
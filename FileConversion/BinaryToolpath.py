@@ -0,0 +1,205 @@
+import numpy as np
+import json
+from itertools import islice
+
+"""
+Binary intermediate toolpath format.
+
+A toolpath is stored as two files next to each other:
+	<name>.npy   structured array of every point (x, y, z, move type), opened with np.load(mmap_mode='r')
+	<name>.json  index of the marker lines ("Layer ...", "Interfacing", "Non-interfacing") and the
+	             point each one precedes
+
+Conversion, collision pre-checking and G-code generation read the points straight from the
+memory-mapped array instead of re-parsing the whitespace text toolpath, and any layer can be
+accessed without reading the ones before it.
+"""
+
+TOOLPATH_DTYPE = np.dtype([('x', '<f8'), ('y', '<f8'), ('z', '<f8'), ('t', 'i1')])
+INDEX_VERSION = 1
+
+
+def isMarker(line):
+	"""
+	True for the toolpath lines that are not coordinates ("Layer ...", "Interfacing", "Non-interfacing")
+	"""
+	return 'Layer' in line or 'Interfacing' in line or "Non-interfacing" in line
+
+
+def splitColumns(lines):
+	"""
+	Splits coordinate lines ("x y z t") into one flat token list, x, y, z, t of each line in turn
+	"""
+	# split the whole block at once when every line has the usual "x y z t" columns
+	tokens = " ".join(lines).split()
+	if len(tokens) != 4 * len(lines):
+		tokens = [token for line in lines for token in line.split()[:4]]
+	return tokens
+
+
+class BinaryToolpath:
+
+	def __init__(self, points, markers):
+		"""
+		points: structured array of TOOLPATH_DTYPE, may be a read-only memory map
+		markers: list of (point index, marker line) in file order, each marker comes right before that point
+		"""
+		self.points = points
+		self.markers = [(int(point), text) for point, text in markers]
+		# index of the "Layer" marker and of the first point of every layer, plus the end of the toolpath
+		self.layerMarkerIdx = [k for k, (point, text) in enumerate(self.markers) if 'Layer' in text] + [len(self.markers)]
+		self.layerStarts = [self.markers[k][0] for k in self.layerMarkerIdx[:-1]] + [len(points)]
+
+	@classmethod
+	def fromText(cls, textFile, blockLines=100000):
+		"""
+		Parses a whitespace text toolpath ("x y z t" lines and marker lines)
+		"""
+		parts = []
+		markers = []
+		count = 0
+		with open(textFile, "r", encoding="utf8") as myfile:
+			while True:
+				lines = list(islice(myfile, blockLines))
+				if not lines:
+					break
+
+				coordinates = []
+				for line in lines:
+					if isMarker(line):
+						markers.append((count + len(coordinates), line.rstrip('\r\n')))
+					else:
+						coordinates.append(line)
+
+				tokens = splitColumns(coordinates)
+				part = np.empty(len(coordinates), dtype=TOOLPATH_DTYPE)
+				part['x'] = np.array(tokens[0::4], dtype=float)
+				part['y'] = np.array(tokens[1::4], dtype=float)
+				part['z'] = np.array(tokens[2::4], dtype=float)
+				part['t'] = np.array(tokens[3::4], dtype=int)
+				parts.append(part)
+				count += len(coordinates)
+
+		points = np.concatenate(parts) if parts else np.empty(0, dtype=TOOLPATH_DTYPE)
+		return cls(points, markers)
+
+	def save(self, path):
+		"""
+		Writes path.npy and path.json, path being given without extension
+		"""
+		np.save(path + '.npy', np.ascontiguousarray(self.points, dtype=TOOLPATH_DTYPE))
+		with open(path + '.json', "w", encoding="utf8") as indexFile:
+			json.dump({"version": INDEX_VERSION, "count": len(self.points), "markers": self.markers}, indexFile)
+		return path
+
+	@classmethod
+	def load(cls, path, mmap=True):
+		"""
+		Opens a toolpath written by save. With mmap the points are a read-only memory map shared
+		by every process opening the same file.
+		"""
+		with open(path + '.json', "r", encoding="utf8") as indexFile:
+			index = json.load(indexFile)
+		points = np.load(path + '.npy', mmap_mode='r' if mmap else None)
+		if index["version"] != INDEX_VERSION or index["count"] != len(points):
+			raise ValueError("Toolpath index " + path + ".json does not match its points")
+		return cls(points, index["markers"])
+
+	"""
+	Random access
+	"""
+	def layerCount(self):
+		return len(self.layerStarts) - 1
+
+	def layerRange(self, layer):
+		"""
+		Returns: (first point, end point) of the layer
+		"""
+		return self.layerStarts[layer], self.layerStarts[layer + 1]
+
+	def layer(self, layer):
+		"""
+		Returns: the points of the layer, a view of the memory map
+		"""
+		start, end = self.layerRange(layer)
+		return self.points[start:end]
+
+	def layerMarkers(self, layer):
+		"""
+		Returns: the (point index, marker line) of the layer, starting with its "Layer" line
+		"""
+		return self.markers[self.layerMarkerIdx[layer]:self.layerMarkerIdx[layer + 1]]
+
+	def xy(self, start=0, end=None):
+		"""
+		Returns: (n, 2) array of the x, y coordinates of a range of points
+		"""
+		points = self.points[start:end]
+		return np.column_stack((points['x'], points['y']))
+
+	"""
+	Conversion
+	"""
+	def transformed(self, transform, decimals=6):
+		"""
+		Applies a 3x3 homogeneous transform to the x, y coordinates of every point.
+		decimals: coordinates are rounded like the text conversion writes them, None keeps full precision
+		Returns: a new in-memory BinaryToolpath sharing the marker index
+		"""
+		xy = self.xy() @ transform[:2, :2].T + transform[:2, 2]
+		if decimals is not None:
+			xy = np.round(xy, decimals)
+
+		points = np.array(self.points, dtype=TOOLPATH_DTYPE)
+		points['x'] = xy[:, 0]
+		points['y'] = xy[:, 1]
+		return BinaryToolpath(points, self.markers)
+
+	def blocks(self, start=0, end=None, blockPoints=4096):
+		"""
+		Yields the toolpath in the order of the text file as (lines, x, y, t) blocks for ManualGcode.gcodeBlocks.
+		lines holds the marker lines and "" in place of every point, x, y and t are lists of the point values.
+		start, end: range of points, the markers before start are skipped
+		"""
+		end = len(self.points) if end is None else end
+		# markers after the last point belong to the end of the toolpath, other markers at end to the next range
+		markers = [(point, text) for point, text in self.markers
+				   if start <= point < end or (point == end == len(self.points))]
+
+		lines = []
+		first = start
+		position = start
+		for point, text in markers + [(end, None)]:
+			while point > position:
+				if len(lines) >= blockPoints:
+					yield self.block(lines, first, position)
+					lines = []
+					first = position
+				step = min(point - position, blockPoints - len(lines))
+				lines.extend([""] * step)
+				position += step
+			if text is not None:
+				lines.append(text + '\n')
+		if lines:
+			yield self.block(lines, first, position)
+
+	def block(self, lines, start, end):
+		points = self.points[start:end]
+		return lines, points['x'].tolist(), points['y'].tolist(), points['t'].tolist()
+
+	def toText(self, textFile):
+		"""
+		Writes the toolpath back as whitespace text
+		"""
+		with open(textFile, "w", encoding="utf8") as replaced:
+			position = 0
+			for point, text in self.markers + [(len(self.points), None)]:
+				if point > position:
+					points = self.points[position:point]
+					replaced.write("".join(["%r %r %r %d\n" % values for values in
+											zip(points['x'].tolist(), points['y'].tolist(), points['z'].tolist(), points['t'].tolist())]))
+					position = point
+				if text is not None:
+					replaced.write(text + '\n')
+		return textFile
+
@@ -5,6 +5,10 @@ from datetime import datetime
 import os
 import re
 import math
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor
+import shutil
+from BinaryToolpath import BinaryToolpath, isMarker, splitColumns
 from tkinter import Tk     # from tkinter import Tk for Python 3.x
 from tkinter.filedialog import askopenfilename
 
@@ -22,71 +26,104 @@ complete cells
 
 
 
-class Conversion:
+def affineTransform(angle, tx, ty):
+	"""
+	Returns the 3x3 homogeneous matrix that rotates points by angle degrees (counterclockwise)
+	about the origin and then translates them by (tx, ty).
+	"""
+	a = math.radians(angle)
+	c = round(math.cos(a), 15) # exact values for multiples of 90 degrees
+	s = round(math.sin(a), 15)
+	return np.array([[c, -s, tx],
+					 [s, c, ty],
+					 [0.0, 0.0, 1.0]])
 
-	def __init__(self, inputFileR1, inputFileR2, updatedFileR1, updatedFileR2):
-		self.inputFileR1 = inputFileR1
-		self.inputFileR2 = inputFileR2
-		self.updatedFileR1 = updatedFileR1
-		self.updatedFileR2 = updatedFileR2
 
-	def convertR2(self):
-		#filename = 'robot2_quad_updated' + '.txt'
+# Placement of each robot's toolpath on its bed, previously hardcoded in convertR1/convertR2
+TRANSFORM_R1 = affineTransform(0, -51, 97.5)		# x - 100 + 49, y - 0 + 100 - 2.5
+TRANSFORM_R2 = affineTransform(180, 348.5, 503)		# 300 - x + 48.5, 300 - y + 200 + 3
 
-		filename = self.updatedFileR2
-		with open(self.inputFileR2, "r", encoding="utf8") as myfile:
-			with open(filename, "w", encoding='utf8') as replaced:
 
-				for line in myfile.readlines():
-					if 'Layer' in line:
-						newline = line
+def transformLines(lines, transform, decimals=6):
+	"""
+	Applies the affine transform to every coordinate line of a block in one matrix operation.
+	lines: list of toolpath lines. Marker lines are returned unchanged.
+	decimals: digits written after the point, None writes the shortest exact representation (slower)
+	Returns: list of the converted lines
+	"""
+	coordIdx = [k for k, line in enumerate(lines) if not isMarker(line)]
+	if not coordIdx:
+		return list(lines)
 
-					elif 'Interfacing' in line or "Non-interfacing" in line:
-						newline = line
+	tokens = splitColumns([lines[k] for k in coordIdx])
 
-					else:
-						data = line.split()
-						x = float(data[0])
-						y = float(data[1])
-						# t = int(data[3])
-                        #Printer Set 1 ()
-                        
-						x_new = 300 - x + 48.5 #300 - x - .5
-						y_new = 300 - y + 200 + 3# 300 - y + 150 - .5
-                        
-                        
-                    
-
-						newline = str(x_new) + ' ' + str(y_new) + ' ' + data[2] + ' '+data[3] + '\n'
-						#print("newlie2", newline)
-
-					replaced.write(newline)
+	xy = np.column_stack((np.array(tokens[0::4], dtype=float), np.array(tokens[1::4], dtype=float)))
+	xy = xy @ transform[:2, :2].T + transform[:2, 2]
 
-	def convertR1(self):
-		# filename = 'robot1_quad_updated' + '.txt'
+	# format the whole block with a single % operation, z and t are copied unchanged
+	values = [None] * len(tokens)
+	values[0::4] = xy[:, 0].tolist()
+	values[1::4] = xy[:, 1].tolist()
+	values[2::4] = tokens[2::4]
+	values[3::4] = tokens[3::4]
+	if decimals is None:
+		lineFormat = "%r %r %s %s\n"
+	else:
+		lineFormat = "%.{0}f %.{0}f %s %s\n".format(decimals)
+	newlines = ((lineFormat * len(coordIdx)) % tuple(values)).split("\n")
 
-		filename2 = self.updatedFileR1
-		with open(self.inputFileR1, "r", encoding="utf8") as myfile:
-			with open(filename2, "w", encoding='utf8') as replaced:
+	out = list(lines)
+	for k, newline in zip(coordIdx, newlines):
+		out[k] = newline + '\n'
+	return out
 
-				for line in myfile.readlines():
-					if 'Layer' in line:
-						newline = line
 
-					elif 'Interfacing' in line or "Non-interfacing" in line:
-						newline = line
+class Conversion:
 
-					else:
-						data = line.split()
-						x = float(data[0])
-						y = float(data[1])
-						x_new = x - 100 + 49  # x - 0
-						y_new = y - 0 + 100 - 2.5  # y - 0 + 150
+	def __init__(self, inputFileR1, inputFileR2, updatedFileR1, updatedFileR2, transformR1=TRANSFORM_R1, transformR2=TRANSFORM_R2):
+		self.inputFileR1 = inputFileR1
+		self.inputFileR2 = inputFileR2
+		self.updatedFileR1 = updatedFileR1
+		self.updatedFileR2 = updatedFileR2
+		self.transformR1 = transformR1
+		self.transformR2 = transformR2
+
+	def transformBlock(self, lines, transform, decimals=6):
+		"""
+		Applies the affine transform to every coordinate line of a block in one matrix operation.
+		Returns: the converted lines as a single string
+		"""
+		return "".join(transformLines(lines, transform, decimals))
+
+	def convertFile(self, inputFile, outputFile, transform, blockLines=100000, decimals=6):
+		"""
+		Converts a toolpath file block by block, blockLines lines at a time, so memory use
+		does not depend on the size of the file.
+		"""
+		with open(inputFile, "r", encoding="utf8") as myfile:
+			with open(outputFile, "w", encoding='utf8') as replaced:
+				while True:
+					lines = list(islice(myfile, blockLines))
+					if not lines:
+						break
+					replaced.write(self.transformBlock(lines, transform, decimals))
+
+	def convertToolpath(self, inputFile, outputPath, transform, decimals=6):
+		"""
+		Converts a text toolpath into the binary toolpath format (see BinaryToolpath) in the robot's frame.
+		Returns: the converted BinaryToolpath, also saved as outputPath.npy and outputPath.json
+		"""
+		toolpath = BinaryToolpath.fromText(inputFile).transformed(transform, decimals)
+		toolpath.save(outputPath)
+		return toolpath
 
-						newline = str(x_new) + ' ' + str(y_new) + ' ' + data[2] + ' ' +data[3] + '\n'
-						#print("newline1", newline)
+	def convertR2(self):
+		#filename = 'robot2_quad_updated' + '.txt'
+		self.convertFile(self.inputFileR2, self.updatedFileR2, self.transformR2)
 
-					replaced.write(newline)
+	def convertR1(self):
+		# filename = 'robot1_quad_updated' + '.txt'
+		self.convertFile(self.inputFileR1, self.updatedFileR1, self.transformR1)
 
 
 
@@ -99,11 +136,17 @@ class ManualGcode:
 		self.diameter = diameter
 		self.layerHeight = layerHeight
 		self.linewidth = linewidth
+		self.areaRoad = self.roadArea()
+
+	def roadArea(self):
+		"""
+		Cross-section of a printed road: a rectangle with a half circle on each side
+		"""
+		layerHeight = self.layerHeight + 0.10
+		return (self.linewidth - layerHeight)*layerHeight+math.pi*((layerHeight/2)**2)
 
 	def extrusionCalculator(self, locations):
 		diameter = self.diameter
-		layerHeight = self.layerHeight + 0.10
-		linewidth = self.linewidth
 
 		# locations used for calculation of the volume of extrusion
 		x1 = locations[0][0]
@@ -112,12 +155,177 @@ class ManualGcode:
 		y2 = locations[1][1]
 		length = math.hypot(x2-x1, y2-y1)
 
-		#calcualate the area and then the volume of the cylinder
-		areaRoad = (linewidth - layerHeight)*layerHeight+math.pi*((layerHeight/2)**2)
-		exrudedAmount = areaRoad*length*4/(math.pi*diameter**2)
+		#calcualate the volume of the road and the matching length of filament
+		exrudedAmount = self.areaRoad*length*4/(math.pi*diameter**2)
 
 		return exrudedAmount
 
+	def extrusionBatch(self, x, y, t, start=(0, 0, 0)):
+		"""
+		Vectorized extrusionCalculator over a run of consecutive toolpath points.
+		x, y, t: arrays of the point coordinates and move types
+		start: (x, y, t) of the point before the first one, the first segment starts there
+		Returns: array of the E value of the segment ending at each point, 0 where the previous point's t is not 1
+		"""
+		x = np.asarray(x, dtype=float)
+		y = np.asarray(y, dtype=float)
+		length = np.hypot(np.diff(x, prepend=start[0]), np.diff(y, prepend=start[1]))
+
+		t_prev = np.empty(len(x), dtype=int)
+		t_prev[:1] = start[2]
+		t_prev[1:] = t[:-1]
+
+		eValues = self.areaRoad*length*4/(math.pi*self.diameter**2)
+		return np.where(t_prev == 1, eValues, 0.0)
+
+	def gcodeLines(self, lines, layerHeight, travelMoves=True, blockLines=4096, start=None, dwells=None, pauseLayers=None):
+		"""
+		Generator turning toolpath lines into G-code, one output string per input line.
+		lines: iterable of toolpath lines ("x y z t", "Layer ...", "Interfacing", "Non-interfacing")
+		travelMoves: emit G0 moves for t == 0 segments (robot 1) or skip them (robot 2)
+		blockLines: lines parsed together, the E values of a block are computed in one extrusionBatch call
+		start: (z, points, layers, x_prev, y_prev, t_prev) when lines continue a toolpath that has already been
+			processed up to a "Layer" line, points and layers being the number of coordinate and "Layer" lines before it
+		dwells: {point index: seconds} of G4 dwells before leaving a point, from a precomputed collision schedule
+		pauseLayers: layers whose start keeps the M25 pause, None pauses at every layer
+		"""
+		return self.gcodeBlocks(self.parseBlocks(lines, blockLines), layerHeight, travelMoves, start, dwells, pauseLayers)
+
+	def parseBlocks(self, lines, blockLines=4096):
+		"""
+		Generator parsing text toolpath lines into (lines, x, y, t) blocks of blockLines lines for gcodeBlocks
+		"""
+		lines = iter(lines)
+		while True:
+			block = list(islice(lines, blockLines))
+			if not block:
+				break
+
+			tokens = splitColumns([line for line in block if not isMarker(line)])
+			yield (block,
+				   np.array(tokens[0::4], dtype=float).tolist(),
+				   np.array(tokens[1::4], dtype=float).tolist(),
+				   np.array(tokens[3::4], dtype=int).tolist())
+
+	def gcodeBlocks(self, blocks, layerHeight, travelMoves=True, start=None, dwells=None, pauseLayers=None):
+		"""
+		Generator turning parsed toolpath blocks into G-code, one output string per toolpath line.
+		blocks: iterable of (lines, x, y, t), lines being the toolpath lines of the block and x, y, t the values
+			of its coordinate lines in order (from parseBlocks or BinaryToolpath.blocks)
+		start, dwells, pauseLayers: see gcodeLines
+		"""
+		z = layerHeight #+ 16.45
+		# set up initial parameters
+		i = 0
+		layers = 0
+		x_prev = 0
+		y_prev = 0
+		t_prev = 0
+		lineprev = ""
+		if start is not None:
+			z, i, layers, x_prev, y_prev, t_prev = start
+		dwells = dwells or {}
+
+		for block, xs, ys, ts in blocks:
+			# E values of every coordinate line of the block at once
+			eValues = self.extrusionBatch(xs, ys, ts, (x_prev, y_prev, t_prev)).tolist()
+			k = 0
+
+			for line in block:
+				if 'Layer' in line:
+					z += layerHeight
+					layers += 1
+					lineprev = line
+				elif 'Interfacing' in line:
+					if 'Layer' in lineprev and (pauseLayers is None or layers - 1 in pauseLayers):
+						yield "M117 Interfacing\n" + \
+							"M25\n" + \
+							"M104 S240\n"
+					else:
+						yield "M117 Interfacing\n"
+				elif "Non-interfacing" in line:
+					if 'Layer' in lineprev and (pauseLayers is None or layers - 1 in pauseLayers):
+						yield "M117 Non-Interfacing\n" + \
+							"M25\n" + \
+							"M104 S240\n"
+					else:
+						yield "M117 Non-Interfacing\n"
+
+				else:
+					x = xs[k]
+					y = ys[k]
+					t = ts[k]
+
+					if i == 0:
+						newline = "G1 X" + str(x) + ' Y' + str(y) + '\n'
+					else:
+						if t_prev == 1:
+							newline = "G1 X" + str(x) + ' Y' + str(y) + ' Z' + str(z) + ' E' + str(eValues[k]) + '\n'
+						elif t_prev == 2:
+							newline = "G92 E0\n" + \
+								"G1 E-3.0000 F3000\n" + \
+								"G0 Z" + str(z+5) + '\n' + \
+								"G0 X" + str(x) + ' Y' + str(y) + ' Z' + str(z+5) + '\n' + \
+								"G0 Z" + str(z) + '\n' + \
+								"G1 E3.0000 F3000\n" + \
+								"G92 E0\n"
+						elif travelMoves:
+							newline = "G0 X" + str(x) + ' Y' + str(y) + ' Z' + str(z) + '\n'
+						else:
+							newline = ""
+
+						# wait on the previous point for the other robots to clear the way
+						if i - 1 in dwells:
+							newline = "G4 S" + str(round(dwells[i - 1], 2)) + '\n' + newline
+
+					yield newline
+					x_prev = x
+					y_prev = y
+					t_prev = t
+					i = i + 1
+					k = k + 1
+					lineprev = line
+
+	def writeGcode(self, inputFile, outputFile, initial_gcode, layerHeight, travelMoves=True, chunkSize=1 << 16,
+				   dwells=None, pauseLayers=None):
+		"""
+		Streams a toolpath file through gcodeLines into a G-code file.
+		The toolpath is read line by line and the output is written in chunks of about chunkSize
+		characters, so memory use does not depend on the size of the toolpath.
+		"""
+		with open(inputFile, "r") as myfile:
+			gcode = self.gcodeLines(myfile, layerHeight, travelMoves, dwells=dwells, pauseLayers=pauseLayers)
+			return self.writeLines(gcode, outputFile, initial_gcode, chunkSize)
+
+	def writeToolpathGcode(self, toolpath, outputFile, initial_gcode, layerHeight, travelMoves=True, chunkSize=1 << 16,
+						   dwells=None, pauseLayers=None):
+		"""
+		writeGcode for a BinaryToolpath, the points are read straight from its (memory-mapped) array
+		"""
+		gcode = self.gcodeBlocks(toolpath.blocks(), layerHeight, travelMoves, dwells=dwells, pauseLayers=pauseLayers)
+		return self.writeLines(gcode, outputFile, initial_gcode, chunkSize)
+
+	def writeLines(self, gcode, outputFile, initial_gcode, chunkSize=1 << 16):
+		"""
+		Writes the start G-code, the generated lines in chunks of about chunkSize characters and the end G-code
+		"""
+		with open(outputFile, "w") as replaced:
+			replaced.write(initial_gcode)
+
+			chunk = []
+			size = 0
+			for newline in gcode:
+				chunk.append(newline)
+				size += len(newline)
+				if size >= chunkSize:
+					replaced.write("".join(chunk))
+					chunk = []
+					size = 0
+			replaced.write("".join(chunk))
+
+			replaced.write(self.final_gcode_robot)
+		return outputFile
+
 	def generateGcodeR1(self, layerHeight):
 		# d = 2.85
 	 #    layer_height = 0.45
@@ -125,163 +333,137 @@ class ManualGcode:
 
 		filename = 'AMBOT1_' + \
 			str(datetime.now().strftime('%Y_%m_%d_%H_%M')) + '.gcode'
-		z = layerHeight #+ 16.45
-		goToStart = "G0 X300 Y20 Z50 \n"
 		# startup routine for the printers
-		initial_gcode = self.initial_gcode_robot1
-		with open("robot1.txt", "r") as myfile:
-			with open(filename, "w") as replaced:
-				# set up initial parameters
-				i = 0
-				x_prev = 0
-				y_prev = 0
-				t_prev = 0
-				lineprev = ""
-				replaced.write(initial_gcode)
-
-				for line in myfile.readlines():
-					if 'Layer' in line:
-						z += layerHeight
-						lineprev = line
-						# replaced.write(goToStart)
-						# new_code = 'M291 P"Wait " S3 \n G1 F200 E3 ;extrude 3mm of feed stock \n M400 \n'
-# 						newline = "M25\n" + \
-# 						"M104 S240\n"
-# 						replaced.write(newline)
-						# replaced.write(new_code)
-					elif 'Interfacing' in line:
-						if 'Layer' in lineprev:
-							newline = "M117 Interfacing\n" + \
-                            "M25\n" + \
-                            "M104 S240\n"
-							replaced.write(newline)
-						else:
-							newline = "M117 Interfacing\n"
-							replaced.write(newline)
-					elif "Non-interfacing" in line:
-						if 'Layer' in lineprev:
-							newline = "M117 Non-Interfacing\n" + \
-                            "M25\n" + \
-                            "M104 S240\n"
-							replaced.write(newline)
-						else:
-							newline = "M117 Non-Interfacing\n"
-							replaced.write(newline)
-
-					else:
-						# splits the line and assings x, y and t values
-						data = line.split()
-						x = float(data[0])
-						y = float(data[1])
-						#Z = float(data[2])
-						t = int(data[3])
-
-						if i == 0:
-							newline = "G1 X" + str(x) + ' Y' + str(y) + '\n'
-						else:
-							points = [(x_prev, y_prev), (x, y)]
-							if t_prev == 1:
-								eValue = self.extrusionCalculator(points)
-								newline = "G1 X" + str(x) + ' Y' + str(y) + ' Z' + str(z) + ' E' + str(eValue) + '\n'
-							elif t_prev == 2:                    
-								newline = "G92 E0\n" + \
-                                    "G1 E-3.0000 F3000\n" + \
-                                    "G0 Z" + str(z+5) + \
-                                    "G0 X" + str(x) + ' Y' + str(y) + ' Z' + str(z+5) + '\n' + \
-                                    "G0 Z" + str(z) + \
-                                    "G1 E3.0000 F3000\n" + \
-                                    "G92 E0\n"
-							else:
-								newline = "G0 X" + str(x) + ' Y' + str(y) + ' Z' + str(z) + '\n'
-                                                
-						replaced.write(newline)
-						x_prev = float(x)
-						y_prev = float(y)
-						t_prev = t
-						i = i + 1
-						lineprev = line
-				replaced.write(final_gcode)
+		return self.writeGcode("robot1.txt", filename, self.initial_gcode_robot1, layerHeight)
 
 
 	def generateGcodeR2(self, layerHeight):
 
 		filename = 'AMBOT2_' + str(datetime.now().strftime('%Y_%m_%d_%H_%M')) + '.gcode'
 
-		initial_gcode = self.initial_gcode_robot2
-		z = layerHeight #+ 19.8
-		goToStart = "G0 X300 Y20 Z10 \n"
-		with open("robot2.txt", "r") as myfile:
-			with open(filename, "w") as replaced:
-				i = 0
-				x_prev = 0
-				y_prev = 0
-				t_prev = 0
-				lineprev = ""
-				replaced.write(initial_gcode)
-
-				for line in myfile.readlines():
-					if 'Layer' in line:
-						z += layerHeight
-						lineprev = line
-						# replaced.write(goToStart)
-						# new_code = 'M291 P"Wait " S3 \n G1 F200 E3 ;extrude 3mm of feed stock \n M400 \n'
-# 						newline = "M25\n" + \
-# 						"M104 S240\n"
-# 						replaced.write(newline)
-						# replaced.write(new_code)
-					elif 'Interfacing' in line:
-						if 'Layer' in lineprev:
-							newline = "M117 Interfacing\n" + \
-                            "M25\n" + \
-                            "M104 S240\n"
-							replaced.write(newline)
-						else:
-							newline = "M117 Interfacing\n"
-							replaced.write(newline)
-					elif "Non-interfacing" in line:
-						if 'Layer' in lineprev:
-							newline = "M117 Non-Interfacing\n" + \
-                            "M25\n" + \
-                            "M104 S240\n"
-							replaced.write(newline)
-						else:
-							newline = "M117 Non-Interfacing\n"
-							replaced.write(newline)
-                        
-					else:
-						data = line.split()
-						x = float(data[0])
-						y = float(data[1])
-						#Z = float(data[2])
-						t = int(data[3])
-
-						if i == 0:
-							newline = "G1 X" + str(x) + ' Y' + str(y) + '\n'
-						else:
-							points = [(x_prev, y_prev), (x, y)]
-							if t_prev == 1:
-								eValue = self.extrusionCalculator(points)
-								newline = "G1 X" + str(x) + ' Y' + str(y) + ' Z' + str(z) + ' E' + str(eValue) + '\n'
-							elif t_prev == 2:                    
-								newline = "G92 E0\n" + \
-                                    "G1 E-3.0000 F3000\n" + \
-                                    "G0 Z" + str(z+5) + \
-                                    "G0 X" + str(x) + ' Y' + str(y) + ' Z' + str(z+5) + '\n' + \
-                                    "G0 Z" + str(z) + \
-                                    "G1 E3.0000 F3000\n" + \
-                                    "G92 E0\n"
-							else:
-# 								newline = "G0 X" + str(x) + ' Y' + str(y) + ' Z' + str(z) + '\n'
-								newline = ""
-
-						replaced.write(newline)
-						x_prev = float(x)
-						y_prev = float(y)
-						t_prev = t
-						i = i + 1
-						lineprev = line
-				replaced.write(final_gcode)
-
+		# robot 2 skips the G0 travel moves
+		return self.writeGcode("robot2.txt", filename, self.initial_gcode_robot2, layerHeight, travelMoves=False)
+
+
+
+class RobotJob:
+	"""
+	One robot of a print job: its toolpath, the placement of the toolpath on the robot's bed and
+	the G-code written before and after the print.
+	dwells and pauseLayers come from a collision schedule (see CollisionCheck/job_simulator.plan_synchronization)
+	"""
+	def __init__(self, name, toolpathFile, transform, initial_gcode, final_gcode, travelMoves=True, dwells=None, pauseLayers=None):
+		self.name = name
+		self.toolpathFile = toolpathFile
+		self.transform = transform
+		self.initial_gcode = initial_gcode
+		self.final_gcode = final_gcode
+		self.travelMoves = travelMoves
+		self.dwells = dwells
+		self.pauseLayers = pauseLayers
+
+
+def scanToolpath(toolpathFile, layerHeight, layersPerPart):
+	"""
+	Splits a toolpath file into ranges of layersPerPart layers that can be generated independently.
+	Returns: list of (start offset, end offset, z, points, layers, previous coordinate line), one per range, holding
+		the byte range of the part and the state gcodeLines needs to continue the toolpath from there
+	"""
+	parts = []
+	z = layerHeight
+	points = 0
+	layers = 0
+	prevLine = None
+	start = 0
+	offset = 0
+	state = (z, points, layers, prevLine)
+
+	with open(toolpathFile, "rb") as myfile:
+		for raw in myfile:
+			if b'Layer' in raw:
+				if layers and layers % layersPerPart == 0:
+					parts.append((start, offset) + state)
+					start = offset
+					state = (z, points, layers, prevLine)
+				# same repeated addition as gcodeLines so the heights of the parts match exactly
+				z += layerHeight
+				layers += 1
+			elif not (b'Interfacing' in raw or b'Non-interfacing' in raw):
+				points += 1
+				prevLine = raw
+			offset += len(raw)
+
+	parts.append((start, offset) + state)
+	return parts
+
+
+def generatePart(gcode, robot, part, layerHeight, partFile):
+	"""
+	Converts one range of a robot's toolpath and writes its G-code to partFile.
+	"""
+	start, end, z, points, layers, prevLine = part
+	with open(robot.toolpathFile, "rb") as myfile:
+		myfile.seek(start)
+		text = myfile.read(end - start).decode("utf8")
+	lines = transformLines(text.replace("\r\n", "\n").splitlines(True), robot.transform)
+
+	x_prev, y_prev, t_prev = 0, 0, 0
+	if prevLine is not None:
+		data = transformLines([prevLine.decode("utf8")], robot.transform)[0].split()
+		x_prev, y_prev, t_prev = float(data[0]), float(data[1]), int(data[3])
+
+	with open(partFile, "w") as replaced:
+		replaced.writelines(gcode.gcodeLines(lines, layerHeight, robot.travelMoves, start=(z, points, layers, x_prev, y_prev, t_prev),
+											 dwells=robot.dwells, pauseLayers=robot.pauseLayers))
+	return partFile
+
+
+def generateJob(robots, diameter, layerHeight, linewidth, outputDir=".", layersPerPart=20, workers=None,
+				uploader=None, ips=None, jobName=None):
+	"""
+	Converts the toolpaths of every robot of a job and generates their G-code in a process pool.
+	Each toolpath is split into ranges of layersPerPart layers, the ranges of all robots are generated
+	concurrently and then stitched in order between the robot's start and end G-code, so the wall time
+	depends on the number of cores rather than the number of robots.
+	robots: list of RobotJob
+	workers: number of processes, defaults to the number of cores
+	uploader: optional FileUploader, every robot's G-code is uploaded to ips[i] as "jobName_i" (the names
+		envelope.prepare selects) as soon as it is stitched, while the next robots are still being written
+	Returns: list of the G-code file names, in the order of robots
+	"""
+	gcode = ManualGcode(None, None, None, diameter, layerHeight, linewidth)
+	stamp = datetime.now().strftime('%Y_%m_%d_%H_%M')
+	outputFiles = [os.path.join(outputDir, robot.name + '_' + stamp + '.gcode') for robot in robots]
+
+	with ProcessPoolExecutor(max_workers=workers) as pool:
+		scans = [pool.submit(scanToolpath, robot.toolpathFile, layerHeight, layersPerPart) for robot in robots]
+
+		partFiles = []
+		for robot, outputFile, scan in zip(robots, outputFiles, scans):
+			futures = []
+			for k, part in enumerate(scan.result()):
+				partFile = outputFile + '.part' + str(k)
+				futures.append(pool.submit(generatePart, gcode, robot, part, layerHeight, partFile))
+			partFiles.append(futures)
+
+		uploads = []
+		for i, (robot, outputFile, futures) in enumerate(zip(robots, outputFiles, partFiles)):
+			with open(outputFile, "w") as replaced:
+				replaced.write(robot.initial_gcode)
+				for future in futures:
+					partFile = future.result()
+					with open(partFile, "r") as part:
+						shutil.copyfileobj(part, replaced)
+					os.remove(partFile)
+				replaced.write(robot.final_gcode)
+			if uploader is not None:
+				uploads.append(uploader.submit(ips[i], outputFile, jobName + '_' + str(i)))
+
+	for i, upload in enumerate(uploads):
+		result = upload.result()
+		if "error" in result:
+			print(robots[i].name, "upload failed:", result["error"])
+	return outputFiles
 
 
 if __name__ == '__main__':
@@ -353,18 +535,13 @@ if __name__ == '__main__':
 
 	# inputfileR1 = 'robot1_quad.txt'
 	# inputfileR2 = 'robot2_quad.txt'
-	filename1 = './robot1.txt'
-	filename2 = './robot2.txt'
-	convertfile = Conversion(inputfileR1, inputfileR2, filename1, filename2)
-	convertfile.convertR1()
-	convertfile.convertR2()
 
 	# parameters associated with the calculation of volume of extrusion
 	diameter = 1.75
 	layerHeight = 0.45 # change the height based on the file provided
 	linewidth = 0.42 #adjust to change extrusion rate
-	createGcode = ManualGcode(initial_gcode_robot_1, initial_gcode_robot_2, final_gcode,
-							diameter, layerHeight, linewidth)
 
-	createGcode.generateGcodeR1(layerHeight)
-	createGcode.generateGcodeR2(layerHeight)
+	# every robot of the job with its placement and start/end G-code, robot 2 skips the G0 travel moves
+	robots = [RobotJob('AMBOT1', inputfileR1, TRANSFORM_R1, initial_gcode_robot_1, final_gcode),
+			  RobotJob('AMBOT2', inputfileR2, TRANSFORM_R2, initial_gcode_robot_2, final_gcode, travelMoves=False)]
+	print(generateJob(robots, diameter, layerHeight, linewidth))
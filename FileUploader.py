@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+"""
+Streaming G-code uploads to the whole printer fleet through rr_upload.
+
+Files are streamed from disk in chunks, never loaded whole, and every printer
+receives its file concurrently. The CRC32 of each file is computed in a first pass
+and sent with the upload so the firmware rejects corrupted transfers. RepRapFirmware
+cannot append to a partial upload, so an interrupted job is resumed per file: files
+already on a printer with the same size and modification time (rr_upload's time,
+reported back by rr_fileinfo as lastModified) are skipped and failed uploads are
+retried from the start.
+"""
+import asyncio
+import os
+import threading
+import time
+import zlib
+from datetime import datetime
+from urllib.parse import quote
+
+import aiohttp  # For asynchronous HTTP requests
+
+
+def fileCRC(path, chunkSize = 1 << 20):
+    """
+    Returns the CRC32 of a file as the 8 digit hexadecimal string expected by rr_upload
+    """
+    crc = 0
+    with open(path, "rb") as upload:
+        for chunk in iter(lambda: upload.read(chunkSize), b""):
+            crc = zlib.crc32(chunk, crc)
+    return "{0:08x}".format(crc)
+
+
+class FileUploader:
+    def __init__(self, chunkSize = 1 << 16, retries = 3, timeout = 30, directory = "0:/gcodes/"):
+        """
+        Args:
+            chunkSize: bytes read from disk and sent at a time
+            retries: number of times a failed upload is started again
+            timeout: seconds without data from the printer after which an upload is abandoned
+            directory: directory on the printer's SD card the files are uploaded to
+        """
+        self.chunkSize = chunkSize
+        self.retries = retries
+        self.timeout = timeout
+        self.directory = directory
+
+        self.sessions = {}
+        self.results = {}   # {ip: result of the last upload to that printer}
+
+        self.loop = None
+        self.thread = None
+
+
+    """
+    Uploads
+    """
+    def getSession(self, ip):
+        if ip not in self.sessions:
+            connector = aiohttp.TCPConnector(limit = 1) # one persistent connection per printer
+            timeout = aiohttp.ClientTimeout(total = None, sock_read = self.timeout)
+            self.sessions[ip] = aiohttp.ClientSession(connector = connector, timeout = timeout)
+        return self.sessions[ip]
+
+    async def fileChunks(self, path):
+        """
+        Async generator streaming the file from disk chunkSize bytes at a time
+        """
+        loop = asyncio.get_running_loop()
+        with open(path, "rb") as upload:
+            while True:
+                chunk = await loop.run_in_executor(None, upload.read, self.chunkSize)
+                if not chunk:
+                    break
+                yield chunk
+
+    async def remoteInfo(self, ip, name):
+        """
+        Returns the rr_fileinfo of a file on the printer ("size", "lastModified"...), None if it is not there
+        """
+        url = "http://{0}/rr_fileinfo?name={1}".format(ip, quote(self.directory + name))
+        try:
+            async with self.getSession(ip).get(url) as response:
+                info = await response.json(content_type = None)
+        except Exception:
+            return None
+        return info if info.get("err") == 0 else None
+
+    async def uploadAsync(self, ip, path, name):
+        """
+        Uploads one file to one printer, skipping it when the printer already has it:
+        same size and same modification time, since the names are reused from one job to the next.
+        Returns: {"name", "bytes", "crc32", "attempts", "time"} plus "skipped": True, or "error" if every attempt failed
+        """
+        start_time = time.time()
+        size = os.path.getsize(path)
+        modified = datetime.fromtimestamp(os.path.getmtime(path)).strftime("%Y-%m-%dT%H:%M:%S")
+        crc = await asyncio.get_running_loop().run_in_executor(None, fileCRC, path)
+        result = {"name": name, "bytes": size, "crc32": crc, "attempts": 0}
+
+        info = await self.remoteInfo(ip, name)
+        if info is not None and info.get("size") == size and info.get("lastModified") == modified:
+            result.update(skipped = True, time = time.time() - start_time)
+            self.results[ip] = result
+            return result
+
+        url = "http://{0}/rr_upload?name={1}&time={2}&crc32={3}".format(ip, quote(self.directory + name), quote(modified), crc)
+        for attempt in range(self.retries + 1):
+            result["attempts"] = attempt + 1
+            try:
+                async with self.getSession(ip).post(url, data = self.fileChunks(path),
+                                                    headers = {"Content-Length": str(size)}) as response:
+                    reply = await response.json(content_type = None)
+                if reply.get("err") == 0:
+                    result.pop("error", None)
+                    break
+                result["error"] = "rr_upload returned {0}".format(reply)
+            except Exception as e:
+                result["error"] = e
+            if attempt < self.retries:
+                await asyncio.sleep(0.5 * 2 ** attempt)
+
+        result["time"] = time.time() - start_time
+        self.results[ip] = result
+        return result
+
+    async def uploadAllAsync(self, uploads):
+        ips = list(uploads)
+        results = await asyncio.gather(*[self.uploadAsync(ip, *uploads[ip]) for ip in ips])
+        return dict(zip(ips, results))
+
+
+    """
+    Blocking API (safe to call from any thread)
+    """
+    def submit(self, ip, path, name):
+        """
+        Starts uploading a file in the background.
+        Returns: a concurrent.futures.Future of the uploadAsync result
+        """
+        self.start()
+        return asyncio.run_coroutine_threadsafe(self.uploadAsync(ip, path, name), self.loop)
+
+    def uploadAll(self, uploads):
+        """
+        Uploads every printer's file concurrently and waits for all of them.
+        Args: uploads = {ip: (local path, name on the printer)}
+        Returns: {ip: result of uploadAsync}
+        """
+        self.start()
+        return asyncio.run_coroutine_threadsafe(self.uploadAllAsync(uploads), self.loop).result()
+
+
+    """
+    Thread management
+    """
+    def start(self):
+        if self.loop is not None:
+            return self
+
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target = self.loop.run_forever, daemon = True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """
+        Closes every session and stops the background thread
+        """
+        if self.loop is None:
+            return
+
+        async def close():
+            for session in self.sessions.values():
+                await session.close()
+        asyncio.run_coroutine_threadsafe(close(), self.loop).result()
+        self.sessions = {}
+
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        self.thread = None
+        self.loop = None
+
+
+
+if __name__ == "__main__":
+    import sys
+
+    # python FileUploader.py job AMBOT1.gcode AMBOT2.gcode uploads AMBOT1.gcode as job_0 to the first printer...
+    printer_ips = ["192.168.0.14", "192.168.0.15", "192.168.0.16"]
+    jobName, files = sys.argv[1], sys.argv[2:]
+
+    uploader = FileUploader()
+    for ip, result in uploader.uploadAll({ip: (path, jobName + "_" + str(i)) for i, (ip, path) in enumerate(zip(printer_ips, files))}).items():
+        print(ip, result)
+    uploader.stop()
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+Optional matplotlib view of a FleetState.
+
+The plot observes the fleet: it draws the build surfaces and arm bases once when attached and
+redraws the printers' swept areas whenever the fleet calls update (FleetState.notify).
+Nothing in the control loop depends on it, so the envelope runs the same without a plot.
+"""
+import numpy as np
+
+import matplotlib.pyplot as plt
+import matplotlib.transforms as transforms
+
+from FleetState import sweptPolygon
+
+
+class FleetPlot:
+    def __init__(self, ax = None, names = None):
+        """
+        Args:
+            ax: matplotlib axis to draw on, a new figure is created by default
+            names: optional list of printer names used as labels, ordered like the fleet
+        """
+        if ax is None:
+            self.fig, ax = plt.subplots()
+        else:
+            self.fig = ax.figure
+        self.ax = ax
+        self.names = names
+        self.live = []  # artists of the last update, removed on the next one
+
+    def attach(self, fleet):
+        """
+        Draws the layout of the fleet and registers the plot as an observer
+        """
+        self.drawLayout(fleet)
+        fleet.addObserver(self)
+        return self
+
+    def drawLayout(self, fleet):
+        for i in range(len(fleet)):
+            x, y = fleet.origins[i]
+            rotation = transforms.Affine2D().rotate_around(x, y, fleet.rotations[i]) + self.ax.transData
+            size = fleet.dimensions[i]
+            self.ax.add_patch(plt.Rectangle((x, y), size, size, linewidth=2, edgecolor='r', facecolor='none', transform=rotation))
+
+        bases = fleet.bases()
+        self.ax.plot(bases[:, 0], bases[:, 1], "p")
+
+        minX, maxX, minY, maxY = fleet.bounds()
+        self.ax.set_xlim(minX-150, maxX)
+        self.ax.set_ylim(minY-150, maxY)
+
+    def update(self, fleet):
+        """
+        Draws every printer's buffered swept area between its current and target position,
+        the buffer inflated by the uncertainty of predicted positions
+        """
+        for artist in self.live:
+            artist.remove()
+        self.live = []
+
+        coords = fleet.sweptCoords()
+        margins = fleet.margins()
+        nozzles = fleet.toGlobal(np.stack((fleet.current, fleet.target), axis = 1))
+        for i in range(len(fleet)):
+            x, y = sweptPolygon(coords[i]).buffer(margins[i]).exterior.xy
+
+            label = self.names[i] if self.names is not None else None
+            self.live.extend(self.ax.fill(x, y, alpha=0.5, fc='red', label=label))
+            self.live.extend(self.ax.plot(nozzles[i, :, 0], nozzles[i, :, 1], "p"))
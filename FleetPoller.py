@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+"""
+Persistent asyncio status poller for the whole printer fleet.
+
+One keep-alive aiohttp session is held per printer and every printer is polled
+concurrently from a background thread, each at its own period (see setPeriod and
+PollScheduler). The latest status of each printer is published into a shared snapshot
+that the control loop reads without blocking.
+"""
+import asyncio
+import threading
+import time
+
+import aiohttp  # For asynchronous HTTP requests
+
+from StatusSources import FullStatusSource
+
+
+class FleetPoller:
+    def __init__(self, ips, rate = 10, timeout = 0.2, sources = None):
+        """
+        Args:
+            ips: list of printer IP addresses (optionally with a port, "ip:port")
+            rate: number of status polls per second made to each printer, until setPeriod changes it
+            timeout: seconds after which a single status poll is abandoned
+            sources: optional {ip: StatusSource} choosing how each printer is polled.
+                     Printers without an entry download the full rr_status document.
+        """
+        self.ips = list(ips)
+        self.rate = rate
+        self.timeout = timeout
+
+        sources = sources or {}
+        self.sources = {ip: sources.get(ip) or FullStatusSource() for ip in self.ips}
+
+        self.snapshot = {ip: None for ip in self.ips}    # latest record per printer, replaced whole on every update
+        self.errors = {ip: 0 for ip in self.ips}         # number of failed requests per printer
+        self.lastError = {ip: None for ip in self.ips}
+        self.requests = {ip: 0 for ip in self.ips}       # number of status polls made per printer
+
+        self.periods = {ip: 1 / rate for ip in self.ips} # seconds between two polls of each printer
+        self.wakeups = {}                                # asyncio.Event per printer cutting its wait short
+
+        self.loop = None
+        self.thread = None
+        self.running = False
+        self.ready = threading.Event()
+
+
+    """
+    Snapshot access (safe to call from any thread)
+    """
+    def getSnapshot(self, ip):
+        """
+        Returns the latest status record for the printer or None if it has not answered yet
+        """
+        return self.snapshot.get(ip)
+
+    def getAllSnapshots(self):
+        return dict(self.snapshot)
+
+    def getPeriod(self, ip):
+        """
+        Returns the time in seconds between two status requests to the printer
+        """
+        return self.periods[ip]
+
+    def setPeriod(self, ip, period):
+        """
+        Changes the time in seconds between two status requests to the printer (safe to call from any thread).
+        A shorter period takes effect at once, the printer is not left waiting out its previous, longer period.
+        """
+        previous = self.periods[ip]
+        self.periods[ip] = period
+        if period < previous and self.running and ip in self.wakeups:
+            self.loop.call_soon_threadsafe(self.wakeups[ip].set)
+
+
+    """
+    Polling
+    """
+    async def fetchStatus(self, session, ip):
+        """
+        Polls one printer through its status source.
+        Args: session = the printer's keep-alive session, ip = printer IP address
+        Returns: the snapshot record, or None if the poll failed
+        """
+        start_time = time.time()
+        self.requests[ip] += 1
+        try:
+            record = await self.sources[ip].fetch(session, ip)
+        except Exception as e:
+            self.errors[ip] += 1
+            self.lastError[ip] = e
+            return None
+
+        record["timestamp"] = start_time
+        record["latency"] = time.time() - start_time
+        return record
+
+    async def pollPrinter(self, ip):
+        """
+        Polls a single printer until the poller is stopped, at the rate given by getPeriod
+        """
+        connector = aiohttp.TCPConnector(limit = 1) # one persistent connection per printer
+        timeout = aiohttp.ClientTimeout(total = self.timeout)
+
+        async with aiohttp.ClientSession(connector = connector, timeout = timeout) as session:
+            while self.running:
+                start_time = time.time()
+
+                record = await self.fetchStatus(session, ip)
+                if record is not None:
+                    self.snapshot[ip] = record
+
+                await self.waitForNextPoll(ip, start_time)
+
+    async def waitForNextPoll(self, ip, start_time):
+        """
+        Sleeps until one period after start_time, re-reading the period whenever setPeriod shortens it
+        """
+        wakeup = self.wakeups.setdefault(ip, asyncio.Event())
+        while self.running:
+            remaining = self.getPeriod(ip) - (time.time() - start_time)
+            if remaining <= 0:
+                return
+            try:
+                await asyncio.wait_for(wakeup.wait(), remaining)
+            except asyncio.TimeoutError:
+                return
+            finally:
+                wakeup.clear()
+
+    async def run(self):
+        self.ready.set()
+        await asyncio.gather(*[self.pollPrinter(ip) for ip in self.ips])
+
+
+    """
+    Thread management
+    """
+    def start(self):
+        """
+        Starts polling all printers in a background thread
+        """
+        if self.running:
+            return
+
+        self.running = True
+        self.ready.clear()
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target = self.loop.run_until_complete, args = (self.run(),), daemon = True)
+        self.thread.start()
+        self.ready.wait()
+
+    def stop(self):
+        """
+        Stops polling and waits for the background thread to close its sessions
+        """
+        if not self.running:
+            return
+
+        self.running = False
+        for wakeup in list(self.wakeups.values()):
+            self.loop.call_soon_threadsafe(wakeup.set)
+        self.thread.join()
+        self.loop.close()
+        self.thread = None
+        self.loop = None
+        self.wakeups = {}
+
+    def getStats(self):
+        """
+        Returns: {ip: {mode: payload statistics}} collected by every printer's status source
+        """
+        return {ip: source.getStats() for ip, source in self.sources.items()}
+
+    def waitForFirstStatus(self, timeout = 5):
+        """
+        Blocks until every printer has answered at least once or the timeout expires.
+        Returns: True if all printers have a snapshot
+        """
+        end_time = time.time() + timeout
+        while time.time() < end_time:
+            if all(record is not None for record in self.snapshot.values()):
+                return True
+            time.sleep(0.01)
+        return False
+
+
+
+if __name__ == "__main__":
+
+    # Printer IPs. Machines must be connected to the AMBOTS network.
+    printer_ips = ["192.168.0.14", "192.168.0.15", "192.168.0.16"]
+
+    poller = FleetPoller(printer_ips, rate = 10, timeout = 0.2)
+    poller.start()
+    poller.waitForFirstStatus()
+
+    for i in range(50):
+        for ip in printer_ips:
+            print(ip, poller.getSnapshot(ip))
+        time.sleep(0.1)
+
+    poller.stop()
+    print("Errors:", poller.errors)
+    print("Payload:", poller.getStats())
@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+"""
+Headless, array-backed state of the whole printer fleet.
+
+The layout (origins, rotations, base offsets, arm lengths, buffers) and the live poses of
+every printer are stored column-wise in NumPy arrays, one row per printer, so the envelope's
+per-tick geometry is computed for all printers in a few vectorised operations instead of
+per-printer matplotlib transforms. The 3x3 local-to-global frame of every printer and its
+global base position are kept with the layout and only recomputed when a printer is moved. Plotting is not part of the state: a plot (see FleetPlot)
+registers itself as an observer and is redrawn by notify().
+"""
+import os
+import sys
+
+import numpy as np
+from shapely.geometry import Polygon, MultiPoint
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "CollisionCheck"))
+from scara_kinematics import inverse_kinematics, frame_matrix, apply_frames
+
+
+def sweptPolygon(coords):
+    """
+    Args: coords = the 5 corners of one printer's sweep (one row of FleetState.sweptCoords, printer.getPolygonCoords)
+    Returns: the polygon of the area between them, the convex hull of the corners when the sweep crosses itself
+    """
+    polygon = Polygon(coords)
+    if not polygon.is_simple:
+        polygon = MultiPoint(coords).convex_hull
+    return polygon
+
+
+class FleetState:
+    __slots__ = ("count", "observers",
+                 "originBuffer", "rotationBuffer", "offsetBuffer", "dimensionBuffer", "armLengthBuffer", "radiusBuffer",
+                 "frameBuffer", "baseBuffer", "currentBuffer", "targetBuffer", "feedrateBuffer", "uncertaintyBuffer")
+
+    def __init__(self, capacity = 8):
+        """
+        Args:
+            capacity: number of printers the arrays are allocated for, they double whenever they are full
+        """
+        self.count = 0
+        self.observers = []
+
+        self.originBuffer = np.zeros((capacity, 2))     # build surface origin in the envelope's coordinates
+        self.rotationBuffer = np.zeros(capacity)        # rotation of the build surface in radians
+        self.offsetBuffer = np.zeros((capacity, 2))     # arm base in the printer's coordinates
+        self.dimensionBuffer = np.zeros(capacity)       # side of the square build surface
+        self.armLengthBuffer = np.zeros((capacity, 2))  # (arm one, arm two)
+        self.radiusBuffer = np.zeros(capacity)          # border added around the arms (printer.scaleFactor)
+        self.frameBuffer = np.zeros((capacity, 3, 3))   # homogeneous transform from the printer's to the envelope's coordinates
+        self.baseBuffer = np.zeros((capacity, 2))       # arm base in the envelope's coordinates
+
+        self.currentBuffer = np.zeros((capacity, 3))    # nozzle position in the printer's coordinates
+        self.targetBuffer = np.zeros((capacity, 3))     # end of the current move in the printer's coordinates
+        self.feedrateBuffer = np.zeros(capacity)        # mm/s, 0 while paused or unknown
+        self.uncertaintyBuffer = np.zeros(capacity)     # mm the nozzle may be away from current (MotionEstimator)
+
+    def __len__(self):
+        return self.count
+
+
+    """
+    Printers
+    """
+    def addPrinter(self, origin, offset, armLengths, dimensions = 300, radius = 5):
+        """
+        Args: origin = (x, y, theta in degrees) like printer.OriginLocation, offset = (x, y) of the base
+        Returns: the printer's row in the arrays
+        """
+        if self.count == len(self.originBuffer):
+            self.grow(2 * self.count)
+
+        index = self.count
+        self.count += 1
+        self.setLayout(index, origin, offset)
+        self.armLengthBuffer[index] = armLengths
+        self.dimensionBuffer[index] = dimensions
+        self.radiusBuffer[index] = radius
+        return index
+
+    def grow(self, capacity):
+        for name in FleetState.__slots__[2:]:
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:])
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def setLayout(self, index, origin = None, offset = None):
+        """
+        Moves a printer: origin = (x, y, theta in degrees), offset = (x, y) of the base.
+        The printer's frame and global base position are recomputed here, the only place the layout changes.
+        """
+        if origin is not None:
+            self.originBuffer[index] = origin[:2]
+            self.rotationBuffer[index] = np.radians(origin[2])
+            self.frameBuffer[index] = frame_matrix(float(origin[0]), float(origin[1]), float(origin[2]))
+        if offset is not None:
+            self.offsetBuffer[index] = offset
+        self.baseBuffer[index] = apply_frames(self.frameBuffer[index], self.offsetBuffer[index])
+
+    def setPose(self, index, current, target, feedrate = 0, uncertainty = 0):
+        """
+        Stores a printer's live position, target and feedrate (printer coordinates)
+        and how far in mm the real position may be from current when it is a prediction
+        """
+        self.currentBuffer[index] = current[:3]
+        self.targetBuffer[index] = target[:3]
+        self.feedrateBuffer[index] = feedrate
+        self.uncertaintyBuffer[index] = uncertainty
+
+    # Views of the used rows, ordered like the printers were added
+    @property
+    def origins(self):
+        return self.originBuffer[:self.count]
+
+    @property
+    def rotations(self):
+        return self.rotationBuffer[:self.count]
+
+    @property
+    def offsets(self):
+        return self.offsetBuffer[:self.count]
+
+    @property
+    def dimensions(self):
+        return self.dimensionBuffer[:self.count]
+
+    @property
+    def armLengths(self):
+        return self.armLengthBuffer[:self.count]
+
+    @property
+    def radii(self):
+        return self.radiusBuffer[:self.count]
+
+    @property
+    def frames(self):
+        return self.frameBuffer[:self.count]
+
+    @property
+    def current(self):
+        return self.currentBuffer[:self.count]
+
+    @property
+    def target(self):
+        return self.targetBuffer[:self.count]
+
+    @property
+    def feedrates(self):
+        return self.feedrateBuffer[:self.count]
+
+    @property
+    def uncertainties(self):
+        return self.uncertaintyBuffer[:self.count]
+
+
+    """
+    Geometry (all printers at once)
+    """
+    def toGlobal(self, points, index = None):
+        """
+        Args: points = (N, ..., >=2) positions in each printer's coordinates, one row per printer
+              index = optional rows of the printers the points belong to, all printers by default
+        Returns: (N, ..., 2) numpy array of the same positions in the envelope's coordinates, one batched matmul
+        """
+        index = slice(0, self.count) if index is None else np.asarray(index)
+        return apply_frames(self.frameBuffer[index], points)
+
+    def bases(self):
+        """
+        Returns: (N, 2) arm base positions in the envelope's coordinates (cached with the layout)
+        """
+        return self.baseBuffer[:self.count]
+
+    def globalPoses(self):
+        """
+        Returns: (current, target) nozzle positions of every printer in the envelope's coordinates,
+                 both (N, 2) and transformed together in one matmul
+        """
+        poses = self.toGlobal(np.stack((self.current, self.target), axis = 1))
+        return poses[:, 0], poses[:, 1]
+
+    def jointLocations(self, points, index = None):
+        """
+        Elbow positions for nozzle positions, like printer.getJointLocation.
+        Args: points = (N, >=2) nozzle positions in each printer's coordinates
+        Returns: (N, 2) elbow positions in each printer's coordinates.
+                 Unreachable positions get the elbow of the nearest reachable pose.
+        """
+        index = slice(0, self.count) if index is None else np.asarray(index)
+        points = np.asarray(points, dtype = float)
+        armLengths = self.armLengthBuffer[index]
+
+        return inverse_kinematics(self.offsetBuffer[index], points[:, :2], armLengths[:, 0], armLengths[:, 1])[2]
+
+    def sweptCoords(self, start = None, end = None, index = None):
+        """
+        Corners of the area swept by the arms moving from start to end, for every printer at once.
+        Args: start, end = (N, >=2) nozzle positions in each printer's coordinates, the live current and
+                           target positions by default
+        Returns: (N, 5, 2) numpy array of (base, initial joint, initial nozzle, final nozzle, final joint)
+                 in the envelope's coordinates, the points of printer.getPolygonCoords
+        """
+        start = self.current if start is None else np.asarray(start, dtype = float)
+        end = self.target if end is None else np.asarray(end, dtype = float)
+        rows = np.arange(self.count) if index is None else np.asarray(index)
+
+        local = np.stack((self.offsetBuffer[rows],
+                          self.jointLocations(start, rows),
+                          start[:, :2],
+                          end[:, :2],
+                          self.jointLocations(end, rows)), axis = 1)
+        return self.toGlobal(local, rows)
+
+    def margins(self):
+        """
+        Returns: (N,) border kept around every printer's arms this tick, its radius plus the uncertainty of its pose
+        """
+        return self.radii + self.uncertainties
+
+    def bounds(self):
+        """
+        Returns: (minX, maxX, minY, maxY) of the build surfaces, before their rotation
+        """
+        origins = self.origins
+        return (origins[:, 0].min(), (origins[:, 0] + self.dimensions).max(),
+                origins[:, 1].min(), (origins[:, 1] + self.dimensions).max())
+
+
+    """
+    Observers
+    """
+    def addObserver(self, observer):
+        """
+        Args: observer = object with an update(fleet) method, e.g. a FleetPlot
+        """
+        self.observers.append(observer)
+
+    def removeObserver(self, observer):
+        self.observers.remove(observer)
+
+    def notify(self):
+        """
+        Lets every observer redraw the current state
+        """
+        for observer in self.observers:
+            observer.update(self)
@@ -11,18 +11,39 @@ import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.transforms as transforms
 
-from shapely.geometry import Polygon
-from itertools import combinations
-from shapely.ops import unary_union
+from shapely.geometry import MultiPoint
+from shapely.strtree import STRtree
 
 from scipy.spatial  import ConvexHull
 
 #HTTP requests
+import asyncio
+import aiohttp
 import requests
+from FleetPoller import FleetPoller
+from PollScheduler import PollScheduler
+from CommandDispatcher import CommandDispatcher
+from FileUploader import FileUploader
+from StatusSources import FullStatusSource
+from MotionEstimator import MotionEstimator
+
+#Fleet state
+from FleetState import FleetState, sweptPolygon
+from FleetPlot import FleetPlot
 
 #Envelope Management
+import os
 import sys
 import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "CollisionCheck"))
+from swept_collision import time_to_contact
+from collision_check import link_distance_matrix
+from conflict_maps import ConflictMaps, sample_path, CACHE_DIR
+from conflict_resolver import min_weight_vertex_cover
+from scara_kinematics import inverse_kinematics, forward_kinematics
 
 class printer:
     
@@ -37,16 +58,21 @@ class printer:
                   "M408": 'M408 S0'}    # Returns the status of the printer in json style. More info: https://reprap.org/wiki/G-code#M408:_Report_JSON-style_response
     
     
-    def __init__ (self, OriginLocation, PrinterOffset, IP, axis, PrinterDimensions = 300, PrinterName = "p", armOneLength = 217, armTwoLength = 204):
+    def __init__ (self, OriginLocation, PrinterOffset, IP, axis = None, PrinterDimensions = 300, PrinterName = "p", armOneLength = 217, armTwoLength = 204, fleet = None):
         """
         ALL UNITS are in: mm and Radians
         Args: 
             OriginLocation: (X,Y,Theta) location of the origin of the build surface (assume the print surface is a square).
                             Theta is a rotationaltransformation applied to the rectangle allowing the printer to be rotated
             PrinterOffset: (X,Y) location of the printer base in relation to the origin
+            axis: matplotlib axis the printer is drawn on, None runs the printer headless
+            fleet: FleetState holding the printer's geometry and pose, a new one of its own by default (see bindFleet)
         """
         
         ##Printer Setup
+        self.fleet = FleetState(1) if fleet is None else fleet
+        self.index = self.fleet.addPrinter(OriginLocation, PrinterOffset, (armOneLength, armTwoLength), PrinterDimensions)
+        
         self.ax = axis
         self.PrinterName = PrinterName
         self.Point = "p"
@@ -58,19 +84,88 @@ class printer:
         self.status = False
         self.Stored_Resume_Point = [0,0,0]
         
-        self.PrinterTransformation =  transforms.Affine2D().rotate_deg_around(self.OriginLocation[0], self.OriginLocation[1], self.OriginLocation[2]) + self.ax.transData
-        self.PrinterCoordTranslation = transforms.Affine2D().translate(self.OriginLocation[0], self.OriginLocation[1]).rotate_deg_around(self.OriginLocation[0], self.OriginLocation[1], self.OriginLocation[2])+ self.ax.transData
+        self.session = requests.Session() # keep-alive connection for commands sent to this printer
+        self.timeout = 1                  # seconds before an HTTP request to the printer is abandoned
+        self.poller = None                # FleetPoller publishing this printer's status, see attachPoller
+        self.statusSource = FullStatusSource() # how the poller requests this printer's status, see setStatusSource
+        self.statusSession = None         # keep-alive session of request_status, on its own event loop thread
+        self.statusLoop = None
+        self.statusThread = None
+        self.priority = 1                 # weight of this printer's job when the envelope picks printers to pause
+        self.estimator = MotionEstimator() # extrapolates the position between two snapshots, see getPredictedPosition
         
         self.armOneLength = armOneLength
         self.armTwoLength = armTwoLength
         
         self.scaleFactor = 5
         
-        #Set up the graph of the base
-        self.baseLocation = plt.plot(self.getPrinterPoint()[0], self.getPrinterPoint()[1], self.Point, transform = self.PrinterTransformation)
-        self.ax.add_patch(self.getBuildSurfaceRectangle())
+        #Set up the graph of the base, only when the printer is drawn on its own axis (an envelope uses a FleetPlot instead)
+        if self.ax is not None:
+            self.PrinterTransformation =  transforms.Affine2D().rotate_deg_around(self.OriginLocation[0], self.OriginLocation[1], self.OriginLocation[2]) + self.ax.transData
+            self.PrinterCoordTranslation = transforms.Affine2D().translate(self.OriginLocation[0], self.OriginLocation[1]).rotate_deg_around(self.OriginLocation[0], self.OriginLocation[1], self.OriginLocation[2])+ self.ax.transData
+            
+            self.baseLocation = plt.plot(self.getPrinterPoint()[0], self.getPrinterPoint()[1], self.Point, transform = self.PrinterTransformation)
+            self.ax.add_patch(self.getBuildSurfaceRectangle())
         
         
+    """
+    Fleet State
+    The geometry lives in the printer's row of the FleetState, these properties read and write it
+    """
+    @property
+    def OriginLocation(self):
+        return self.origin
+    
+    @OriginLocation.setter
+    def OriginLocation(self, origin):
+        self.origin = tuple(origin)
+        self.fleet.setLayout(self.index, origin = origin)
+    
+    @property
+    def PrinterOffset(self):
+        return self.offset
+    
+    @PrinterOffset.setter
+    def PrinterOffset(self, offset):
+        self.offset = tuple(offset)
+        self.fleet.setLayout(self.index, offset = offset)
+    
+    @property
+    def armOneLength(self):
+        return float(self.fleet.armLengthBuffer[self.index, 0])
+    
+    @armOneLength.setter
+    def armOneLength(self, length):
+        self.fleet.armLengthBuffer[self.index, 0] = length
+    
+    @property
+    def armTwoLength(self):
+        return float(self.fleet.armLengthBuffer[self.index, 1])
+    
+    @armTwoLength.setter
+    def armTwoLength(self, length):
+        self.fleet.armLengthBuffer[self.index, 1] = length
+    
+    @property
+    def scaleFactor(self):
+        return float(self.fleet.radiusBuffer[self.index])
+    
+    @scaleFactor.setter
+    def scaleFactor(self, radius):
+        self.fleet.radiusBuffer[self.index] = radius
+    
+    def bindFleet(self, fleet):
+        """
+        Moves the printer's geometry and pose into another FleetState, e.g. the one shared by an envelope
+        """
+        index = fleet.addPrinter(self.OriginLocation, self.PrinterOffset, (self.armOneLength, self.armTwoLength),
+                                 self.PrinterDimensions, self.scaleFactor)
+        fleet.setPose(index, self.fleet.currentBuffer[self.index], self.fleet.targetBuffer[self.index], self.fleet.feedrateBuffer[self.index],
+                      self.fleet.uncertaintyBuffer[self.index])
+        self.fleet = fleet
+        self.index = index
+    
+    
     """
     Printer Initialization and Plotting/Joints
     """
@@ -100,47 +195,37 @@ class printer:
     def plotPrinterPoint(self, xyz):
         """
         Args: Takes a tuple (x,y,z)
-        Plots a point using the transformation.
+        Plots a point using the transformation. Headless printers (no axis) draw nothing.
         """
+        if self.ax is None:
+            return
         plt.plot(xyz[0], xyz[1], self.Point, transform = self.PrinterCoordTranslation)
     
     def getJointLocation(self, xyz, plot = False):
         """
         Args: Takes a tuple (x,y,z) of the location of the nozzle
               plot = True plots the mid joint
-        Return: returns a tuple of the intermediate joint position (x, y)
+        Return: returns a tuple of the intermediate joint position (x, y).
+                Out of reach positions give the joint of the nearest reachable pose (see scara_kinematics.inverse_kinematics)
         """
         x,y,z = xyz
         
-        DistanceVector = (x - self.PrinterOffset[0], y - self.PrinterOffset[1])
-        
         if plot:
             print(x, y, z)
-            print (DistanceVector)
+            print ((x - self.PrinterOffset[0], y - self.PrinterOffset[1]))
         
-        
-        a = math.sqrt(DistanceVector[0]**2 + DistanceVector[1]**2)
-        b = self.armOneLength
-        c = self.armTwoLength
-        
-        Beta = math.acos((a**2 + c**2 - b**2)/(2*a*c))
-        Theta = math.atan2(DistanceVector[1], DistanceVector[0])
-        
-        phi = Theta-Beta
+        theta1, theta2, joint, reachable = inverse_kinematics(self.PrinterOffset, (x, y), self.armOneLength, self.armTwoLength)
         
         if plot:
             print("\nangles")
-            print("beta:  ", Beta * 180/math.pi)
-            print("theta: ", Theta * 180/math.pi)
-            print("phi:   ", phi * 180/math.pi)
+            print("arm one: ", math.degrees(theta1))
+            print("arm two: ", math.degrees(theta2))
+            print("reachable: ", bool(reachable))
         
-        X_coord = self.armOneLength * math.cos(phi) + self.PrinterOffset[0]
-        Y_coord = self.armOneLength * math.sin(phi) + self.PrinterOffset[1]
+        location = tuple(joint.tolist())
         
-        location = (X_coord, Y_coord)
         
-        
-        base = (int(self.baseLocation[0].get_xdata()[0]), int(self.baseLocation[0].get_ydata()[0]))
+        base = self.getPrinterPoint()
         
         if plot:        
             print("\nCoordinates")
@@ -165,54 +250,21 @@ class printer:
         Returns: a list of the coordinates needed from the polygon.
         """
         
-        JointInitial = self.getJointLocation(xyzI)
-        JointFinal = self.getJointLocation(xyzF)
-        NozzleInitial = (xyzI[0], xyzI[1])
-        NozzleFinal = (xyzF[0], xyzF[1])
-        BasePos = (int(self.baseLocation[0].get_xdata()[0]), int(self.baseLocation[0].get_ydata()[0]))
-        
-        polyTup = (JointInitial, NozzleInitial, NozzleFinal, JointFinal)
-        
-        points_array = np.array(polyTup)
-        
-        tf = transforms.Affine2D().translate(self.OriginLocation[0], self.OriginLocation[1])
-        
-        transformed_points = tf.transform(points_array)
-        
-        transformed_points = np.insert(transformed_points, 0, BasePos, axis = 0)
-        # transformed_points = np.insert(transformed_points, 5, BasePos, axis = 0)
-        
-        rot = transforms.Affine2D().rotate_deg_around(self.OriginLocation[0], self.OriginLocation[1], self.OriginLocation[2])
-        
-        rotated_points = rot.transform(transformed_points)
+        # (base, initial joint, initial nozzle, final nozzle, final joint) in the envelope's coordinates
+        rotated_points = self.fleet.sweptCoords(np.array([xyzI], dtype = float), np.array([xyzF], dtype = float), [self.index])[0]
         
         if debug:
             print(rotated_points)
-            print(polyTup)
         return rotated_points
         
     def generate_all_possible_polygons(self, points):
         """
         *****INTERNAL FUNCTION*****
         Args: points = ((x1, y1), (x2, y2), (x3, y3), ... (xn, yn))
-        returns: The union of all possible triangles from the given points and combine them into a single polygon.
+        returns: The convex hull of the points. This is the same region as the union of every
+                 triangle formed by 3 of the points, built in O(n log n) instead of O(n^3) unions.
         """
-        triangles = []
-        
-        # Generate all combinations of exactly 3 points (triangles)
-        for subset in combinations(points, 3):
-            try:
-                triangle = Polygon(subset)
-                # Only consider valid triangles that are not self-intersecting
-                if triangle.is_valid:
-                    triangles.append(triangle)
-            except Exception as e:
-                print(f"Error creating triangle from subset {subset}: {e}")
-        
-        # Combine all valid triangles into a single union
-        combined_polygon = unary_union(triangles)
-        
-        return combined_polygon
+        return MultiPoint(points).convex_hull
     
     def getPolygon(self, xyzI, xyzF):
         """
@@ -224,13 +276,15 @@ class printer:
         Returns: a polygon representing the area between the 5 points
         """
         
-        p = Polygon(self.getPolygonCoords(xyzI, xyzF))
-        
-        if (not p.is_simple):
-            p = self.generate_all_possible_polygons((self.getPolygonCoords(xyzI, xyzF)))
-        
-        
-        return p
+        return self.getPolygonFromCoords(self.getPolygonCoords(xyzI, xyzF))
+    
+    def getPolygonFromCoords(self, coords):
+        """
+        *****INTERNAL FUNCTION*****
+        Args: coords = the 5 points returned by getPolygonCoords (or one row of FleetState.sweptCoords)
+        Returns: a polygon representing the area between the 5 points, shared with the FleetPlot (sweptPolygon)
+        """
+        return sweptPolygon(coords)
     
     def getScaledPolygon(self, xyzI, xyzF):
         """
@@ -245,6 +299,19 @@ class printer:
         
         return scaled
     
+    def localToGlobal(self, points):
+        """
+        Args: points = array of (x, y) positions in the printer's coordinates
+        Returns: numpy array of the same positions in the envelope's coordinates
+        """
+        return self.fleet.toGlobal(np.asarray(points, dtype = float)[None], [self.index])[0]
+    
+    def getGlobalBase(self):
+        """
+        Returns the printer's base position in the envelope's coordinates
+        """
+        return self.localToGlobal(self.PrinterOffset)
+    
     def getLiveAnalysisPolygon(self):
         """
         wrapper for the scaled polygon method that thakes inputs of the printer's actual coordinates through HTTP
@@ -256,6 +323,9 @@ class printer:
         """
         plots the printer 
         """
+        if self.ax is None:
+            return
+        
         locationI = self.getCurrentPosition()
         locationF = self.getTargetPosition()
         
@@ -289,25 +359,13 @@ class printer:
         # plt.set_xlim(minX-30, maxX+30)
         # self.ax.set_ylim(minY-150, maxY+150)
         
-        def calculate_forward_kinematics(theta1, theta2, l1, l2):
-            """Calculates the end-effector position for given joint angles."""
-            x = l1 * np.cos(theta1) + l2 * np.cos(theta1 + theta2)
-            y = l1 * np.sin(theta1) + l2 * np.sin(theta1 + theta2)
-            return x, y
-        
         theta1_range = np.linspace(-0.25*np.pi, 0.75 * np.pi, 200)  # Adjust resolution as needed
         theta2_range = np.linspace(0, 1 * np.pi, 200)
     
-        x_values = []
-        y_values = []
-    
-        for theta1 in theta1_range:
-            for theta2 in theta2_range:
-                x, y = calculate_forward_kinematics(theta1, theta2, self.armOneLength, self.armTwoLength)
-                x_values.append(x)
-                y_values.append(y)
+        theta1, theta2 = np.meshgrid(theta1_range, theta2_range, indexing = "ij") # whole sweep in one call
+        elbows, points = forward_kinematics((0, 0), theta1.ravel(), theta2.ravel(), self.armOneLength, self.armTwoLength)
+        x_values, y_values = points[:, 0], points[:, 1]
         
-        points = np.array(list(zip(x_values, y_values)))
         hull = ConvexHull(points)
     
         boundary_x = points[hull.vertices, 0]
@@ -335,6 +393,28 @@ class printer:
     """
     Printer Network Functions
     """
+    def setStatusSource(self, source):
+        """
+        Args: source = StatusSource used by the poller for this printer,
+              e.g. StatusSources.SelectiveStatusSource() to request only the object model keys the envelope needs
+              or StatusSources.IncrementalStatusSource() to re-download only the subtrees that changed
+        """
+        self.statusSource = source
+    
+    def attachPoller(self, poller):
+        """
+        Reads positions from the shared snapshot of a running FleetPoller instead of requesting them
+        """
+        self.poller = poller
+    
+    def getSnapshot(self):
+        """
+        Returns the latest status record published by the poller, or None without a poller/answer
+        """
+        if self.poller is None:
+            return None
+        return self.poller.getSnapshot(self.IP)
+    
     def getTargetPosition(self):
         """
         This is for getting the target end position from the printer
@@ -344,34 +424,125 @@ class printer:
         if self.status == False:
             return self.Stored_Resume_Point
         else:
-            # return self.request_status()["coords"]["xyz"]
+            snapshot = self.getSnapshot()
+            if snapshot is not None:
+                return snapshot["target"]
             return (0,300,0)
         
     
+    def getFeedrate(self):
+        """
+        Returns the requested speed of the current move in mm/s, 0 while paused or unknown
+        """
+        snapshot = self.getSnapshot()
+        if self.status == False or snapshot is None or not snapshot["feedrate"]:
+            return 0
+        return snapshot["feedrate"]
+    
+    def getRemainingTime(self):
+        """
+        Returns the estimated time left on the print in seconds, None when the status source does not report it
+        """
+        snapshot = self.getSnapshot()
+        if snapshot is None:
+            return None
+        return snapshot.get("remaining")
+    
+    def getPauseCost(self):
+        """
+        Cost of pausing this printer used by the envelope's conflict resolver:
+        the priority, times the remaining print time when it is known
+        """
+        remaining = self.getRemainingTime()
+        if remaining is None:
+            return self.priority
+        return self.priority * max(remaining, 1)
+    
     def getCurrentPosition(self):
         """
         This is for getting the current position from the printer
         """
-        # return self.request_status()["coords"]["machine"]
+        snapshot = self.getSnapshot()
+        if snapshot is not None:
+            return snapshot["machine"]
         return (300,300,0)
     
+    def getPredictedPosition(self, t = None):
+        """
+        Position extrapolated from the latest snapshot toward the target at the feedrate (MotionEstimator),
+        so that it does not lag behind the printer by the age of the snapshot.
+        Args: t = time.time() the position is predicted for, now by default
+        Returns: (position, uncertainty in mm). Without a snapshot: (getCurrentPosition(), 0)
+        """
+        self.estimator.addSample(self.getSnapshot())
+        position, uncertainty = self.estimator.predict(t, moving = self.status != False)
+        if position is None:
+            return self.getCurrentPosition(), 0
+        return position, uncertainty
+    
     def request_status(self):
-    	base_request = ("http://{0}:{1}/rr_status?type=0").format(self.IP,"")
-    	return requests.get(base_request).json()
+        """
+        Polls the printer once through its status source (see setStatusSource), outside of a poller.
+        While a poller is attached its latest snapshot is returned instead, the source is not shared between threads.
+        Returns: the snapshot record {"status", "machine", "target", "feedrate", "timestamp", "latency"...}
+        """
+        if self.poller is not None:
+            return self.getSnapshot()
+        
+        # the request runs on the printer's own loop thread, so it also works from a console with a running event loop
+        if self.statusLoop is None:
+            self.statusLoop = asyncio.new_event_loop()
+            self.statusThread = threading.Thread(target = self.statusLoop.run_forever, daemon = True)
+            self.statusThread.start()
+        
+        start_time = time.time()
+        record = asyncio.run_coroutine_threadsafe(self.fetchStatus(), self.statusLoop).result()
+        record["timestamp"] = start_time
+        record["latency"] = time.time() - start_time
+        return record
+    
+    async def fetchStatus(self):
+        """
+        *****INTERNAL FUNCTION*****
+        Polls the printer through its status source over the keep-alive session, created on first use inside the loop
+        """
+        if self.statusSession is None:
+            connector = aiohttp.TCPConnector(limit = 1) # one persistent connection, like the poller's
+            self.statusSession = aiohttp.ClientSession(connector = connector, timeout = aiohttp.ClientTimeout(total = self.timeout))
+        return await self.statusSource.fetch(self.statusSession, self.IP)
+    
+    def closeStatus(self):
+        """
+        Closes the keep-alive session of request_status and stops its thread
+        """
+        if self.statusLoop is None:
+            return
+        
+        if self.statusSession is not None:
+            asyncio.run_coroutine_threadsafe(self.statusSession.close(), self.statusLoop).result()
+            self.statusSession = None
+        self.statusLoop.call_soon_threadsafe(self.statusLoop.stop)
+        self.statusThread.join()
+        self.statusLoop.close()
+        self.statusLoop = None
+        self.statusThread = None
     
     def issue_gcode(self, com, filename=""):
-        base_request = ("http://{0}:{1}/rr_gcode?gcode=" + self.gcode_list[com] + filename).format(self.IP,"")
-        r = requests.get(base_request)
+        base_request = ("http://{0}/rr_gcode?gcode=" + self.gcode_list[com] + filename).format(self.IP)
+        r = self.session.get(base_request, timeout = self.timeout)
         return r
     
     def pause(self):
-        self.Stored_Resume_Point = self.getCurrentPosition()
+        # the state only changes once the command went through, a failed pause leaves the printer running
+        position = self.getCurrentPosition()
         self.issue_gcode("pause")
+        self.Stored_Resume_Point = position
         self.status = False
         
     def resume(self):
-        self.Stored_Resume_Point = []
+        # the state only changes once the command went through, a failed resume leaves the printer paused at its stored point
         self.issue_gcode("resume")
+        self.Stored_Resume_Point = []
         self.status = True
         
     def pickFile(self, filename):
@@ -386,53 +557,55 @@ class printer:
     
         
 class envelope:
-    def __init__(self, printers):
+    def __init__(self, printers, plot = True):
         """
         printers is either a 2D list with the parameters to create a printer in the order:
             [Origin location (x,y,theta), Base offset (x, y), "ip address", "Printer Name"]
             
         or printers is a list of printer objects:
             [Printer1, Printer2, Printer3]
+        
+        plot = False runs the envelope headless, otherwise a FleetPlot draws the printers created from a 2D list
         """
+        self.fleet = FleetState(len(printers)) # geometry and live poses of every printer, one row each
+        self.plotter = None
+        self.conflictMaps = None
+        self.commandPool = None # threads sending pause/resume commands to all printers at once
+        self.dispatcher = None  # CommandDispatcher used to prepare and start all printers at once, see getDispatcher
+        self.uploader = None    # FileUploader streaming the job's G-code to all printers, see uploadJob
+        self.pollScheduler = None # PollScheduler adapting each printer's poll period to its clearance, see startPolling
+        self.pausedWeight = 0.5 # relative cost of keeping an already paused printer paused, below 1 to avoid flip-flopping
+        self.extrapolate = False # use positions predicted between polls instead of the last snapshot, see runControlLoop
+        
         try:
             printers[0][0]
-            
-            self.fig, self.ax = plt.subplots()
-            
-            self.printerList = []
-            for details in printers:
-                self.printerList.append(printer(details[0], details[1], details[2], self.ax, PrinterName = details[3]))
-            
-            
-            
-            
-            minX = self.getMinMaxX()[0]
-            maxX = self.getMinMaxX()[1]
-            
-            minY = self.getMinMaxY()[0]
-            maxY = self.getMinMaxY()[1]
-            
-            
-            # print(minX, maxX, "\n")
-            
-            # print(minY, maxY)
-            
-            
-            self.ax.set_xlim(minX-150, maxX)
-            self.ax.set_ylim(minY-150, maxY)
-            
-            # plt.show()
-        except:
+        except TypeError: # printer objects are not subscriptable
             print("alt")
             self.alt__init__(printers)
+            return
+        
+        self.printerList = []
+        for details in printers:
+            self.printerList.append(printer(details[0], details[1], details[2], PrinterName = details[3], fleet = self.fleet))
+        
+        self.fig, self.ax = None, None
+        if plot:
+            self.plotter = FleetPlot(names = [pr.getName() for pr in self.printerList]).attach(self.fleet)
+            self.fig, self.ax = self.plotter.fig, self.plotter.ax
+        
+        # plt.show()
         
         
     def alt__init__(self, printers):
         
         
         self.printerList = printers
+        for pr in self.printerList:
+            pr.bindFleet(self.fleet)
         
         self.ax = self.printerList[0].getAx()
+        if self.ax is None:
+            return
         
         
         minX = self.getMinMaxX()[0]
@@ -457,19 +630,7 @@ class envelope:
         Used to get the X minimum and X maximum values for the printer workspace
         """
         
-        minX = sys.maxsize
-        maxX = -1*sys.maxsize
-        
-        for printer in self.printerList:
-            printerRect = printer.getBuildSurfaceRectangle()
-            LeftX = printerRect.get_xy()[0]
-            RightX = printerRect.get_xy()[0] + printerRect.get_width()
-            
-            if(LeftX < minX):
-                minX = LeftX
-            
-            if(RightX > maxX):
-                maxX = RightX
+        minX, maxX, minY, maxY = self.fleet.bounds()
         
         return(minX, maxX)
     
@@ -479,29 +640,36 @@ class envelope:
         Used to get the Y minimum and Y maximum values for the printer workspace
         """
         
-        minY = sys.maxsize
-        maxY = -1*sys.maxsize
-        
-        for printer in self.printerList:
-            printerRect = printer.getBuildSurfaceRectangle()
-            LowerY = printerRect.get_xy()[1]
-            UpperY = printerRect.get_xy()[1] + printerRect.get_height()
-            
-            if(LowerY < minY):
-                minY = LowerY
-            
-            if(UpperY > maxY):
-                maxY = UpperY
+        minX, maxX, minY, maxY = self.fleet.bounds()
         
         return(minY, maxY)
     
     
-    def plotAll(self):
+    def syncFleet(self):
         """
-        plots all the printers
+        *****INTERNAL FUNCTION*****
+        Copies every printer's live position, target and feedrate into the FleetState once per tick.
+        With extrapolate the position is predicted for this instant, its uncertainty widening the printer's buffer.
         """
+        now = time.time()
         for pr in self.printerList:
-            pr.plot(self.ax)
+            if self.extrapolate:
+                position, uncertainty = pr.getPredictedPosition(now)
+            else:
+                position, uncertainty = pr.getCurrentPosition(), 0
+            self.fleet.setPose(pr.index, position, pr.getTargetPosition(), pr.getFeedrate(), uncertainty)
+    
+    def plotAll(self):
+        """
+        plots all the printers, through the fleet's observers when the envelope has a FleetPlot
+        """
+        if self.plotter is None:
+            for pr in self.printerList:
+                pr.plot(self.ax)
+            return
+        
+        self.syncFleet()
+        self.fleet.notify()
     
     def findKinematicOverlaps(self):
         """
@@ -511,6 +679,70 @@ class envelope:
         
     
     
+    def loadConflictMaps(self, resolution = 5, cacheDir = CACHE_DIR, uncertainty = 10):
+        """
+        Loads (or computes and caches on disk) the reachability and pairwise-conflict maps of the current layout.
+        Once loaded, getIntersections skips the printers whose nozzle path lies outside every zone shared with another printer.
+        Needs to be called again whenever a printer is moved or its scaleFactor changes.
+        Args: uncertainty = uncertainty in mm of a predicted position (see runControlLoop) the maps still cover,
+                            printers predicted with a larger one are always checked exactly
+        """
+        bases = self.fleet.bases()
+        rotations = [pr.OriginLocation[2] for pr in self.printerList]
+        armLengths = self.fleet.armLengths
+        radii = self.fleet.radii
+        
+        self.conflictMaps = ConflictMaps.for_layout(bases, rotations, armLengths, radii, resolution, cacheDir, uncertainty)
+        
+    def getPossiblePairs(self):
+        """
+        *****INTERNAL FUNCTION*****
+        O(1) per sample lookup in the conflict maps along every printer's nozzle path.
+        Returns: (N, N) boolean numpy array of the printer pairs that may touch, or None if no maps are loaded
+        """
+        if self.conflictMaps is None:
+            return None
+        
+        self.syncFleet()
+        starts, ends = self.fleet.globalPoses()
+        paths = [sample_path(start, end, self.conflictMaps.resolution) for start, end in zip(starts, ends)]
+        
+        return self.conflictMaps.candidate_pairs(paths, self.fleet.uncertainties)
+    
+    def getLivePolygons(self, active = None):
+        """
+        *****INTERNAL FUNCTION*****
+        Builds every printer's live analysis polygon once for the current tick,
+        from the swept corners of all printers computed at once by the FleetState.
+        Args: active = optional boolean list, printers marked False get no polygon (None)
+        Returns: a list of polygons in the same order as self.printerList
+        """
+        self.syncFleet()
+        coords = self.fleet.sweptCoords()
+        margins = self.fleet.margins()
+        return [pr.getPolygonFromCoords(coords[pr.index]).buffer(margins[pr.index]) if active is None or active[i] else None
+                for i, pr in enumerate(self.printerList)]
+    
+    def getCandidatePairs(self, polygons, possiblePairs = None):
+        """
+        *****INTERNAL FUNCTION*****
+        Broad phase: indexes the polygons' bounding boxes in an STRtree and runs the exact
+        intersects test only on pairs whose bounding boxes overlap.
+        Args: polygons = list of polygons ordered like self.printerList (None entries are ignored)
+              possiblePairs = optional (N, N) boolean array from getPossiblePairs, other pairs are skipped
+        Returns: a list of sets, entry i holds the indices of the printers whose polygon intersects polygon i
+        """
+        neighbours = [set() for _ in polygons]
+        
+        tree = STRtree(polygons)
+        inputIdx, treeIdx = tree.query(polygons, predicate = "intersects")
+        
+        for i, j in zip(inputIdx.tolist(), treeIdx.tolist()):
+            if i != j and (possiblePairs is None or possiblePairs[i, j]):
+                neighbours[i].add(j)
+        
+        return neighbours
+    
     def getIntersections(self):
         """
         FINISH IMPLEMENTATION
@@ -518,20 +750,19 @@ class envelope:
         """
         intersectionList = []
         
-        for printer1 in self.printerList.copy():
-            
-            otherPs = self.printerList.copy()
-            otherPs.remove(printer1)
-            
-            poly1 = printer1.getLiveAnalysisPolygon()
-            
-            
-            for printer2 in otherPs: # iterate through all the other printers
-                poly2 = printer2.getLiveAnalysisPolygon() #get the polygon from the printer
+        possiblePairs = self.getPossiblePairs()
+        active = None if possiblePairs is None else possiblePairs.any(axis = 1)
+        
+        polygons = self.getLivePolygons(active) # one polygon per printer per tick
+        neighbours = self.getCandidatePairs(polygons, possiblePairs)
+        
+        for i, printer1 in enumerate(self.printerList):
+            for j in sorted(neighbours[i]): # keep the printer list order of the exhaustive search
+                printer2 = self.printerList[j]
                 
-                if poly1.intersects(poly2) and (printer1 not in intersectionList) and (printer2 not in intersectionList):
+                if (printer1 not in intersectionList) and (printer2 not in intersectionList):
                     intersectionList.append(printer2)
-                    
+        
         
         
         
@@ -539,36 +770,255 @@ class envelope:
             print(a.getName())
         return intersectionList
     
+    def getTimesToContact(self, horizon = 2.0, samples = 40):
+        """
+        Predicts the motion of every printer from its current to its target position at its feedrate.
+        Args: horizon = seconds to look ahead, samples = number of time samples over the horizon
+        Returns: (N, N) numpy array with the earliest time in seconds at which printers i and j touch,
+                 np.inf where they do not touch within the horizon
+        """
+        self.syncFleet()
+        fleet = self.fleet
+        current, target = fleet.globalPoses()
+        
+        return time_to_contact(fleet.bases(), current, target, fleet.feedrates, fleet.armLengths, fleet.margins(), horizon, samples)
+    
+    def getImminentContacts(self, horizon = 2.0, samples = 40):
+        """
+        Same selection as getIntersections, but only for printers predicted to touch within the horizon
+        instead of printers whose whole-move envelopes overlap.
+        """
+        intersectionList = []
+        
+        ttc = self.getTimesToContact(horizon, samples)
+        
+        for i, printer1 in enumerate(self.printerList):
+            for j in np.flatnonzero(np.isfinite(ttc[i])).tolist():
+                printer2 = self.printerList[j]
+                
+                if (printer1 not in intersectionList) and (printer2 not in intersectionList):
+                    intersectionList.append(printer2)
+        
+        return intersectionList
+    
+    def getConflictEdges(self, horizon = None):
+        """
+        Builds the conflict graph of the current tick.
+        Args: horizon = None uses overlaps of the whole-move envelopes (like getIntersections),
+                        a number of seconds uses the printers predicted to touch within that time
+        Returns: a list of (i, j) printer index pairs in conflict, i < j
+        """
+        if horizon is not None:
+            ttc = self.getTimesToContact(horizon)
+            return [(i, j) for i, j in zip(*[index.tolist() for index in np.nonzero(np.isfinite(ttc))]) if i < j]
+        
+        possiblePairs = self.getPossiblePairs()
+        active = None if possiblePairs is None else possiblePairs.any(axis = 1)
+        neighbours = self.getCandidatePairs(self.getLivePolygons(active), possiblePairs)
+        return [(i, j) for i in range(len(neighbours)) for j in neighbours[i] if i < j]
+    
+    def getClearances(self):
+        """
+        Distance from every arm to the nearest other arm at the printers' current positions,
+        between the buffers of the links (scaleFactor plus the uncertainty of predicted positions), negative where the buffers overlap.
+        Returns: (clearances, neighbours) numpy arrays, neighbours holding the index of the nearest printer (-1 if alone)
+        """
+        self.syncFleet()
+        fleet = self.fleet
+        if len(fleet) < 2:
+            return np.full(len(fleet), np.inf), np.full(len(fleet), -1)
+        
+        # elbow and nozzle of every printer moved to the envelope's coordinates in one matmul
+        joints = fleet.toGlobal(np.stack((fleet.jointLocations(fleet.current), fleet.current[:, :2]), axis = 1))
+        
+        margins = fleet.margins()
+        distances = link_distance_matrix(fleet.bases(), joints[:, 0], joints[:, 1]) - margins[:, None] - margins[None, :]
+        return distances.min(axis = 1), distances.argmin(axis = 1)
+    
+    def updatePollPeriods(self):
+        """
+        Sets every printer's poll period from its clearance and the feedrates (see startPolling with adaptive = True)
+        Returns: {ip: poll period in seconds}, None without adaptive polling
+        """
+        if self.pollScheduler is None:
+            return None
+        
+        clearances, neighbours = self.getClearances()
+        return self.pollScheduler.update([pr.IP for pr in self.printerList], clearances, self.fleet.feedrates, neighbours)
+    
+    def resolveConflicts(self, edges):
+        """
+        Picks the printers to pause so that no two running printers are in conflict, pausing the smallest
+        total cost (see printer.getPauseCost). Printers that are already paused cost pausedWeight times less.
+        A paused printer is stopped and cannot get out of the way, so both printers of a paused-running conflict
+        are kept on pause (the paused one is not resumed before the other has stopped); the cover is only
+        searched over the remaining conflicts, where pausedWeight breaks the ties.
+        Returns: the set of printers to keep or put on pause
+        """
+        paused = [pr.getStatus() == False for pr in self.printerList]
+        forced = {k for i, j in edges if paused[i] != paused[j] for k in (i, j)}
+        remaining = [(i, j) for i, j in edges if i not in forced and j not in forced]
+        
+        weights = [pr.getPauseCost() * (self.pausedWeight if paused[i] else 1) for i, pr in enumerate(self.printerList)]
+        cover = forced | min_weight_vertex_cover(len(self.printerList), remaining, weights)
+        return {self.printerList[i] for i in cover}
+    
+    def issueAll(self, printers, command):
+        """
+        Runs a printer method (e.g. "pause" or "resume") on several printers at once.
+        Returns: list of (printer, exception) for the printers whose command failed
+        """
+        if not printers:
+            return []
+        if self.commandPool is None:
+            self.commandPool = ThreadPoolExecutor(max_workers = len(self.printerList))
+        
+        futures = [(pr, self.commandPool.submit(getattr(pr, command))) for pr in printers]
+        failures = []
+        for pr, future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                print(pr.getName(), command, "failed:", e)
+                failures.append((pr, e))
+        return failures
+    
+    def getDispatcher(self):
+        """
+        Returns the envelope's CommandDispatcher, started on first use
+        """
+        if self.dispatcher is None:
+            self.dispatcher = CommandDispatcher([pr.IP for pr in self.printerList]).start()
+        return self.dispatcher
+    
+    def getUploader(self):
+        """
+        Returns the envelope's FileUploader, started on first use
+        """
+        if self.uploader is None:
+            self.uploader = FileUploader().start()
+        return self.uploader
+    
+    def uploadJob(self, filename, files):
+        """
+        Uploads files[i] to printer i as "filename_i", to all printers at once, so that prepare(filename) can select them.
+        files is the list returned by generateJob for the printers in the order of printerList.
+        Returns: {ip: result of FileUploader.uploadAsync}
+        """
+        results = self.getUploader().uploadAll({pr.IP: (path, filename + "_" + str(i)) for i, (pr, path) in enumerate(zip(self.printerList, files))})
+        
+        for pr in self.printerList:
+            if pr.IP in results and "error" in results[pr.IP]:
+                print(pr.getName(), "upload failed:", results[pr.IP]["error"])
+        return results
+    
     def prepare(self, filename = ""):
         """
         Filename assumes that the files on the printers are in the format "filename_(number)"
         number is the printer's number in reference to the list which was used to initialize the printers
+        The preheat and file selection of each printer are sent as one request, to all printers at once.
+        Returns: {ip: result of CommandDispatcher.sendBatch}
         """
+        batches = {}
         for i in range(len(self.printerList)):
             pr = self.printerList[i]
-            pr.preheat()
-            pr.pickFile(filename +"_"+str(i))
+            batches[pr.IP] = [pr.gcode_list["heat"], pr.gcode_list["pick"] + filename +"_"+str(i)]
+        
+        return self.getDispatcher().dispatch(batches)
+            
+    def startPolling(self, rate = 10, timeout = 0.2, adaptive = False, maxPeriod = 1.0):
+        """
+        Starts a FleetPoller for all the printers so that their positions are read from a shared,
+        non-blocking snapshot that is refreshed concurrently in the background
+        Args: adaptive = True lets every checkingAlgorithm tick set each printer's poll period from its clearance
+                         to the nearest arm and the feedrates (PollScheduler), between 1 / rate and maxPeriod.
+                         Otherwise every printer is polled rate times per second.
+        """
+        self.poller = FleetPoller([pr.IP for pr in self.printerList], rate, timeout,
+                                  sources = {pr.IP: pr.statusSource for pr in self.printerList})
+        for pr in self.printerList:
+            pr.attachPoller(self.poller)
+        if adaptive:
+            self.pollScheduler = PollScheduler(self.poller, minPeriod = 1 / rate, maxPeriod = maxPeriod)
+        self.poller.start()
+        
+    def stopPolling(self):
+        self.poller.stop()
             
     def startPrints(self):
         """
         Should be be run to start the prints at the same time.
         Need to make sure the hotends are warm before this runs though
+        Every M24 is released at once after warming up the connections (CommandDispatcher.startAll).
+        Returns: the start skew in seconds, see CommandDispatcher.startAll
         """
+        results, skew = self.getDispatcher().startAll([pr.IP for pr in self.printerList], printer.gcode_list["resume"])
+        
         for pr in self.printerList:
-            pr.resume()
+            if "error" in results[pr.IP]:
+                print(pr.getName(), "did not start:", results[pr.IP]["error"])
+            else:
+                pr.Stored_Resume_Point = []
+                pr.status = True
+        
+        print("Start skew (s):", skew)
+        return skew
             
-    def checkingAlgorithm(self):
+    def checkingAlgorithm(self, horizon = None):
         """
-        Need to test this method, but it should work...
+        Pauses the cheapest set of printers that leaves no conflict between running printers (resolveConflicts)
+        and resumes every other paused printer. All pause and resume commands of a tick are sent concurrently.
+        Args: horizon = None pauses on any overlap of the whole-move envelopes (getIntersections).
+                        A number of seconds pauses only printers predicted to touch within that time (getImminentContacts).
+        Returns: the set of printers paused after this tick
         """
-        intersectionList = self.getIntersections()
-        for pr in intersectionList:
-            pr.pause()
-            
-        intersectionList = self.getIntersections()
-        for pr in self.printerList():
-            if pr.getStatus() == False and pr not in intersectionList:
-                pr.resume()
+        paused = self.resolveConflicts(self.getConflictEdges(horizon))
+        
+        self.issueAll([pr for pr in self.printerList if pr in paused and pr.getStatus() != False], "pause")
+        self.issueAll([pr for pr in self.printerList if pr not in paused and pr.getStatus() == False], "resume")
+        self.updatePollPeriods()
+        return paused
+    
+    def runControlLoop(self, rate = 50, duration = None, horizon = None, stopEvent = None):
+        """
+        Runs checkingAlgorithm at a fixed rate on positions extrapolated between polls (getPredictedPosition),
+        so the loop rate no longer depends on the HTTP latency: the poller refreshes the samples in the
+        background and a late answer only widens the buffers by the uncertainty of the prediction.
+        Needs startPolling first.
+        Args: rate = ticks per second, duration = seconds to run for (None runs until stopEvent is set)
+              horizon = passed on to checkingAlgorithm, stopEvent = optional threading.Event ending the loop
+        Returns: {"ticks", "overruns", "maxTickTime"}, overruns counting the ticks that took longer than 1 / rate
+        """
+        period = 1 / rate
+        self.extrapolate = True
+        stats = {"ticks": 0, "overruns": 0, "maxTickTime": 0}
+        
+        start = time.perf_counter()
+        nextTick = start
+        try:
+            while not (stopEvent is not None and stopEvent.is_set()):
+                if duration is not None and nextTick - start >= duration:
+                    break
+                
+                tickStart = time.perf_counter()
+                self.checkingAlgorithm(horizon)
+                tickTime = time.perf_counter() - tickStart
+                
+                stats["ticks"] += 1
+                stats["maxTickTime"] = max(stats["maxTickTime"], tickTime)
+                
+                # fixed schedule, a late tick is not caught up with a burst of ticks
+                nextTick += period
+                now = time.perf_counter()
+                if now > nextTick:
+                    stats["overruns"] += 1
+                    nextTick = now
+                else:
+                    time.sleep(nextTick - now)
+        finally:
+            self.extrapolate = False
+        
+        return stats
                     
             
 if __name__ == "__main__":
@@ -0,0 +1,319 @@
+"""
+Local stand-in for the RepRapFirmware HTTP interface.
+
+Every virtual printer listens on its own localhost port and answers rr_status, rr_model,
+rr_gcode, rr_upload, rr_fileinfo and rr_filelist with a configurable response latency,
+jitter and failure rate. Motion is played back from a G-code file once a print is started
+with M24, so position polling behaves like a printer that is actually moving.
+
+Point the existing scripts at "127.0.0.1:<port>" instead of "192.168.0.x", e.g.
+
+    python duet_simulator.py --count 24 --port 8000 --latency 0.02 --jitter 0.01 --gcode AMBOT1.gcode
+"""
+import argparse
+import asyncio
+import bisect
+import math
+import random
+import re
+import time
+import zlib
+
+from aiohttp import web  # For the asynchronous HTTP server
+
+
+# Status letters used by rr_status and the matching object model state.status values
+STATUS_NAMES = {"I": "idle", "P": "processing", "S": "paused", "D": "pausing", "R": "resuming", "B": "busy"}
+
+GCODE_WORD = re.compile(r"([A-Z])(-?\d*\.?\d+)")
+
+
+def parse_gcode_moves(lines, start=(0.0, 0.0, 0.0), feedrate=50.0):
+    """
+    Extract the linear moves of a G-code program for playback.
+
+    :param lines: Iterable of G-code lines.
+    :param start: (x, y, z) position before the first move.
+    :param feedrate: Feedrate in mm/s used until the program sets one with F.
+    :return: List of (start, end, speed) tuples with positions in mm and speed in mm/s. Moves are assumed absolute.
+    """
+    moves = []
+    position = tuple(start)
+    for line in lines:
+        code = line.split(";")[0].strip().upper()
+        if not (code.startswith("G0") or code.startswith("G1")) or code[2:3].isdigit():
+            continue
+
+        words = dict(GCODE_WORD.findall(code[2:]))
+        if "F" in words:
+            feedrate = float(words["F"]) / 60
+        end = tuple(float(words[axis]) if axis in words else position[i] for i, axis in enumerate("XYZ"))
+        if end != position:
+            moves.append((position, end, feedrate))
+            position = end
+    return moves
+
+
+class VirtualPrinter:
+    def __init__(self, name, moves=None, home=(0.0, 0.0, 0.0), latency=0.01, jitter=0.0, failure_rate=0.0, speedup=1.0):
+        """
+        :param name: Name reported by the printer.
+        :param moves: Default motion playback, as returned by parse_gcode_moves.
+        :param home: (x, y, z) position of the printer while idle.
+        :param latency: Mean response delay in seconds added to every request.
+        :param jitter: Maximum deviation in seconds from the mean response delay.
+        :param failure_rate: Probability that a request fails with HTTP 503.
+        :param speedup: Playback speed multiplier applied to the G-code feedrates.
+        """
+        self.name = name
+        self.home = tuple(home)
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.speedup = speedup
+
+        self.files = {}              # uploaded files by name
+        self.file_times = {}         # modification time sent with each upload (rr_upload time=)
+        self.selected_file = None
+        self.status = "I"
+        self.seqs = {"state": 0, "job": 0, "move": 0, "volumes": 0}
+        self.requests = 0
+        self.set_moves(moves or [])
+
+    def set_moves(self, moves):
+        self.moves = moves
+        self.move_ends = []
+        elapsed = 0.0
+        for start, end, speed in moves:
+            elapsed += math.dist(start, end) / (speed * self.speedup)
+            self.move_ends.append(elapsed)
+        self.play_time = 0.0        # playback time accumulated before the last resume
+        self.play_start = None      # wall clock time of the last resume, None while not moving
+
+    def set_status(self, status):
+        if status != self.status:
+            self.status = status
+            self.seqs["state"] += 1
+
+    """
+    Motion playback
+    """
+    def get_play_time(self):
+        play_time = self.play_time
+        if self.play_start is not None:
+            play_time += time.time() - self.play_start
+        if self.move_ends and play_time >= self.move_ends[-1]:
+            self.play_time, self.play_start = self.move_ends[-1], None
+            self.set_status("I")
+            return self.move_ends[-1]
+        return play_time
+
+    def get_motion(self):
+        """
+        :return: Tuple (machine position, target position, requested speed) at the current time.
+        """
+        if not self.moves:
+            return self.home, self.home, 0.0
+
+        play_time = self.get_play_time()
+        i = min(bisect.bisect_right(self.move_ends, play_time), len(self.moves) - 1)
+        start, end, speed = self.moves[i]
+        move_start = self.move_ends[i - 1] if i > 0 else 0.0
+        fraction = min(max((play_time - move_start) / (self.move_ends[i] - move_start), 0.0), 1.0)
+
+        machine = tuple(s + (e - s) * fraction for s, e in zip(start, end))
+        moving = self.play_start is not None
+        return machine, end if moving else machine, speed if moving else 0.0
+
+    def remaining_time(self):
+        if not self.move_ends:
+            return 0.0
+        return self.move_ends[-1] - self.get_play_time()
+
+    """
+    Commands
+    """
+    def run_gcode(self, gcode):
+        for command in gcode.split("\n"):
+            command = command.strip()
+            code = command[:3].upper()
+            if code == "M23":
+                self.selected_file = command[3:].strip().split("/")[-1]
+                if self.selected_file in self.files:
+                    text = self.files[self.selected_file].decode("utf8", errors="ignore")
+                    self.set_moves(parse_gcode_moves(text.splitlines(), start=self.home))
+                self.seqs["job"] += 1
+            elif code == "M24":
+                if self.play_start is None:
+                    self.play_start = time.time()
+                self.set_status("P")
+            elif code == "M25":
+                self.play_time = self.get_play_time()
+                self.play_start = None
+                self.set_status("S")
+
+    """
+    Documents
+    """
+    def status_document(self):
+        machine, target, speed = self.get_motion()
+        return {"status": self.status,
+                "coords": {"axesHomed": [1, 1, 1], "wpl": 1, "xyz": list(target), "machine": list(machine), "extr": [0.0]},
+                "speeds": {"requested": speed, "top": speed},
+                "currentTool": 0,
+                "params": {"atxPower": 0, "fanPercent": [0, 0, 0], "speedFactor": 100.0, "extrFactors": [100.0], "babystep": 0.0},
+                "seq": self.seqs["state"],
+                "sensors": {"probeValue": 0, "fanRPM": [0, 0]},
+                "temps": {"current": [25.0, 240.0], "state": [2, 2], "heads": {"current": [240.0], "active": [240.0], "standby": [0.0], "state": [2]}},
+                "time": time.time()}
+
+    def model_document(self, frequent=False):
+        machine, target, speed = self.get_motion()
+        axes = [{"letter": letter, "machinePosition": m, "userPosition": t} for letter, m, t in zip("XYZ", machine, target)]
+        model = {"seqs": dict(self.seqs),
+                 "move": {"axes": axes, "currentMove": {"requestedSpeed": speed, "topSpeed": speed}},
+                 "state": {"status": STATUS_NAMES.get(self.status, "idle"), "upTime": time.time()},
+                 "job": {"timesLeft": {"file": self.remaining_time()}}}
+        if not frequent:
+            for axis in axes:
+                axis.update({"homed": True, "min": 0, "max": 300, "speed": 5000, "acceleration": 1000, "jerk": 900})
+            model["job"]["file"] = {"fileName": self.selected_file}
+            model["network"] = {"name": self.name}
+            model["volumes"] = [{"path": "0:/", "mounted": True, "freeSpace": 1 << 30}]
+        return model
+
+
+def resolve_key(document, key):
+    """
+    Look up a dotted object model key such as "move.axes[].machinePosition" in a document.
+    A "[]" suffix maps the rest of the key over every element of the list.
+    """
+    if not key:
+        return document
+    head, _, rest = key.partition(".")
+    if head.endswith("[]"):
+        return [resolve_key(item, rest) for item in document[head[:-2]]]
+    if head.endswith("]"):
+        name, index = head[:-1].split("[")
+        return resolve_key(document[name][int(index)], rest)
+    return resolve_key(document[head], rest)
+
+
+def create_app(printer):
+    """
+    Build the aiohttp application serving one virtual printer.
+    """
+
+    @web.middleware
+    async def network_conditions(request, handler):
+        printer.requests += 1
+        delay = printer.latency + random.uniform(-printer.jitter, printer.jitter)
+        await asyncio.sleep(max(0.0, delay))
+        if random.random() < printer.failure_rate:
+            raise web.HTTPServiceUnavailable()
+        return await handler(request)
+
+    async def rr_status(request):
+        return web.json_response(printer.status_document())
+
+    async def rr_model(request):
+        flags = request.query.get("flags", "")
+        key = request.query.get("key", "")
+        try:
+            result = resolve_key(printer.model_document(frequent="f" in flags), key)
+        except (KeyError, IndexError, ValueError):
+            result = None
+        return web.json_response({"key": key, "flags": flags, "result": result})
+
+    async def rr_gcode(request):
+        printer.run_gcode(request.query.get("gcode", ""))
+        return web.json_response({"buff": 255})
+
+    async def rr_upload(request):
+        name = request.query.get("name", "").split("/")[-1]
+        data = await request.read()
+        crc = request.query.get("crc32")
+        if crc is not None and int(crc, 16) != zlib.crc32(data):
+            return web.json_response({"err": 1})
+        printer.files[name] = data
+        printer.file_times[name] = request.query.get("time")
+        printer.seqs["volumes"] += 1
+        return web.json_response({"err": 0})
+
+    async def rr_fileinfo(request):
+        name = request.query.get("name", "").split("/")[-1]
+        if name not in printer.files:
+            return web.json_response({"err": 1})
+        return web.json_response({"err": 0, "fileName": name, "size": len(printer.files[name]),
+                                  "lastModified": printer.file_times.get(name)})
+
+    async def rr_filelist(request):
+        files = [{"type": "f", "name": name, "size": len(data)} for name, data in printer.files.items()]
+        return web.json_response({"dir": request.query.get("dir", "0:/gcodes"), "first": 0, "files": files, "next": 0})
+
+    app = web.Application(middlewares=[network_conditions], client_max_size=1 << 30)
+    app.router.add_get("/rr_status", rr_status)
+    app.router.add_get("/rr_model", rr_model)
+    app.router.add_get("/rr_gcode", rr_gcode)
+    app.router.add_post("/rr_upload", rr_upload)
+    app.router.add_get("/rr_fileinfo", rr_fileinfo)
+    app.router.add_get("/rr_filelist", rr_filelist)
+    return app
+
+
+async def start_printers(printers, host="127.0.0.1", base_port=8000):
+    """
+    Start one HTTP server per virtual printer on consecutive ports.
+
+    :return: Tuple (addresses, runners). Addresses are "host:port" strings usable wherever a printer IP is expected.
+    """
+    addresses = []
+    runners = []
+    for i, printer in enumerate(printers):
+        runner = web.AppRunner(create_app(printer), access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, host, base_port + i).start()
+        addresses.append(f"{host}:{base_port + i}")
+        runners.append(runner)
+    return addresses, runners
+
+
+async def stop_printers(runners):
+    for runner in runners:
+        await runner.cleanup()
+
+
+async def main(args):
+    moves = []
+    if args.gcode:
+        with open(args.gcode, "r") as gcode_file:
+            moves = parse_gcode_moves(gcode_file)
+
+    printers = [VirtualPrinter(f"Virtual {i}", moves, latency=args.latency, jitter=args.jitter,
+                               failure_rate=args.failure_rate, speedup=args.speedup)
+                for i in range(args.count)]
+    addresses, runners = await start_printers(printers, args.host, args.port)
+
+    print("Virtual printers:")
+    print(addresses)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await stop_printers(runners)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulated RepRapFirmware printers for latency and load testing.")
+    parser.add_argument("--count", type=int, default=3, help="number of virtual printers")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000, help="port of the first printer, the others follow")
+    parser.add_argument("--latency", type=float, default=0.01, help="mean response delay in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="maximum deviation from the mean delay in seconds")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="probability that a request fails")
+    parser.add_argument("--gcode", help="G-code file played back after M24")
+    parser.add_argument("--speedup", type=float, default=1.0, help="playback speed multiplier")
+
+    try:
+        asyncio.run(main(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+Per-printer motion estimator bridging the time between two status polls.
+
+Every status record is kept with the time it was measured. Between polls the nozzle is
+assumed to keep moving in a straight line toward the reported target at the reported
+feedrate, so the control loop can ask for the position at any instant instead of using a
+sample that is a whole round trip old. Each prediction comes with an uncertainty radius
+that grows with the age of the sample, which the envelope adds to the collision buffer.
+Only a printer that reported itself paused keeps a fixed uncertainty when its samples stop coming.
+"""
+import math
+import time
+from collections import deque
+
+
+# rr_status letters of a printer that cannot move until it is told to (paused, halted, off)
+STOPPED_STATUSES = ("S", "H", "O")
+
+
+class MotionEstimator:
+    def __init__(self, history = 8, speedError = 0.1, maxSpeed = 100, maxUncertainty = 450):
+        """
+        Args:
+            history: number of status samples kept
+            speedError: fraction of the feedrate the real speed may differ by (acceleration, speed factor)
+            maxSpeed: fastest the nozzle may move in mm/s, assumed once the predicted move is over
+                      or the sample gets old, since the next move is not known yet
+            maxUncertainty: cap on the uncertainty in mm, a little more than the reach of the default arms (217 + 204)
+                            past which the buffer already covers the whole workspace
+        """
+        self.samples = deque(maxlen = history)  # (time measured, position, target, feedrate, latency, status)
+        self.speedError = speedError
+        self.maxSpeed = maxSpeed
+        self.maxUncertainty = maxUncertainty
+
+    def addSample(self, record):
+        """
+        Stores a snapshot record of the FleetPoller, ignoring records already stored.
+        The position is taken to be measured halfway through the request, timestamp + latency / 2.
+        Returns: True if the record was new
+        """
+        if record is None:
+            return False
+
+        measured = record["timestamp"] + record.get("latency", 0) / 2
+        if self.samples and measured <= self.samples[-1][0]:
+            return False
+
+        self.samples.append((measured, tuple(record["machine"]), tuple(record["target"]),
+                             record["feedrate"] or 0, record.get("latency", 0), record.get("status")))
+        return True
+
+    def getAge(self, t = None):
+        """
+        Returns: seconds since the last sample was measured, None without samples
+        """
+        if not self.samples:
+            return None
+        return (time.time() if t is None else t) - self.samples[-1][0]
+
+    def predict(self, t = None, moving = True):
+        """
+        Extrapolates the nozzle position to time t (now by default).
+        Args: moving = False for a paused printer, which stays where it was last seen. Its uncertainty
+                       only stops growing once the printer reported a status in STOPPED_STATUSES.
+        Returns: (position (x, y, z), uncertainty radius in mm), or (None, None) without samples
+        """
+        if not self.samples:
+            return None, None
+
+        measured, position, target, feedrate, latency, status = self.samples[-1]
+        age = max((time.time() if t is None else t) - measured, 0)
+        if not moving:
+            feedrate = 0
+        stopped = not moving and status in STOPPED_STATUSES
+
+        # Straight line toward the target at the feedrate, stopping at the target
+        remaining = math.dist(position[:2], target[:2])
+        travelled = min(feedrate * age, remaining)
+        fraction = travelled / remaining if remaining > 0 else 0
+        predicted = tuple(p + fraction * (q - p) for p, q in zip(position, target))
+
+        # The sample was taken somewhere within the request, the speed is only nominal,
+        # and after the predicted end of the move (or a poll later for a printer standing still)
+        # the next move may go anywhere, unless the printer confirmed it is paused
+        uncertainty = feedrate * latency / 2 + self.speedError * travelled
+        if not stopped:
+            known = remaining / feedrate if feedrate > 0 else latency
+            uncertainty += self.maxSpeed * max(age - known, 0)
+        return predicted, min(uncertainty, self.maxUncertainty)
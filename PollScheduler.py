@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""
+Adaptive status polling driven by how close the arms are to each other.
+
+Each printer's poll period is set from the time its arm needs, at worst, to reach its
+nearest neighbour: the clearance between the two arms divided by their combined feedrate.
+Printers far from any other arm are polled rarely and printers close to contact as fast
+as minPeriod allows, so the request load drops while the reaction time where a collision
+is possible gets shorter.
+"""
+import numpy as np
+
+
+class PollScheduler:
+    def __init__(self, poller, minPeriod = 0.02, maxPeriod = 1.0, safety = 0.5, minSpeed = 10):
+        """
+        Args:
+            poller: FleetPoller whose periods are set (FleetPoller.setPeriod)
+            minPeriod: shortest time in seconds between two polls of a printer, used for printers in or near contact
+            maxPeriod: longest time in seconds between two polls, used for printers far from any other arm
+            safety: fraction of the worst case time to contact a printer may go without being polled
+            minSpeed: closing speed in mm/s assumed at least, so idle or paused neighbours still get polled
+                      before a move they have not reported yet can close the gap
+        """
+        self.poller = poller
+        self.minPeriod = minPeriod
+        self.maxPeriod = maxPeriod
+        self.safety = safety
+        self.minSpeed = minSpeed
+
+    def getPeriods(self, clearances, feedrates, neighbours):
+        """
+        Args: clearances = (N,) distance in mm from each arm to the nearest other arm (surface to surface, <= 0 in contact)
+              feedrates = (N,) current feedrate of each printer in mm/s
+              neighbours = (N,) index of each printer's nearest other printer, -1 without one
+        Returns: (N,) poll period of each printer in seconds
+        """
+        clearances = np.asarray(clearances, dtype = float)
+        feedrates = np.asarray(feedrates, dtype = float)
+        neighbours = np.asarray(neighbours)
+
+        neighbourFeedrates = np.where(neighbours >= 0, feedrates[np.maximum(neighbours, 0)], 0)
+        closingSpeed = np.maximum(feedrates + neighbourFeedrates, self.minSpeed)
+
+        timeToContact = np.maximum(clearances, 0) / closingSpeed
+        return np.clip(self.safety * timeToContact, self.minPeriod, self.maxPeriod)
+
+    def update(self, ips, clearances, feedrates, neighbours):
+        """
+        Sets the poll period of every printer from the current clearances and feedrates.
+        Args: ips = printer IP addresses in the order of the arrays, see getPeriods for the rest
+        Returns: {ip: poll period in seconds}
+        """
+        periods = dict(zip(ips, self.getPeriods(clearances, feedrates, neighbours).tolist()))
+        for ip, period in periods.items():
+            self.poller.setPeriod(ip, period)
+        return periods
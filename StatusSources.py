@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+"""
+Status sources used by the FleetPoller.
+
+A status source decides which HTTP requests are made to a printer on every poll and
+converts the answers into the snapshot record read by the envelope:
+    {"status": "P", "machine": (x, y, z), "target": (x, y, z), "feedrate": mm/s}
+IncrementalStatusSource also reports "remaining", the estimated print time left in seconds.
+
+Every source counts the bytes received and the time spent decoding JSON per mode so
+the payload cost of each polling strategy can be compared.
+"""
+import asyncio
+import json
+import time
+
+
+# Object model state.status values converted to the rr_status status letters
+STATUS_LETTERS = {"idle": "I",
+                  "busy": "B",
+                  "processing": "P",
+                  "simulating": "M",
+                  "paused": "S",
+                  "pausing": "D",
+                  "resuming": "R",
+                  "cancelling": "C",
+                  "changingTool": "T",
+                  "halted": "H",
+                  "off": "O",
+                  "updating": "F",
+                  "starting": "B",
+                  "disconnected": "O"}
+
+
+def parseStatus(response):
+    """
+    Normalizes an rr_status?type=0 response into the snapshot record used by the envelope.
+    Args: response = decoded JSON from rr_status
+    Returns: dictionary with the printer status letter, machine position, target position and requested feedrate
+    """
+    return {"status": response["status"],
+            "machine": tuple(response["coords"]["machine"]),
+            "target": tuple(response["coords"]["xyz"]),
+            "feedrate": response["speeds"]["requested"]}
+
+
+class StatusSource:
+    """
+    Base class. Subclasses implement fetch(session, ip) and return a snapshot record.
+    """
+    def __init__(self):
+        self.stats = {}
+
+    async def fetchJSON(self, session, url, mode):
+        """
+        Requests a URL and decodes its JSON body, recording the payload size and decode time under mode
+        """
+        async with session.get(url) as response:
+            body = await response.read()
+
+        start_time = time.perf_counter()
+        data = json.loads(body)
+        decodeTime = time.perf_counter() - start_time
+
+        modeStats = self.stats.setdefault(mode, {"requests": 0, "bytes": 0, "decodeTime": 0.0})
+        modeStats["requests"] += 1
+        modeStats["bytes"] += len(body)
+        modeStats["decodeTime"] += decodeTime
+        return data
+
+    async def fetch(self, session, ip):
+        raise NotImplementedError
+
+    def getStats(self):
+        """
+        Returns: {mode: {"requests", "bytes", "decodeTime", "bytesPerRequest", "decodeTimePerRequest"}}
+        """
+        ret = {}
+        for mode, modeStats in self.stats.items():
+            requests = max(modeStats["requests"], 1)
+            ret[mode] = dict(modeStats,
+                             bytesPerRequest = modeStats["bytes"] / requests,
+                             decodeTimePerRequest = modeStats["decodeTime"] / requests)
+        return ret
+
+
+class FullStatusSource(StatusSource):
+    """
+    Downloads the whole rr_status?type=0 document on every poll.
+    """
+    def statusURL(self, ip):
+        return "http://{0}/rr_status?type=0".format(ip)
+
+    async def fetch(self, session, ip):
+        return parseStatus(await self.fetchJSON(session, self.statusURL(ip), "full"))
+
+
+class SelectiveStatusSource(FullStatusSource):
+    """
+    Requests only the part of the object model the collision loop needs, one request per poll:
+    the frequently-changing values of the move subtree (positions and requested speed) on most polls,
+    the whole frequently-changing document, which also carries state.status, every statusEvery polls,
+    and a full rr_status document every fullEvery polls. The polls in between reuse the last status letter.
+    """
+    moveKey = "move"
+    flags = "d99fn"
+
+    def __init__(self, fullEvery = 50, statusEvery = 5):
+        """
+        Args:
+            fullEvery: number of polls between two full rr_status requests (0 disables the fallback)
+            statusEvery: number of polls between two requests of the printer status
+        """
+        super().__init__()
+        self.fullEvery = fullEvery
+        self.statusEvery = statusEvery
+        self.polls = 0
+        self.status = None
+
+    def modelURL(self, ip, key = "", flags = "d99fn"):
+        return "http://{0}/rr_model?key={1}&flags={2}".format(ip, key, flags)
+
+    async def fetch(self, session, ip):
+        poll = self.polls
+        self.polls += 1
+
+        if self.fullEvery and poll % self.fullEvery == 0:
+            record = await super().fetch(session, ip)
+            self.status = record["status"]
+            return record
+
+        if self.status is None or poll % self.statusEvery == 0:
+            model = (await self.fetchJSON(session, self.modelURL(ip, flags = self.flags), "selective"))["result"]
+            move = model["move"]
+            self.status = STATUS_LETTERS.get(model["state"]["status"], model["state"]["status"])
+        else:
+            move = (await self.fetchJSON(session, self.modelURL(ip, self.moveKey, self.flags), "selective"))["result"]
+
+        axes = move["axes"][:3]
+        return {"status": self.status,
+                "machine": tuple(axis["machinePosition"] for axis in axes),
+                "target": tuple(axis["userPosition"] for axis in axes),
+                "feedrate": move["currentMove"]["requestedSpeed"]}
+
+
+def mergeModel(target, patch):
+    """
+    Merges a partial object model document into a local copy in place, the way the Duet Web Control does.
+    Args: target = local object model (dict), patch = partial document of the same shape
+    Returns: the merged target
+    """
+    for key, value in patch.items():
+        current = target.get(key)
+        if isinstance(value, dict) and isinstance(current, dict):
+            mergeModel(current, value)
+        elif isinstance(value, list) and isinstance(current, list):
+            target[key] = mergeList(current, value)
+        else:
+            target[key] = value
+    return target
+
+
+def mergeList(target, patch):
+    """
+    Element-wise counterpart of mergeModel. The patch decides the length of the list.
+    """
+    merged = []
+    for i, value in enumerate(patch):
+        if i < len(target) and isinstance(value, dict) and isinstance(target[i], dict):
+            merged.append(mergeModel(target[i], value))
+        else:
+            merged.append(value)
+    return merged
+
+
+class IncrementalStatusSource(StatusSource):
+    """
+    Keeps a merged copy of the printer's object model and only re-downloads the
+    subtrees whose seqs counter changed since the previous poll.
+
+    The live values the envelope needs (positions, speeds) never bump a seqs counter,
+    so every poll requests the frequently-changing document (flags=f), which carries
+    those values together with the seqs block, instead of the bare seqs key.
+    """
+    def __init__(self):
+        super().__init__()
+        self.model = None
+        self.seqs = {}
+
+    def modelURL(self, ip, key = "", flags = "d99vn"):
+        return "http://{0}/rr_model?key={1}&flags={2}".format(ip, key, flags)
+
+    async def fetch(self, session, ip):
+        if self.model is None:
+            self.model = (await self.fetchJSON(session, self.modelURL(ip), "full"))["result"]
+            self.seqs = dict(self.model.get("seqs", {}))
+            return self.getRecord()
+
+        frequent = (await self.fetchJSON(session, self.modelURL(ip, flags = "d99fn"), "frequent"))["result"]
+        mergeModel(self.model, frequent)
+
+        seqs = frequent.get("seqs", {})
+        changed = [key for key, seq in seqs.items() if key in self.model and self.seqs.get(key) != seq]
+        if changed:
+            results = await asyncio.gather(*[self.fetchJSON(session, self.modelURL(ip, key), "subtree") for key in changed])
+            for key, result in zip(changed, results):
+                self.model[key] = result["result"]
+        self.seqs = dict(seqs)
+
+        return self.getRecord()
+
+    def getRecord(self):
+        """
+        Converts the merged object model into a snapshot record
+        """
+        axes = self.model["move"]["axes"][:3]
+        status = self.model["state"]["status"]
+        return {"status": STATUS_LETTERS.get(status, status),
+                "machine": tuple(axis["machinePosition"] for axis in axes),
+                "target": tuple(axis["userPosition"] for axis in axes),
+                "feedrate": self.model["move"]["currentMove"]["requestedSpeed"],
+                "remaining": self.model.get("job", {}).get("timesLeft", {}).get("file")}
@@ -7,12 +7,17 @@ Created on Fri Oct 25 14:16:28 2024
 
 import requests
 import math
+import os
+import sys
 
 
 import matplotlib.pyplot as plt
 from shapely.geometry import Polygon
 from shapely.affinity import scale
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "CollisionCheck"))
+from scara_kinematics import inverse_kinematics
+
 
 class printer:
     gcode_list = {"M291": 'M291 P"Waiting for permission to continue" S3', # pauses printer to wait to be allowed to start again
@@ -116,16 +121,9 @@ class printer:
         x = xyz[0] + self.XOFFSETFROMZERO
         y = xyz[1] + self.YOFFSETFROMZERO
         
-        d = (x**2 + y**2)**0.5
-        
-        ArmOneAngle = math.acos((d**2  - self.armOneLength**2 - self.armTwoLength**2) / (2 * self.armOneLength * self.armTwoLength))
-        
-        alpha = math.atan(y/x)
-        beta = math.acos((self.armOneLength**2 + d**2 - self.armTwoLength**2) / (2* self.armOneLength * d))
-        
-        ArmTwoAngle = alpha - beta
+        ArmTwoAngle, ArmOneAngle, elbow, reachable = inverse_kinematics((0, 0), (x, y), self.armOneLength, self.armTwoLength)
                 
-        return (ArmOneAngle, ArmTwoAngle) # Returns a value in radians
+        return (float(ArmOneAngle), float(ArmTwoAngle)) # Returns a value in radians
     
     def findJointLocations(self, xyz):
         """
@@ -0,0 +1,43 @@
+import asyncio
+import itertools
+import os
+import sys
+import threading
+
+import matplotlib
+import pytest
+
+matplotlib.use("Agg")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for directory in ("", "CollisionCheck", "FileConversion", "LatencyTests"):
+    sys.path.insert(0, os.path.join(ROOT, directory))
+
+BASE_PORTS = itertools.count(18000, 50)
+
+
+@pytest.fixture
+def simulator():
+    """
+    Starts duet_simulator VirtualPrinters on a background event loop.
+    Returns a function taking a list of VirtualPrinter and returning their "host:port" addresses.
+    """
+    import duet_simulator
+
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    runners = []
+
+    def start(printers):
+        addresses, started = asyncio.run_coroutine_threadsafe(
+            duet_simulator.start_printers(printers, base_port=next(BASE_PORTS)), loop).result()
+        runners.extend(started)
+        return addresses
+
+    yield start
+
+    asyncio.run_coroutine_threadsafe(duet_simulator.stop_printers(runners), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.close()
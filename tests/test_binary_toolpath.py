@@ -0,0 +1,112 @@
+import json
+
+import numpy as np
+import pytest
+
+from BinaryToolpath import BinaryToolpath
+
+TEXT = """Layer 0
+Interfacing
+0.0 0.0 0.2 1
+10.5 0.0 0.2 1
+10.5 10.25 0.2 0
+Non-interfacing
+0.125 10.25 0.2 1
+Layer 1
+Interfacing
+0.0 0.0 0.4 1
+-3.5 7.75 0.4 1
+Layer 2
+Non-interfacing
+1.0 2.0 0.6 0
+"""
+
+
+@pytest.fixture
+def text_file(tmp_path):
+    path = tmp_path / "toolpath.txt"
+    path.write_text(TEXT)
+    return str(path)
+
+
+def parse_naively(text):
+    """
+    Line by line reference parse: (points as tuples, markers as (point index, line))
+    """
+    points, markers = [], []
+    for line in text.splitlines():
+        if "Layer" in line or "Interfacing" in line or "Non-interfacing" in line:
+            markers.append((len(points), line))
+        else:
+            x, y, z, t = line.split()
+            points.append((float(x), float(y), float(z), int(t)))
+    return points, markers
+
+
+@pytest.mark.parametrize("block_lines", [2, 3, 100000])
+def test_from_text_matches_line_by_line_parse(text_file, block_lines):
+    toolpath = BinaryToolpath.fromText(text_file, blockLines=block_lines)
+    points, markers = parse_naively(TEXT)
+    assert [tuple(p) for p in toolpath.points.tolist()] == points
+    assert toolpath.markers == markers
+
+
+def test_save_load_round_trip(text_file, tmp_path):
+    toolpath = BinaryToolpath.fromText(text_file)
+    path = toolpath.save(str(tmp_path / "toolpath"))
+
+    loaded = BinaryToolpath.load(path)
+    assert isinstance(loaded.points, np.memmap) and not loaded.points.flags.writeable
+    np.testing.assert_array_equal(loaded.points, toolpath.points)
+    assert loaded.markers == toolpath.markers
+
+    loaded.toText(str(tmp_path / "back.txt"))
+    assert parse_naively((tmp_path / "back.txt").read_text()) == parse_naively(TEXT)
+
+
+def test_load_rejects_a_stale_index(text_file, tmp_path):
+    path = BinaryToolpath.fromText(text_file).save(str(tmp_path / "toolpath"))
+    with open(path + ".json") as index_file:
+        index = json.load(index_file)
+    index["count"] += 1
+    with open(path + ".json", "w") as index_file:
+        json.dump(index, index_file)
+
+    with pytest.raises(ValueError):
+        BinaryToolpath.load(path)
+
+
+def test_layer_access(text_file):
+    toolpath = BinaryToolpath.fromText(text_file)
+    assert toolpath.layerCount() == 3
+    assert toolpath.layerRange(1) == (4, 6)
+    assert toolpath.layer(1)['x'].tolist() == [0.0, -3.5]
+    assert [text for _, text in toolpath.layerMarkers(0)] == ["Layer 0", "Interfacing", "Non-interfacing"]
+    np.testing.assert_array_equal(toolpath.xy(6), [[1.0, 2.0]])
+
+
+@pytest.mark.parametrize("block_points", [1, 2, 4096])
+def test_blocks_rebuild_the_text_order(text_file, block_points):
+    toolpath = BinaryToolpath.fromText(text_file)
+    lines, xs = [], []
+    for block_lines, x, y, t in toolpath.blocks(blockPoints=block_points):
+        lines.extend(block_lines)
+        xs.extend(x)
+
+    expected = ["" if not line.startswith(("Layer", "Interfacing", "Non-interfacing")) else line + "\n"
+                for line in TEXT.splitlines()]
+    assert lines == expected
+    assert xs == toolpath.points['x'].tolist()
+
+
+def test_transformed_matches_scalar_rotation(text_file):
+    toolpath = BinaryToolpath.fromText(text_file)
+    theta = np.radians(30)
+    transform = np.array([[np.cos(theta), -np.sin(theta), 100], [np.sin(theta), np.cos(theta), -50], [0, 0, 1]])
+
+    moved = toolpath.transformed(transform)
+    for (x, y, z, t), (mx, my, mz, mt) in zip(toolpath.points.tolist(), moved.points.tolist()):
+        assert mx == pytest.approx(round(x * np.cos(theta) - y * np.sin(theta) + 100, 6))
+        assert my == pytest.approx(round(x * np.sin(theta) + y * np.cos(theta) - 50, 6))
+        assert (mz, mt) == (z, t)
+    assert moved.markers == toolpath.markers
@@ -0,0 +1,76 @@
+import math
+
+import numpy as np
+import pytest
+from shapely.geometry import LineString, Point
+
+from collision_check import (segment_distances, link_distance_matrix, capsule_collision_matrix, check_collision,
+                             check_collision_batch, create_rectangle, scaras_to_arrays)
+
+
+def shapely_distance(p1, q1, p2, q2):
+    first = Point(p1) if np.allclose(p1, q1) else LineString([p1, q1])
+    second = Point(p2) if np.allclose(p2, q2) else LineString([p2, q2])
+    return first.distance(second)
+
+
+def test_segment_distances_match_shapely():
+    rng = np.random.default_rng(0)
+    p1, q1, p2, q2 = rng.uniform(-100, 100, (4, 500, 2))
+    # parallel, collinear, crossing and degenerate (point) segments
+    q2[:50] = p2[:50] + (q1[:50] - p1[:50]) * 0.5
+    p2[50:60] = p1[50:60] + (q1[50:60] - p1[50:60]) * 2
+    q2[50:60] = p1[50:60] + (q1[50:60] - p1[50:60]) * 3
+    q1[60:80] = p1[60:80]
+    q2[70:90] = p2[70:90]
+
+    expected = [shapely_distance(*segments) for segments in zip(p1, q1, p2, q2)]
+    np.testing.assert_allclose(segment_distances(p1, q1, p2, q2), expected, atol=1e-9)
+
+
+def random_arms(rng, n):
+    bases = rng.uniform(0, 800, (n, 2))
+    angles = rng.uniform(0, 2 * math.pi, (n, 2))
+    joints = bases + 217 * np.column_stack((np.cos(angles[:, 0]), np.sin(angles[:, 0])))
+    end_effectors = joints + 204 * np.column_stack((np.cos(angles[:, 1]), np.sin(angles[:, 1])))
+    return bases, joints, end_effectors
+
+
+def test_link_distance_matrix_matches_shapely():
+    bases, joints, end_effectors = random_arms(np.random.default_rng(1), 8)
+    distances = link_distance_matrix(bases, joints, end_effectors)
+
+    for i in range(8):
+        assert distances[i, i] == np.inf
+        arm_i = LineString([bases[i], joints[i], end_effectors[i]])
+        for j in range(i + 1, 8):
+            expected = arm_i.distance(LineString([bases[j], joints[j], end_effectors[j]]))
+            assert distances[i, j] == pytest.approx(expected)
+            assert distances[j, i] == distances[i, j]
+
+
+def test_capsules_contain_the_buffered_rectangles():
+    rng = np.random.default_rng(2)
+    for _ in range(20):
+        bases, joints, end_effectors = random_arms(rng, 6)
+        collisions = capsule_collision_matrix(bases, joints, end_effectors, width=30, buffer_size=10)
+        links = [(create_rectangle(b, j, 30).buffer(10), create_rectangle(j, e, 30).buffer(10))
+                 for b, j, e in zip(bases.tolist(), joints.tolist(), end_effectors.tolist())]
+
+        for i in range(6):
+            for j in range(i + 1, 6):
+                touching = any(a.intersects(b) for a in links[i] for b in links[j])
+                if touching:
+                    assert collisions[i, j]
+        assert check_collision_batch(bases, joints, end_effectors) == collisions.any()
+
+
+def test_check_collision_batch_agrees_with_check_collision():
+    scaras = [{'local_origin': (0, 0), 'robot_base': (150, -35), 'theta_local': 0,
+               'end_effector_local': (250, 250), 'arm_lengths': (217, 204)},
+              {'local_origin': (300, 600), 'robot_base': (150, 635), 'theta_local': 180,
+               'end_effector_local': (50, 340), 'arm_lengths': (217, 204)}]  # nozzle at (250, 260)
+    assert check_collision(scaras) and check_collision_batch(*scaras_to_arrays(scaras))
+
+    scaras[1]['end_effector_local'] = (50, 50)
+    assert not check_collision(scaras) and not check_collision_batch(*scaras_to_arrays(scaras))
@@ -0,0 +1,68 @@
+import pytest
+
+import Full_Envelope_Managment as fem
+from CommandDispatcher import CommandDispatcher
+from duet_simulator import VirtualPrinter
+
+
+@pytest.fixture
+def dispatcher_factory():
+    dispatchers = []
+
+    def make(ips):
+        dispatcher = CommandDispatcher(ips).start()
+        dispatchers.append(dispatcher)
+        return dispatcher
+
+    yield make
+    for dispatcher in dispatchers:
+        dispatcher.stop()
+
+
+def test_commands_of_a_printer_go_in_one_request(simulator, dispatcher_factory):
+    printers = [VirtualPrinter(f"v{i}", latency=0.01) for i in range(3)]
+    addresses = simulator(printers)
+    dispatcher = dispatcher_factory(addresses)
+
+    results = dispatcher.dispatch({ip: ["M104 S250", "M23 job_" + str(i)] for i, ip in enumerate(addresses)})
+    assert all("error" not in result for result in results.values())
+    assert [printer.selected_file for printer in printers] == ["job_0", "job_1", "job_2"]
+    assert [printer.requests for printer in printers] == [1, 1, 1]
+
+
+def test_start_all_releases_every_printer_together(simulator, dispatcher_factory):
+    printers = [VirtualPrinter(f"v{i}", [((0, 0, 0), (300, 0, 0), 60)], latency=0.01, jitter=0.005) for i in range(4)]
+    dispatcher = dispatcher_factory(simulator(printers))
+
+    results, skew = dispatcher.startAll()
+    assert all(printer.status == "P" for printer in printers)
+    assert all(result["rtt"] is not None for result in results.values())
+
+    starts = [printer.play_start for printer in printers]
+    assert max(starts) - min(starts) < 0.05
+    assert skew["send"] < 0.02
+
+
+def test_failed_printer_is_reported(simulator, dispatcher_factory):
+    healthy, failing = simulator([VirtualPrinter("ok", latency=0), VirtualPrinter("bad", latency=0, failure_rate=1.0)])
+    dispatcher = dispatcher_factory([healthy, failing])
+
+    results, skew = dispatcher.startAll()
+    assert "error" in results[failing] and "error" not in results[healthy]
+    assert dispatcher.errors[failing] > 0
+    assert skew["send"] == 0  # only the answered printer counts
+
+
+def test_envelope_prepares_and_starts_every_printer(simulator):
+    printers = [VirtualPrinter(f"v{i}", latency=0.005) for i in range(2)]
+    addresses = simulator(printers)
+    env = fem.envelope([[(i * 2000, 0, 0), (150, -35), address, f"p{i}"] for i, address in enumerate(addresses)], plot=False)
+    try:
+        env.prepare("job")
+        assert [printer.selected_file for printer in printers] == ["job_0", "job_1"]
+
+        env.startPrints()
+        assert all(printer.status == "P" for printer in printers)
+        assert all(pr.getStatus() is True and pr.Stored_Resume_Point == [] for pr in env.printerList)
+    finally:
+        env.getDispatcher().stop()
@@ -0,0 +1,84 @@
+import math
+
+import numpy as np
+import pytest
+
+from collision_check import link_distance_matrix
+from conflict_maps import ConflictMaps, sample_path
+from scara_kinematics import THETA1_RANGE, THETA2_RANGE, forward_kinematics
+
+# two facing printers whose workspaces overlap, like a pair of beds in the cell
+BASES = np.array([[150.0, -35.0], [150.0, 635.0]])
+ROTATIONS = np.array([0.0, 180.0])
+ARM_LENGTHS = np.array([[217.0, 204.0], [217.0, 204.0]])
+RADII = np.array([5.0, 5.0])
+
+
+@pytest.fixture(scope="module")
+def maps(tmp_path_factory):
+    return ConflictMaps.for_layout(BASES, ROTATIONS, ARM_LENGTHS, RADII, resolution=10,
+                                   cache_dir=str(tmp_path_factory.mktemp("conflict_cache")))
+
+
+def random_poses(rng, i, count):
+    theta1 = rng.uniform(*THETA1_RANGE, count) + math.radians(ROTATIONS[i])
+    theta2 = rng.uniform(*THETA2_RANGE, count)
+    return forward_kinematics(BASES[i], theta1, theta2, *ARM_LENGTHS[i])
+
+
+def test_touching_arms_are_never_filtered_out(maps):
+    rng = np.random.default_rng(0)
+    elbows0, nozzles0 = random_poses(rng, 0, 4000)
+    elbows1, nozzles1 = random_poses(rng, 1, 4000)
+
+    touching = 0
+    for k in range(4000):
+        distance = link_distance_matrix(BASES, np.stack((elbows0[k], elbows1[k])), np.stack((nozzles0[k], nozzles1[k])))[0, 1]
+        if distance <= RADII.sum():
+            touching += 1
+            assert maps.may_conflict(0, 1, nozzles0[k], nozzles1[k])
+    assert touching > 0
+
+
+def test_far_apart_poses_are_filtered_out(maps):
+    # both nozzles pulled back toward their own base
+    assert not maps.may_conflict(0, 1, (150, 150), (150, 450))
+    pairs = maps.candidate_pairs([sample_path((100, 150), (200, 150), 10), sample_path((100, 450), (200, 450), 10)])
+    assert not pairs.any()
+
+    pairs = maps.candidate_pairs([sample_path((150, 150), (150, 400), 10), sample_path((150, 450), (150, 250), 10)])
+    assert pairs[0, 1] and pairs[1, 0]
+
+
+def test_maps_are_cached_per_layout(maps, tmp_path):
+    first = ConflictMaps.for_layout(BASES, ROTATIONS, ARM_LENGTHS, RADII, resolution=10, cache_dir=str(tmp_path))
+    assert len(list(tmp_path.iterdir())) == 1
+    second = ConflictMaps.for_layout(BASES, ROTATIONS, ARM_LENGTHS, RADII, resolution=10, cache_dir=str(tmp_path))
+    np.testing.assert_array_equal(first.conflict, second.conflict)
+    np.testing.assert_array_equal(first.reach, maps.reach)
+
+    moved = ConflictMaps(BASES + 1, ROTATIONS, ARM_LENGTHS, RADII, resolution=10)
+    assert moved.layout_key() != first.layout_key()
+
+
+def test_uncertain_arms_are_never_filtered_out(tmp_path):
+    uncertainty = 15
+    maps = ConflictMaps.for_layout(BASES, ROTATIONS, ARM_LENGTHS, RADII, resolution=10, cache_dir=str(tmp_path),
+                                   uncertainty=uncertainty)
+    rng = np.random.default_rng(1)
+    elbows0, nozzles0 = random_poses(rng, 0, 4000)
+    elbows1, nozzles1 = random_poses(rng, 1, 4000)
+
+    touching = 0
+    for k in range(4000):
+        distance = link_distance_matrix(BASES, np.stack((elbows0[k], elbows1[k])), np.stack((nozzles0[k], nozzles1[k])))[0, 1]
+        if RADII.sum() < distance <= RADII.sum() + 2 * uncertainty:
+            touching += 1
+            assert maps.may_conflict(0, 1, nozzles0[k], nozzles1[k])
+    assert touching > 0
+
+
+def test_printers_above_the_uncertainty_are_always_paired(maps):
+    paths = [sample_path((100, 150), (200, 150), 10), sample_path((100, 450), (200, 450), 10)]
+    assert not maps.candidate_pairs(paths, [0, 0]).any()
+    assert maps.candidate_pairs(paths, [0, 5])[0, 1]
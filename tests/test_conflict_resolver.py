@@ -0,0 +1,69 @@
+from itertools import combinations
+
+import numpy as np
+import pytest
+
+from conflict_resolver import conflict_components, exact_cover, approximate_cover, min_weight_vertex_cover
+
+
+def is_cover(cover, edges):
+    return all(i in cover or j in cover for i, j in edges)
+
+
+def brute_force_cost(n, edges, weights):
+    best = np.inf
+    for size in range(n + 1):
+        for subset in combinations(range(n), size):
+            if is_cover(set(subset), edges):
+                best = min(best, sum(weights[v] for v in subset))
+    return best
+
+
+def random_graph(rng, n, density):
+    return [(i, j) for i, j in combinations(range(n), 2) if rng.random() < density]
+
+
+def test_conflict_components():
+    components = conflict_components(7, [(0, 1), (2, 1), (4, 5), (3, 3)])
+    assert sorted(components) == [([0, 1, 2], [(0, 1), (1, 2)]), ([4, 5], [(4, 5)])]
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_exact_cover_is_optimal(seed):
+    rng = np.random.default_rng(seed)
+    n = 9
+    edges = random_graph(rng, n, 0.3)
+    weights = rng.uniform(0.5, 10, n)
+
+    cover = min_weight_vertex_cover(n, edges, weights)
+    assert is_cover(cover, edges)
+    assert sum(weights[v] for v in cover) == pytest.approx(brute_force_cost(n, edges, weights))
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_approximate_cover_is_within_twice_the_optimum(seed):
+    rng = np.random.default_rng(seed)
+    n = 10
+    edges = random_graph(rng, n, 0.35)
+    weights = rng.uniform(0.5, 10, n)
+    vertices = sorted({v for edge in edges for v in edge})
+
+    cover = approximate_cover(vertices, edges, weights)
+    assert is_cover(cover, edges)
+    assert sum(weights[v] for v in cover) <= 2 * brute_force_cost(n, edges, weights) + 1e-9
+
+
+def test_large_components_fall_back_to_the_approximation():
+    # a ring of 20 printers, too large to enumerate
+    n = 20
+    edges = [(i, (i + 1) % n) for i in range(n)]
+    weights = np.ones(n)
+    cover = min_weight_vertex_cover(n, edges, weights, exact_limit=16)
+    assert is_cover(cover, edges)
+    assert len(cover) <= 2 * (n // 2)
+
+
+def test_cheaper_printer_is_paused():
+    assert min_weight_vertex_cover(3, [(0, 1)], [5.0, 1.0, 1.0]) == {1}
+    assert exact_cover([0, 1, 2], [(0, 1), (1, 2)], [1.0, 1.5, 1.0]) == {1}
+    assert min_weight_vertex_cover(3, [], [1.0, 1.0, 1.0]) == set()
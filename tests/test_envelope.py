@@ -0,0 +1,170 @@
+import numpy as np
+import pytest
+import requests
+
+import Full_Envelope_Managment as fem
+
+
+def make_envelope():
+    # two printers far apart, never in conflict
+    return fem.envelope([[(0, 0, 0), (150, -35), "127.0.0.1:1", "p0"],
+                         [(2000, 0, 0), (150, -35), "127.0.0.1:2", "p1"]], plot=False)
+
+
+def test_failed_resume_keeps_printer_paused(monkeypatch):
+    env = make_envelope()
+    pr = env.printerList[0]
+    pr.status = False
+    pr.Stored_Resume_Point = (10, 20, 0)
+
+    def issue_gcode(self, com, filename=""):
+        raise requests.ConnectionError("printer unreachable")
+    monkeypatch.setattr(fem.printer, "issue_gcode", issue_gcode)
+
+    env.checkingAlgorithm()
+    assert pr.getStatus() is False
+    assert pr.Stored_Resume_Point == (10, 20, 0)
+
+    # the next tick still syncs the stored point into the fleet
+    env.checkingAlgorithm()
+    assert tuple(env.fleet.target[pr.index]) == (10, 20, 0)
+
+
+def test_failed_pause_keeps_printer_running(monkeypatch):
+    env = make_envelope()
+    pr = env.printerList[0]
+    pr.status = True
+    pr.Stored_Resume_Point = []
+
+    def issue_gcode(self, com, filename=""):
+        raise requests.ConnectionError("printer unreachable")
+    monkeypatch.setattr(fem.printer, "issue_gcode", issue_gcode)
+
+    with pytest.raises(requests.ConnectionError):
+        pr.pause()
+    assert pr.getStatus() is True
+    assert pr.Stored_Resume_Point == []
+
+
+def test_resume_clears_stored_point(monkeypatch):
+    env = make_envelope()
+    pr = env.printerList[0]
+    pr.status = False
+    pr.Stored_Resume_Point = (10, 20, 0)
+    monkeypatch.setattr(fem.printer, "issue_gcode", lambda self, com, filename="": None)
+
+    env.checkingAlgorithm()
+    assert pr.getStatus() is True
+    assert pr.Stored_Resume_Point == []
+
+
+def test_plot_all_with_headless_printers():
+    printers = [fem.printer((0, 0, 0), (150, -35), "127.0.0.1:1", PrinterName="p0"),
+                fem.printer((0, 600, 270), (150, -35), "127.0.0.1:2", PrinterName="p1")]
+    env = fem.envelope(printers)
+    assert env.plotter is None and env.ax is None
+    env.plotAll()
+    printers[0].plotPrinterPoint((10, 10, 0))
+
+
+def test_plotting_errors_are_not_swallowed(monkeypatch):
+    class BrokenPlot:
+        def __init__(self, names=None):
+            raise RuntimeError("no display")
+    monkeypatch.setattr(fem, "FleetPlot", BrokenPlot)
+
+    with pytest.raises(RuntimeError):
+        fem.envelope([[(0, 0, 0), (150, -35), "127.0.0.1:1", "p0"]])
+
+
+def test_control_loop_runs_at_a_fixed_rate_on_predicted_positions(simulator):
+    from duet_simulator import VirtualPrinter
+
+    printers = [VirtualPrinter(f"v{i}", [((100, 100, 0), (250, 100, 0), 3000)], latency=0.02) for i in range(2)]
+    addresses = simulator(printers)
+    env = fem.envelope([[(i * 2000, 0, 0), (150, -35), address, f"p{i}"] for i, address in enumerate(addresses)], plot=False)
+    printers[0].run_gcode("M24")
+
+    env.startPolling(rate=20, timeout=1)
+    try:
+        assert env.poller.waitForFirstStatus()
+        stats = env.runControlLoop(rate=50, duration=0.4, horizon=1.0)
+    finally:
+        env.stopPolling()
+
+    assert 15 <= stats["ticks"] <= 21
+    assert env.extrapolate is False
+    assert all(pr.getStatus() is not False for pr in env.printerList)  # far apart, never paused
+    # positions predicted between 50 ms polls widen the buffers by a few mm
+    uncertainties = env.fleet.uncertainties
+    assert ((uncertainties > 0) & (uncertainties < 20)).all()
+    np.testing.assert_allclose(env.fleet.margins(), env.fleet.radii + uncertainties)
+
+
+class SnapshotPoller:
+    def __init__(self, snapshots):
+        self.snapshots = snapshots
+
+    def getSnapshot(self, ip):
+        return self.snapshots.get(ip)
+
+
+@pytest.mark.parametrize("horizon", [None, 2.0])
+def test_running_printer_is_paused_before_a_parked_one(monkeypatch, horizon):
+    # A is paused and parked at (300, 300), B drives through that spot toward (0, 300)
+    env = fem.envelope([[(0, 0, 0), (150, -35), "127.0.0.1:1", "A"],
+                        [(0, 0, 0), (150, -35), "127.0.0.1:2", "B"]], plot=False)
+    a, b = env.printerList
+    poller = SnapshotPoller({b.IP: {"status": "P", "machine": (300, 300, 0), "target": (0, 300, 0), "feedrate": 100,
+                                    "timestamp": 0, "latency": 0}})
+    for pr in env.printerList:
+        pr.attachPoller(poller)
+    a.status, b.status = False, True
+    a.Stored_Resume_Point = (300, 300, 0)
+
+    commands = []
+    monkeypatch.setattr(fem.printer, "issue_gcode", lambda self, com, filename="": commands.append((self.getName(), com)))
+
+    edges = env.getConflictEdges(horizon)
+    assert edges == [(0, 1)] and all(type(i) is int for edge in edges for i in edge)
+    assert env.checkingAlgorithm(horizon) == {a, b}
+    assert commands == [("B", "pause")]
+    assert a.getStatus() is False and b.getStatus() is False
+
+
+@pytest.mark.parametrize("allowance", [10, 40])
+def test_conflict_maps_keep_pairs_of_uncertain_predictions(monkeypatch, tmp_path, allowance):
+    # bases 500 mm apart, B's predicted nozzle just outside its conflict zone, but 40 mm uncertain
+    env = fem.envelope([[(0, 0, 0), (150, -35), "127.0.0.1:1", "A"],
+                        [(500, 0, 0), (150, -35), "127.0.0.1:2", "B"]], plot=False)
+    poller = SnapshotPoller({ip: {"status": "P", "machine": machine, "target": machine, "feedrate": 0, "timestamp": 0, "latency": 0}
+                             for ip, machine in [("127.0.0.1:1", (425, 200, 0)), ("127.0.0.1:2", (0, 250, 0))]})
+    for pr in env.printerList:
+        pr.attachPoller(poller)
+        pr.status = True
+    monkeypatch.setattr(fem.printer, "getPredictedPosition", lambda self, t=None: (self.getCurrentPosition(), 40))
+    env.extrapolate = True
+    assert env.getConflictEdges() == [(0, 1)]
+
+    env.loadConflictMaps(cacheDir=str(tmp_path), uncertainty=allowance)
+    assert env.getConflictEdges() == [(0, 1)]
+
+    env.extrapolate = False  # exact positions, the maps filter the pair out
+    assert env.getConflictEdges() == []
+
+
+def test_plot_draws_the_collision_polygons():
+    env = fem.envelope([[(0, 0, 0), (150, -35), "127.0.0.1:1", "p0"],
+                        [(0, 600, 270), (150, -35), "127.0.0.1:2", "p1"]])
+    # p0 sweeps across its own arm (not a simple polygon), p1 does not
+    poller = SnapshotPoller({"127.0.0.1:1": {"status": "P", "machine": (50, 250, 0), "target": (300, 100, 0), "feedrate": 50},
+                             "127.0.0.1:2": {"status": "P", "machine": (100, 100, 0), "target": (300, 300, 0), "feedrate": 50}})
+    for pr in env.printerList:
+        pr.attachPoller(poller)
+        pr.status = True
+
+    env.plotAll()
+    fills = env.plotter.live[0::2]
+    for fill, polygon in zip(fills, env.getLivePolygons()):
+        np.testing.assert_allclose(fill.get_xy(), np.array(polygon.exterior.coords))
+    assert len(fills) == 2
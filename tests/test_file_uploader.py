@@ -0,0 +1,64 @@
+import os
+import time
+import zlib
+
+import pytest
+
+from duet_simulator import VirtualPrinter
+from FileUploader import FileUploader, fileCRC
+
+
+@pytest.fixture
+def uploader():
+    uploader = FileUploader(chunkSize=1024, retries=1)
+    yield uploader
+    uploader.stop()
+
+
+def write(path, text, mtime):
+    path.write_text(text)
+    os.utime(path, (mtime, mtime))
+    return str(path)
+
+
+def test_file_crc(tmp_path):
+    data = b"G1 X10 Y10\n" * 1000
+    (tmp_path / "job.gcode").write_bytes(data)
+    assert fileCRC(str(tmp_path / "job.gcode"), chunkSize=100) == "{0:08x}".format(zlib.crc32(data))
+
+
+def test_upload_then_skip_same_file(simulator, uploader, tmp_path):
+    printer = VirtualPrinter("v0", latency=0)
+    ip, = simulator([printer])
+    path = write(tmp_path / "a.gcode", "G1 X1 Y1\n" * 500, 1_700_000_000)
+
+    first = uploader.uploadAll({ip: (path, "job_0")})[ip]
+    assert "error" not in first and "skipped" not in first
+    assert printer.files["job_0"] == open(path, "rb").read()
+
+    second = uploader.uploadAll({ip: (path, "job_0")})[ip]
+    assert second["skipped"] and second["attempts"] == 0
+
+
+def test_reused_name_with_same_size_is_uploaded_again(simulator, uploader, tmp_path):
+    printer = VirtualPrinter("v0", latency=0)
+    ip, = simulator([printer])
+    old = write(tmp_path / "old.gcode", "G1 X1 Y1\n" * 500, 1_700_000_000)
+    new = write(tmp_path / "new.gcode", "G1 X2 Y2\n" * 500, 1_700_003_600)
+    assert os.path.getsize(old) == os.path.getsize(new)
+
+    uploader.uploadAll({ip: (old, "job_0")})
+    result = uploader.uploadAll({ip: (new, "job_0")})[ip]
+    assert "skipped" not in result
+    assert printer.files["job_0"] == open(new, "rb").read()
+
+
+def test_failed_upload_does_not_back_off_after_last_attempt(simulator, uploader, tmp_path):
+    ip, = simulator([VirtualPrinter("v0", latency=0, failure_rate=1.0)])
+    path = write(tmp_path / "a.gcode", "G1 X1 Y1\n", 1_700_000_000)
+
+    start = time.time()
+    result = uploader.uploadAll({ip: (path, "job_0")})[ip]
+    assert "error" in result
+    assert result["attempts"] == uploader.retries + 1
+    assert time.time() - start < 1.0  # one 0.5 s backoff between the two attempts, none after the last
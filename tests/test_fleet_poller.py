@@ -0,0 +1,72 @@
+import time
+
+import pytest
+
+from duet_simulator import VirtualPrinter
+from FleetPoller import FleetPoller
+
+MOVES = [((0, 0, 0), (300, 0, 0), 60)]
+
+
+@pytest.fixture
+def poller_factory():
+    pollers = []
+
+    def make(*args, **kwargs):
+        poller = FleetPoller(*args, **kwargs)
+        pollers.append(poller)
+        return poller
+
+    yield make
+    for poller in pollers:
+        poller.stop()
+
+
+def test_snapshots_follow_the_printers(simulator, poller_factory):
+    printers = [VirtualPrinter(f"v{i}", MOVES, latency=0.005) for i in range(3)]
+    printers[1].play_time = 2.5
+    addresses = simulator(printers)
+
+    poller = poller_factory(addresses, rate=50, timeout=1)
+    poller.start()
+    assert poller.waitForFirstStatus()
+
+    record = poller.getSnapshot(addresses[1])
+    assert record["machine"] == (150, 0, 0)
+    assert record["latency"] >= 0.005
+    assert record["timestamp"] <= time.time()
+
+    printers[2].run_gcode("M24")
+    time.sleep(0.3)
+    assert poller.getSnapshot(addresses[2])["status"] == "P"
+    assert poller.getSnapshot(addresses[2])["machine"][0] > 0
+    assert all(errors == 0 for errors in poller.errors.values())
+
+
+def test_failing_printer_does_not_hold_up_the_others(simulator, poller_factory):
+    healthy, failing = simulator([VirtualPrinter("ok", latency=0.002), VirtualPrinter("bad", latency=0.002, failure_rate=1.0)])
+
+    poller = poller_factory([healthy, failing], rate=50, timeout=1)
+    poller.start()
+    time.sleep(0.3)
+
+    assert poller.getSnapshot(healthy) is not None
+    assert poller.getSnapshot(failing) is None
+    assert poller.errors[failing] > 0 and poller.errors[healthy] == 0
+    assert poller.requests[healthy] >= 5
+
+
+def test_stop_ends_polling(simulator, poller_factory):
+    printer = VirtualPrinter("v0", latency=0)
+    address, = simulator([printer])
+
+    poller = poller_factory([address], rate=1)
+    poller.start()
+    assert poller.waitForFirstStatus()
+
+    start = time.time()
+    poller.stop()
+    assert time.time() - start < 0.5  # not left waiting out the 1 s period
+    requests = printer.requests
+    time.sleep(0.1)
+    assert printer.requests == requests
@@ -0,0 +1,96 @@
+import math
+
+import numpy as np
+from shapely.geometry import LineString
+
+from job_simulator import JobSimulator, verify_job, segment_durations, local_to_global, find_runs, DEFAULT_SPEEDS
+
+
+def scalar_elbow(base, nozzle, l1, l2):
+    """
+    Reference elbow position, the scalar law of cosines of the original collision_check.transform_to_global
+    """
+    dx, dy = nozzle[0] - base[0], nozzle[1] - base[1]
+    r = math.hypot(dx, dy)
+    theta2 = math.acos(max(-1.0, min(1.0, (r**2 - l1**2 - l2**2) / (2 * l1 * l2))))
+    theta1 = math.atan2(dy, dx) - math.atan2(l2 * math.sin(theta2), l1 + l2 * math.cos(theta2))
+    return base[0] + l1 * math.cos(theta1), base[1] + l1 * math.sin(theta1)
+
+
+def robot(origin, path, moves=None, layer_starts=(0,)):
+    x, y, theta = origin
+    return {'local_origin': (x, y),
+            'robot_base': tuple(local_to_global(np.array([150.0, -35.0]), (x, y), theta)),
+            'theta_local': theta,
+            'arm_lengths': (217, 204),
+            'path': np.asarray(path, dtype=float),
+            'moves': np.ones(len(path), dtype=int) if moves is None else np.asarray(moves),
+            'layer_starts': list(layer_starts)}
+
+
+def crossing_robots():
+    # two facing printers both printing along the shared edge of their beds at the same time
+    first = robot((0, 0, 0), [(150, 100), (150, 290), (50, 290), (150, 100)])
+    second = robot((300, 600, 180), [(150, 100), (150, 290), (250, 290), (150, 100)])
+    return [first, second]
+
+
+def brute_force_contacts(simulator, dt):
+    """
+    Times at which two arms touch, testing the links with shapely one time sample at a time
+    """
+    contacts = []
+    for t in np.arange(0.0, simulator.duration, dt):
+        nozzles = simulator.positions(np.array([t]))[:, 0]
+        links = []
+        for base, nozzle, (l1, l2) in zip(simulator.bases, nozzles, simulator.arm_lengths):
+            links.append(LineString([tuple(base), scalar_elbow(base, nozzle, l1, l2), tuple(nozzle)]))
+        for i, j in simulator.pairs:
+            if links[i].distance(links[j]) <= simulator.radii[i] + simulator.radii[j]:
+                contacts.append(((i, j), t))
+    return contacts
+
+
+def test_segment_durations_match_a_loop():
+    path = np.array([(0, 0), (30, 40), (30, 40), (0, 40), (0, 0)], dtype=float)
+    moves = np.array([1, 0, 2, 1, 1])
+    expected = [0.0]
+    for k in range(1, len(path)):
+        length = math.dist(path[k - 1], path[k])
+        expected.append(length / DEFAULT_SPEEDS[moves[k - 1]] + (2.0 if moves[k - 1] == 2 else 0.0))
+    np.testing.assert_allclose(segment_durations(path, moves, retract_time=2.0), expected)
+
+
+def test_find_runs():
+    assert find_runs(np.array([1, 1, 0, 1, 0, 0, 1], dtype=bool)) == [(0, 2), (3, 4), (6, 7)]
+    assert find_runs(np.zeros(3, dtype=bool)) == []
+
+
+def test_scan_reports_every_contact_of_the_scalar_reference():
+    simulator = JobSimulator(crossing_robots(), dt=0.05)
+    conflicts = simulator.scan()
+    contacts = brute_force_contacts(simulator, 0.02)
+    assert contacts
+
+    for pair, t in contacts:
+        assert any(c['pair'] == pair and c['start'] - simulator.dt <= t <= c['end'] + simulator.dt for c in conflicts)
+
+
+def test_scheduled_waits_remove_every_contact():
+    robots = crossing_robots()
+    report = verify_job(robots, dt=0.05)
+    assert report['conflicts'] and report['waits'] and not report['unresolved']
+    assert report['scheduled_duration'] > report['duration']
+
+    simulator = JobSimulator(robots, dt=0.05)
+    for wait in report['waits']:
+        simulator.waits[wait['robot']][wait['point']] = wait['seconds']
+    simulator.update_timeline()
+    assert simulator.scan() == []
+    assert brute_force_contacts(simulator, 0.02) == []
+
+
+def test_far_apart_robots_are_never_paired():
+    robots = [robot((0, 0, 0), [(0, 0), (300, 300)]), robot((2000, 0, 0), [(0, 0), (300, 300)])]
+    simulator = JobSimulator(robots)
+    assert simulator.pairs == [] and simulator.scan() == []
@@ -0,0 +1,287 @@
+import importlib.util
+import math
+import os
+import sys
+
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# the file name is not a module name, registered so the process pool can pickle its functions
+spec = importlib.util.spec_from_file_location("LayerBasedSlicer", os.path.join(ROOT, "FileConversion", "LayerBasedSlicer (1).py"))
+slicer = sys.modules.setdefault("LayerBasedSlicer", importlib.util.module_from_spec(spec))
+spec.loader.exec_module(slicer)
+
+TOOLPATH = """Layer 0
+Interfacing
+10.0 10.0 0.45 1
+30.5 10.0 0.45 1
+30.5 25.25 0.45 0
+12.0 25.25 0.45 1
+12.0 40.0 0.45 2
+Non-interfacing
+50.0 40.0 0.45 1
+55.125 47.5 0.45 1
+Layer 1
+Interfacing
+10.0 10.0 0.9 1
+30.5 10.0 0.9 2
+60.0 12.0 0.9 1
+Non-interfacing
+61.0 30.0 0.9 0
+Layer 2
+Non-interfacing
+20.0 20.0 1.35 1
+20.0 21.0 1.35 1
+"""
+
+LAYER_HEIGHT = 0.45
+
+
+def baseline_gcode(text, gcode, layerHeight, travelMoves=True):
+    """
+    generateGcodeR1 (travelMoves) and generateGcodeR2 of the baseline, one extrusionCalculator call per segment,
+    with the newlines of the "2" move fixed
+    """
+    out = []
+    z = layerHeight
+    i, x_prev, y_prev, t_prev, lineprev = 0, 0, 0, 0, ""
+    for line in text.splitlines(True):
+        if 'Layer' in line:
+            z += layerHeight
+            lineprev = line
+        elif 'Interfacing' in line:
+            out.append("M117 Interfacing\n" + ("M25\nM104 S240\n" if 'Layer' in lineprev else ""))
+        elif "Non-interfacing" in line:
+            out.append("M117 Non-Interfacing\n" + ("M25\nM104 S240\n" if 'Layer' in lineprev else ""))
+        else:
+            data = line.split()
+            x, y, t = float(data[0]), float(data[1]), int(data[3])
+            if i == 0:
+                newline = "G1 X" + str(x) + ' Y' + str(y) + '\n'
+            elif t_prev == 1:
+                eValue = gcode.extrusionCalculator([(x_prev, y_prev), (x, y)])
+                newline = "G1 X" + str(x) + ' Y' + str(y) + ' Z' + str(z) + ' E' + str(eValue) + '\n'
+            elif t_prev == 2:
+                newline = ("G92 E0\nG1 E-3.0000 F3000\n" + "G0 Z" + str(z + 5) + '\n' +
+                           "G0 X" + str(x) + ' Y' + str(y) + ' Z' + str(z + 5) + '\n' +
+                           "G0 Z" + str(z) + '\n' + "G1 E3.0000 F3000\nG92 E0\n")
+            elif travelMoves:
+                newline = "G0 X" + str(x) + ' Y' + str(y) + ' Z' + str(z) + '\n'
+            else:
+                newline = ""
+            out.append(newline)
+            x_prev, y_prev, t_prev, i, lineprev = x, y, t, i + 1, line
+    return "".join(out)
+
+
+def assert_same_gcode(actual, expected):
+    """
+    Line by line comparison, E values may differ in their last digits (np.hypot in extrusionBatch)
+    """
+    actual, expected = actual.splitlines(), expected.splitlines()
+    assert len(actual) == len(expected)
+    for a, e in zip(actual, expected):
+        if " E" in e and e.startswith("G1 X"):
+            a, aE = a.rsplit(" E", 1)
+            e, eE = e.rsplit(" E", 1)
+            assert float(aE) == pytest.approx(float(eE), rel=1e-14)
+        assert a == e
+
+
+@pytest.fixture
+def gcode():
+    return slicer.ManualGcode("START\n", "START2\n", "END\n", 1.75, LAYER_HEIGHT, 0.42)
+
+
+@pytest.fixture
+def toolpath_file(tmp_path):
+    path = tmp_path / "robot.txt"
+    path.write_text(TOOLPATH)
+    return str(path)
+
+
+@pytest.mark.parametrize("travelMoves", [True, False])
+@pytest.mark.parametrize("chunkSize", [1, 1 << 16])
+def test_write_gcode_matches_the_baseline(gcode, toolpath_file, tmp_path, travelMoves, chunkSize):
+    output = gcode.writeGcode(toolpath_file, str(tmp_path / "out.gcode"), "START\n", LAYER_HEIGHT, travelMoves, chunkSize)
+    with open(output) as result:
+        text = result.read()
+
+    assert text.startswith("START\n") and text.endswith("END\n")
+    assert_same_gcode(text[len("START\n"):-len("END\n")], baseline_gcode(TOOLPATH, gcode, LAYER_HEIGHT, travelMoves))
+
+
+def test_new_cell_moves_are_separate_lines(gcode):
+    lines = list(gcode.gcodeLines(TOOLPATH.splitlines(True), LAYER_HEIGHT))
+    assert lines[7] == ("G92 E0\nG1 E-3.0000 F3000\nG0 Z5.9\nG0 X50.0 Y40.0 Z5.9\nG0 Z0.9\n"
+                        "G1 E3.0000 F3000\nG92 E0\n")
+    assert all(line.startswith(("G", "M")) for line in "".join(lines).splitlines())
+
+
+def baseline_convert(text, robot):
+    """
+    convertR1 / convertR2 of the baseline, written with the %.6f rounding of transformLines
+    """
+    out = []
+    for line in text.splitlines(True):
+        if 'Layer' in line or 'Interfacing' in line or "Non-interfacing" in line:
+            out.append(line)
+        else:
+            data = line.split()
+            x, y = float(data[0]), float(data[1])
+            if robot == 1:
+                x_new, y_new = x - 100 + 49, y - 0 + 100 - 2.5
+            else:
+                x_new, y_new = 300 - x + 48.5, 300 - y + 200 + 3
+            out.append("%.6f %.6f %s %s\n" % (x_new, y_new, data[2], data[3]))
+    return "".join(out)
+
+
+@pytest.mark.parametrize("robot, transform", [(1, slicer.TRANSFORM_R1), (2, slicer.TRANSFORM_R2)])
+def test_transform_lines_matches_the_scalar_conversion(robot, transform):
+    lines = TOOLPATH.splitlines(True) + ["0.1234565 -7.0000005 0.45 1\n"]
+    assert "".join(slicer.transformLines(lines, transform)) == baseline_convert("".join(lines), robot)
+
+    # shortest exact representation instead of the rounding
+    exact = slicer.transformLines(["0.1 0.2 0.45 1\n"], transform, decimals=None)[0].split()
+    expected = (0.1 - 51, 0.2 + 97.5) if robot == 1 else (348.5 - 0.1, 503 - 0.2)
+    assert (float(exact[0]), float(exact[1])) == pytest.approx(expected, abs=1e-12)
+
+
+def test_rotated_transform_matches_scalar_rotation():
+    transform = slicer.affineTransform(30, 10, -5)
+    x, y = slicer.transformLines(["3.0 4.0 0.45 1\n"], transform, decimals=None)[0].split()[:2]
+    a = math.radians(30)
+    assert float(x) == pytest.approx(3 * math.cos(a) - 4 * math.sin(a) + 10)
+    assert float(y) == pytest.approx(3 * math.sin(a) + 4 * math.cos(a) - 5)
+    assert slicer.transformLines(["Layer 3\n", "Interfacing\n"], transform) == ["Layer 3\n", "Interfacing\n"]
+
+
+@pytest.mark.parametrize("blockLines", [1, 4, 100000])
+def test_convert_file_in_blocks(toolpath_file, tmp_path, blockLines):
+    updatedR1, updatedR2 = str(tmp_path / "r1.txt"), str(tmp_path / "r2.txt")
+    conversion = slicer.Conversion(toolpath_file, toolpath_file, updatedR1, updatedR2)
+    conversion.convertFile(toolpath_file, updatedR1, conversion.transformR1, blockLines)
+    conversion.convertR2()
+
+    with open(updatedR1) as r1, open(updatedR2) as r2:
+        assert r1.read() == baseline_convert(TOOLPATH, 1)
+        assert r2.read() == baseline_convert(TOOLPATH, 2)
+
+
+@pytest.mark.parametrize("start", [(0, 0, 0), (3.5, -2.0, 1), (1e3, 1e3, 2)])
+def test_extrusion_batch_matches_the_per_move_formula(gcode, start):
+    rng = np.random.default_rng(0)
+    x = rng.uniform(-300, 300, 200)
+    y = rng.uniform(-300, 300, 200)
+    t = rng.integers(0, 3, 200)
+
+    eValues = gcode.extrusionBatch(x, y, t, start)
+    previous = [start] + list(zip(x, y, t))[:-1]
+    for eValue, (x_prev, y_prev, t_prev), xk, yk in zip(eValues, previous, x, y):
+        expected = gcode.extrusionCalculator([(x_prev, y_prev), (xk, yk)]) if t_prev == 1 else 0.0
+        # np.hypot and math.hypot may round the length differently in the last bit
+        assert eValue == pytest.approx(expected, rel=4 * np.finfo(float).eps, abs=0)
+
+
+def layered_toolpath(rng, layers):
+    lines = []
+    for layer in range(layers):
+        lines.append("Layer %d\n" % layer)
+        for marker in ("Interfacing", "Non-interfacing"):
+            lines.append(marker + "\n")
+            for _ in range(rng.integers(1, 6)):
+                lines.append("%.3f %.3f %.2f %d\n" % (*rng.uniform(0, 300, 2), 0.45 * (layer + 1), rng.integers(0, 3)))
+    return "".join(lines)
+
+
+def sequential_gcode(robot, gcode, tmp_path):
+    """
+    Whole toolpath converted by Conversion.convertFile and written by writeGcode in one process
+    """
+    converted = str(tmp_path / (robot.name + "_converted.txt"))
+    slicer.Conversion(None, None, None, None).convertFile(robot.toolpathFile, converted, robot.transform)
+    gcode.final_gcode_robot = robot.final_gcode
+    output = gcode.writeGcode(converted, str(tmp_path / (robot.name + "_sequential.gcode")), robot.initial_gcode,
+                              LAYER_HEIGHT, robot.travelMoves, dwells=robot.dwells, pauseLayers=robot.pauseLayers)
+    with open(output) as result:
+        return result.read()
+
+
+def make_robots(tmp_path, dwells=None, pauseLayers=None):
+    rng = np.random.default_rng(0)
+    robots = []
+    for k, (transform, travelMoves) in enumerate([(slicer.TRANSFORM_R1, True), (slicer.TRANSFORM_R2, False)]):
+        path = tmp_path / ("robot%d.txt" % (k + 1))
+        path.write_text(layered_toolpath(rng, 7))
+        robots.append(slicer.RobotJob("AMBOT%d" % (k + 1), str(path), transform, "START%d\n" % (k + 1), "END\n", travelMoves,
+                                      dwells=None if dwells is None else dwells[k],
+                                      pauseLayers=None if pauseLayers is None else pauseLayers[k]))
+    return robots
+
+
+@pytest.mark.parametrize("layersPerPart", [1, 3])
+def test_generate_job_matches_the_sequential_output(gcode, tmp_path, layersPerPart):
+    robots = make_robots(tmp_path)
+    outputDir = tmp_path / "job"
+    outputDir.mkdir()
+
+    outputs = slicer.generateJob(robots, 1.75, LAYER_HEIGHT, 0.42, str(outputDir), layersPerPart=layersPerPart, workers=3)
+    assert [os.path.basename(output).split("_")[0] for output in outputs] == ["AMBOT1", "AMBOT2"]
+    assert sorted(os.listdir(outputDir)) == sorted(os.path.basename(output) for output in outputs)  # parts removed
+
+    for robot, output in zip(robots, outputs):
+        with open(output) as result:
+            assert result.read() == sequential_gcode(robot, gcode, tmp_path)
+
+
+def planned_gcode(robot, gcode, plan, k):
+    """
+    G-code of the robot without a plan, edited by hand: "G4 S" before the move leaving every dwell point
+    and M25 only at the start of the planned layers
+    """
+    with open(robot.toolpathFile) as toolpath:
+        lines = slicer.transformLines(toolpath.readlines(), robot.transform)
+    chunks = iter(gcode.gcodeLines(lines, LAYER_HEIGHT, robot.travelMoves))
+
+    out = [robot.initial_gcode]
+    point, layer = 0, -1
+    for line in lines:
+        if "Layer" in line:
+            layer += 1
+            continue
+        chunk = next(chunks)
+        if "M25" in chunk and layer not in plan["pause_layers"]:
+            chunk = chunk.replace("M25\nM104 S240\n", "")
+        if not slicer.isMarker(line):
+            if point - 1 in plan["dwells"][k]:
+                chunk = "G4 S" + str(round(plan["dwells"][k][point - 1], 2)) + "\n" + chunk
+            point += 1
+        out.append(chunk)
+    return "".join(out) + robot.final_gcode
+
+
+def test_synchronization_plan_becomes_dwells_and_pauses(gcode, tmp_path):
+    robots = make_robots(tmp_path)
+    with open(robots[0].toolpathFile) as toolpath:
+        text = toolpath.read()
+    partEnd = sum(not slicer.isMarker(line) for line in text[:text.index("Layer 2")].splitlines()) - 1
+
+    # plan_synchronization output: dwells on the first point, inside a layer and on the last point of a part
+    plan = {"dwells": [{0: 2.0, 5: 1.234, partEnd: 0.5}, {3: 12.0}], "pause_layers": [0, 4]}
+    for robot, dwells in zip(robots, plan["dwells"]):
+        robot.dwells, robot.pauseLayers = dwells, plan["pause_layers"]
+
+    outputDir = tmp_path / "job"
+    outputDir.mkdir()
+    outputs = slicer.generateJob(robots, 1.75, LAYER_HEIGHT, 0.42, str(outputDir), layersPerPart=2, workers=2)
+
+    for k, (robot, output) in enumerate(zip(robots, outputs)):
+        with open(output) as result:
+            text = result.read()
+        assert text == planned_gcode(robot, gcode, plan, k)
+        assert text.count("M25\n") == 2
+        assert [line for line in text.splitlines() if line.startswith("G4")] == \
+            ["G4 S" + str(round(seconds, 2)) for _, seconds in sorted(plan["dwells"][k].items())]
@@ -0,0 +1,58 @@
+import pytest
+
+from MotionEstimator import MotionEstimator
+
+
+def record(timestamp, machine, target, feedrate, status="P", latency=0.0):
+    return {"status": status, "machine": machine, "target": target, "feedrate": feedrate,
+            "timestamp": timestamp, "latency": latency}
+
+
+def test_extrapolates_toward_target_and_stops_there():
+    estimator = MotionEstimator(speedError=0)
+    estimator.addSample(record(100.0, (0, 0, 0), (100, 0, 0), 50))
+
+    position, uncertainty = estimator.predict(101.0)
+    assert position == pytest.approx((50, 0, 0))
+    assert uncertainty == pytest.approx(0)
+
+    position, uncertainty = estimator.predict(103.0)
+    assert position == pytest.approx((100, 0, 0))
+    assert uncertainty == pytest.approx(estimator.maxSpeed * 1.0)  # 1 s past the end of the move
+
+
+def test_ignores_records_already_stored():
+    estimator = MotionEstimator()
+    assert estimator.addSample(record(100.0, (0, 0, 0), (10, 0, 0), 10))
+    assert not estimator.addSample(record(100.0, (5, 0, 0), (10, 0, 0), 10))
+    assert not estimator.addSample(None)
+    assert len(estimator.samples) == 1
+
+
+def test_stale_still_sample_grows_uncertainty():
+    estimator = MotionEstimator(maxSpeed=100, maxUncertainty=450)
+    estimator.addSample(record(100.0, (20, 30, 0), (20, 30, 0), 0, status="I", latency=0.2))
+    measured = 100.1
+
+    position, fresh = estimator.predict(measured + 0.1)
+    assert position == pytest.approx((20, 30, 0))
+    assert fresh == pytest.approx(0)
+
+    _, stale = estimator.predict(measured + 2.2)
+    assert stale == pytest.approx(100 * (2.2 - 0.2))
+
+    _, capped = estimator.predict(measured + 60)
+    assert capped == 450
+
+
+def test_paused_printer_grows_until_it_confirms_the_pause():
+    estimator = MotionEstimator()
+    estimator.addSample(record(100.0, (0, 0, 0), (100, 0, 0), 50, status="P"))
+    position, uncertainty = estimator.predict(105.0, moving=False)
+    assert position == (0, 0, 0)
+    assert uncertainty > 0
+
+    estimator.addSample(record(101.0, (10, 0, 0), (10, 0, 0), 0, status="S"))
+    position, uncertainty = estimator.predict(130.0, moving=False)
+    assert position == (10, 0, 0)
+    assert uncertainty == 0
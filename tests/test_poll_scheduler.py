@@ -0,0 +1,78 @@
+import time
+
+import numpy as np
+import pytest
+
+import Full_Envelope_Managment as fem
+from duet_simulator import VirtualPrinter
+from FleetPoller import FleetPoller
+from PollScheduler import PollScheduler
+
+
+class RecordingPoller:
+    def __init__(self):
+        self.periods = {}
+
+    def setPeriod(self, ip, period):
+        self.periods[ip] = period
+
+
+def test_periods_follow_the_time_to_contact():
+    scheduler = PollScheduler(RecordingPoller(), minPeriod=0.02, maxPeriod=1.0, safety=0.5, minSpeed=10)
+    periods = scheduler.getPeriods([0, 10, 100, 1000, np.inf], [20, 20, 0, 100, 0], [1, 0, 3, 2, -1])
+    np.testing.assert_allclose(periods, [0.02, 0.125, 0.5, 1.0, 1.0])
+
+
+def test_periods_are_bounded_and_grow_with_the_clearance():
+    scheduler = PollScheduler(RecordingPoller(), minPeriod=0.05, maxPeriod=0.8)
+    rng = np.random.default_rng(0)
+    feedrates = rng.uniform(0, 200, 50)
+    neighbours = rng.integers(-1, 50, 50)
+    clearances = rng.uniform(-20, 500, 50)
+
+    periods = scheduler.getPeriods(clearances, feedrates, neighbours)
+    assert ((periods >= 0.05) & (periods <= 0.8)).all()
+    assert (scheduler.getPeriods(clearances + 50, feedrates, neighbours) >= periods).all()
+    assert (scheduler.getPeriods(clearances, feedrates * 2, neighbours) <= periods).all()
+
+
+def test_update_sets_the_poller_periods():
+    poller = RecordingPoller()
+    periods = PollScheduler(poller).update(["a", "b"], [0, 1e6], [50, 0], [1, 0])
+    assert poller.periods == periods == {"a": 0.02, "b": 1.0}
+
+
+def test_shorter_period_wakes_a_waiting_poll(simulator):
+    printer = VirtualPrinter("v0", latency=0)
+    address, = simulator([printer])
+    poller = FleetPoller([address], rate=0.5, timeout=1)
+    try:
+        poller.start()
+        assert poller.waitForFirstStatus()
+        time.sleep(0.1)
+        assert poller.requests[address] == 1  # waiting out its 2 s period
+
+        poller.setPeriod(address, 0.02)
+        time.sleep(0.3)
+        assert poller.requests[address] >= 5
+    finally:
+        poller.stop()
+
+
+def test_adaptive_polling_slows_down_far_apart_printers(simulator):
+    printers = [VirtualPrinter(f"v{i}", latency=0.002) for i in range(2)]
+    addresses = simulator(printers)
+    env = fem.envelope([[(i * 2000, 0, 0), (150, -35), address, f"p{i}"] for i, address in enumerate(addresses)], plot=False)
+
+    env.startPolling(rate=50, timeout=1, adaptive=True, maxPeriod=0.5)
+    try:
+        assert env.poller.waitForFirstStatus()
+        env.syncFleet()
+        periods = env.updatePollPeriods()
+        assert periods == {address: pytest.approx(0.5) for address in addresses}
+
+        before = [printer.requests for printer in printers]
+        time.sleep(0.6)
+        assert all(printer.requests - count <= 3 for printer, count in zip(printers, before))
+    finally:
+        env.stopPolling()
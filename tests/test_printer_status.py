@@ -0,0 +1,47 @@
+import asyncio
+
+import pytest
+
+import Full_Envelope_Managment as fem
+from duet_simulator import VirtualPrinter
+from StatusSources import FullStatusSource, SelectiveStatusSource, IncrementalStatusSource
+
+
+@pytest.mark.parametrize("source_class", [FullStatusSource, SelectiveStatusSource, IncrementalStatusSource])
+def test_request_status_goes_through_the_status_source(simulator, source_class):
+    virtual = VirtualPrinter("v0", [((0, 0, 0), (300, 0, 0), 60)], latency=0)
+    virtual.play_time = 2.5
+    address, = simulator([virtual])
+
+    pr = fem.printer((0, 0, 0), (150, -35), address)
+    source = source_class()
+    pr.setStatusSource(source)
+
+    try:
+        record = pr.request_status()
+    finally:
+        pr.closeStatus()
+    assert record["machine"] == (150, 0, 0)
+    assert record["latency"] >= 0
+    assert source.stats  # the request was made by the source
+
+
+def test_request_status_reuses_its_session_inside_a_running_loop(simulator):
+    virtual = VirtualPrinter("v0", latency=0)
+    address, = simulator([virtual])
+    pr = fem.printer((0, 0, 0), (150, -35), address)
+
+    async def console():
+        # like an IPython or Spyder console, which already runs an event loop
+        return [pr.request_status() for _ in range(3)]
+
+    try:
+        records = pr.request_status(), *asyncio.run(console())
+        session = pr.statusSession
+        pr.request_status()
+        assert pr.statusSession is session
+    finally:
+        pr.closeStatus()
+    assert all(record["status"] == "I" for record in records)
+    assert virtual.requests == 5
+    assert pr.statusSession is None and pr.statusLoop is None
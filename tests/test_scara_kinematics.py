@@ -0,0 +1,131 @@
+import math
+
+import numpy as np
+import pytest
+
+import Full_Envelope_Managment as fem
+from FleetState import FleetState
+from scara_kinematics import (inverse_kinematics, forward_kinematics, within_joint_limits, frame_matrix, apply_frames,
+                              elbow_positions, ELBOW_LEFT, THETA1_RANGE, THETA2_RANGE)
+
+OFFSET = (150.0, -35.0)
+
+
+def baseline_get_joint_location(xyz, offset, b, c):
+    """
+    printer.getJointLocation before the shared kernel. Its law of cosines gives the angle at the nozzle
+    ((a^2 + c^2 - b^2) / 2ac) instead of the angle at the base, so it is only right for equal arm lengths.
+    """
+    dx, dy = xyz[0] - offset[0], xyz[1] - offset[1]
+    a = math.hypot(dx, dy)
+    beta = math.acos((a**2 + c**2 - b**2) / (2 * a * c))
+    phi = math.atan2(dy, dx) - beta
+    return b * math.cos(phi) + offset[0], b * math.sin(phi) + offset[1]
+
+
+def baseline_transform_to_global(base, nozzle, l1, l2):
+    """
+    Scalar inverse kinematics of collision_check.transform_to_global before the shared kernel
+    """
+    dx, dy = nozzle[0] - base[0], nozzle[1] - base[1]
+    d = math.hypot(dx, dy)
+    if d > l1 + l2 or d < abs(l1 - l2):
+        raise ValueError("End-effector position is unreachable.")
+    cos_theta2 = (d**2 - l1**2 - l2**2) / (2 * l1 * l2)
+    theta2 = math.acos(cos_theta2)
+    phi = math.atan2(dy, dx)
+    beta = math.atan2(l2 * math.sin(theta2), l1 + l2 * math.cos(theta2))
+    theta1 = phi - beta
+    return base[0] + l1 * math.cos(theta1), base[1] + l1 * math.sin(theta1)
+
+
+def reachable_points(rng, count, l1=217, l2=204):
+    r = rng.uniform(abs(l1 - l2) + 1, l1 + l2 - 1, count)
+    angle = rng.uniform(0, 2 * math.pi, count)
+    return np.column_stack((OFFSET[0] + r * np.cos(angle), OFFSET[1] + r * np.sin(angle)))
+
+
+def test_inverse_kinematics_matches_scalar_baseline():
+    points = reachable_points(np.random.default_rng(0), 500)
+    theta1, theta2, elbows, reachable = inverse_kinematics(OFFSET, points, 217, 204)
+    assert reachable.all()
+    for point, elbow in zip(points, elbows):
+        assert tuple(elbow) == pytest.approx(baseline_transform_to_global(OFFSET, point, 217, 204))
+
+
+def test_equal_arms_match_baseline_get_joint_location():
+    points = reachable_points(np.random.default_rng(1), 200, 210, 210)
+    elbows = elbow_positions(OFFSET, points, 210, 210)
+    for point, elbow in zip(points, elbows):
+        assert tuple(elbow) == pytest.approx(baseline_get_joint_location((*point, 0), OFFSET, 210, 210))
+
+
+def test_unequal_arms_fix_baseline_get_joint_location():
+    # with the default 217/204 mm arms the baseline elbow is not one second link away from the nozzle
+    point = (250.0, 250.0)
+    baseline = baseline_get_joint_location((*point, 0), OFFSET, 217, 204)
+    assert math.dist(baseline, point) != pytest.approx(204, abs=1)
+
+    elbow = elbow_positions(OFFSET, point, 217, 204)
+    assert math.dist(elbow, OFFSET) == pytest.approx(217)
+    assert math.dist(elbow, point) == pytest.approx(204)
+
+    pr = fem.printer((0, 0, 0), OFFSET, "127.0.0.1:1")
+    assert pr.getJointLocation((*point, 0)) == pytest.approx(tuple(elbow))
+
+
+def test_forward_kinematics_inverts_inverse_kinematics():
+    points = reachable_points(np.random.default_rng(2), 300)
+    for elbow_sign in (1, ELBOW_LEFT):
+        theta1, theta2, elbows, _ = inverse_kinematics(OFFSET, points, 217, 204, elbow=elbow_sign)
+        fk_elbows, nozzles = forward_kinematics(OFFSET, theta1, theta2, 217, 204)
+        np.testing.assert_allclose(nozzles, points, atol=1e-9)
+        np.testing.assert_allclose(fk_elbows, elbows, atol=1e-9)
+        assert (np.sign(theta2) == elbow_sign).all()
+
+
+def test_unreachable_points_get_the_nearest_pose():
+    theta1, theta2, elbows, reachable = inverse_kinematics(OFFSET, [(OFFSET[0] + 500, OFFSET[1]), (OFFSET[0] + 5, OFFSET[1])], 217, 204)
+    assert not reachable.any()
+    assert theta2[0] == pytest.approx(0)          # stretched toward the target
+    assert theta2[1] == pytest.approx(math.pi)    # folded
+    assert np.isfinite(elbows).all()
+
+
+def test_vectorized_over_printers_and_poses():
+    rng = np.random.default_rng(3)
+    bases = rng.uniform(0, 500, (4, 2))
+    lengths = np.array([[217, 204], [200, 200], [250, 180], [217, 204]], dtype=float)
+    points = bases[:, None, :] + reachable_points(rng, 4 * 6).reshape(4, 6, 2) - OFFSET
+    theta1, theta2, elbows, reachable = inverse_kinematics(bases[:, None, :], points, lengths[:, 0, None], lengths[:, 1, None])
+    assert elbows.shape == (4, 6, 2)
+    for i in range(4):
+        for k in range(6):
+            if reachable[i, k]:
+                assert tuple(elbows[i, k]) == pytest.approx(baseline_transform_to_global(bases[i], points[i, k], *lengths[i]))
+
+
+def test_fleet_joint_locations_match_printers():
+    fleet = FleetState()
+    printers = [fem.printer(origin, OFFSET, "127.0.0.1:1", fleet=fleet) for origin in [(0, 0, 0), (300, 600, 180)]]
+    points = np.array([(250.0, 250.0, 0.0), (100.0, 50.0, 0.0)])
+    joints = fleet.jointLocations(points)
+    for pr, point, joint in zip(printers, points, joints):
+        assert pr.getJointLocation(tuple(point)) == pytest.approx(tuple(joint))
+
+
+def test_within_joint_limits():
+    assert within_joint_limits(0.0, 0.5)
+    assert not within_joint_limits(THETA1_RANGE[1] + 0.1, 0.5)
+    assert not within_joint_limits(0.0, -0.1)
+    assert within_joint_limits(math.pi + 0.1, 0.5, rotation=math.pi)
+    assert not within_joint_limits(0.1, THETA2_RANGE[1] + 0.1)
+
+
+def test_frames_match_scalar_rotation():
+    frame = frame_matrix(300.0, 600.0, 180.0)
+    assert not frame.flags.writeable
+    assert tuple(apply_frames(frame, (150.0, -35.0))) == pytest.approx((150.0, 635.0))
+
+    frames = np.stack([frame_matrix(0.0, 0.0, 0.0), frame_matrix(10.0, 20.0, 90.0)])
+    np.testing.assert_allclose(apply_frames(frames, [[[1.0, 2.0]], [[1.0, 2.0]]]), [[[1.0, 2.0]], [[8.0, 21.0]]], atol=1e-12)
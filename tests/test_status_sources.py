@@ -0,0 +1,55 @@
+import asyncio
+
+import aiohttp
+import pytest
+
+from duet_simulator import VirtualPrinter
+from StatusSources import FullStatusSource, SelectiveStatusSource, IncrementalStatusSource, mergeModel
+
+MOVES = [((0, 0, 0), (300, 0, 0), 60), ((300, 0, 0), (300, 200, 5), 60)]
+
+
+def poll(source, address, polls):
+    async def run():
+        async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=1)) as session:
+            return [await source.fetch(session, address) for _ in range(polls)]
+    return asyncio.run(run())
+
+
+@pytest.fixture
+def paused_printer(simulator):
+    # stopped halfway through the first move, so every poll sees the same values
+    printer = VirtualPrinter("v0", MOVES, latency=0)
+    printer.play_time = 2.5
+    printer.set_status("S")
+    address, = simulator([printer])
+    return printer, address
+
+
+@pytest.mark.parametrize("source_class", [SelectiveStatusSource, IncrementalStatusSource])
+def test_sources_match_rr_status(paused_printer, source_class):
+    printer, address = paused_printer
+    expected = poll(FullStatusSource(), address, 1)[0]
+    assert expected == {"status": "S", "machine": (150, 0, 0), "target": (150, 0, 0), "feedrate": 0}
+
+    for record in poll(source_class(), address, 12):
+        assert {key: record[key] for key in expected} == expected
+
+
+def test_selective_source_makes_one_request_per_poll(paused_printer):
+    printer, address = paused_printer
+    source = SelectiveStatusSource(fullEvery=10, statusEvery=4)
+    before = printer.requests
+
+    poll(source, address, 20)
+    assert printer.requests - before == 20
+    stats = source.getStats()
+    assert stats["full"]["requests"] == 2
+    assert stats["selective"]["bytesPerRequest"] < stats["full"]["bytesPerRequest"]
+
+
+def test_merge_model():
+    model = {"move": {"axes": [{"letter": "X", "machinePosition": 0, "homed": True}]}, "state": {"status": "idle"}}
+    mergeModel(model, {"move": {"axes": [{"machinePosition": 5}, {"letter": "Y"}]}, "state": {"status": "processing"}})
+    assert model == {"move": {"axes": [{"letter": "X", "machinePosition": 5, "homed": True}, {"letter": "Y"}]},
+                     "state": {"status": "processing"}}